@@ -0,0 +1,175 @@
+"""
+Сквозной прогон Engine._run_parser против локального стенда.
+
+Запуск (из каталога lib):
+    python -m pysevsu.schedule.benchmarks.crawl --institutes 10 --latency 0.05 0.2
+    python -m pysevsu.schedule.benchmarks.crawl --db-url postgresql+asyncpg://...
+
+Без --db-url уроки не пишутся в БД, а только считаются - так меряется
+скачивание и разбор. Состояние движка (кэш, валидаторы) создаётся во
+временном каталоге, поэтому каждый прогон начинается с холодного старта.
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+import tracemalloc
+
+from typing import Optional
+from typing import Any
+from typing import List
+
+from .stand import Stand
+from .stand import INDEX_PATH
+from ..core.records import LessonBatch
+from ..core.records import LessonRecord
+from ..core.xls import ExcelFile
+from ..engine.worker import Engine
+from ..engine.worker import _peak_rss_kb
+
+
+class CountingExporter:
+    """Заглушка BatchCTE_exporter: считает уроки, ничего не пишет."""
+
+    def __init__(self):
+        self.lessons: int = 0
+        # Ничего не записывает: кэш выборок сбрасывать незачем
+        self.changes: int = 0
+
+    async def add(self, lesson: LessonRecord) -> None:
+        self.lessons += 1
+
+    async def add_many(self, lessons: List[LessonRecord]) -> None:
+        self.lessons += len(lessons)
+
+    async def add_batch(self, batch: LessonBatch) -> None:
+        self.lessons += len(batch)
+
+    async def finalize(self) -> None:
+        ...
+
+
+async def run(
+    stand: Stand,
+    cycles: int = 1,
+    db_url: Optional[str] = None,
+    **engine_kw: Any
+) -> None:
+    base_url = await stand.start()
+    try:
+        with tempfile.TemporaryDirectory() as state_dir:
+            exporter = None if db_url else CountingExporter()
+            engine_kw.setdefault("state_dir", state_dir)
+            if db_url:
+                engine_kw["db_url"] = db_url
+            engine = Engine(
+                base_url=base_url,
+                index_url=f"{base_url}{INDEX_PATH}",
+                exporter=exporter,
+                **engine_kw
+            )
+
+            for cycle in range(cycles):
+                start = time.perf_counter()
+                stats = await engine._run_parser()
+                elapsed = time.perf_counter() - start
+
+                files = stats["downloaded"] + stats["replayed"]
+                print(
+                    f"cycle {cycle + 1}: {elapsed:.2f} s, "
+                    f"files {files} ({files / elapsed:.1f}/s), "
+                    f"sheets {stats['sheets']} ({stats['sheets'] / elapsed:.1f}/s), "
+                    f"lessons {stats['lessons']} "
+                    f"({stats['lessons'] / elapsed:.0f}/s), "
+                    f"skipped {stats['not_modified'] + stats['same_hash']}, "
+                    f"dead letters {stats['dead_lettered']}, "
+                    f"server errors {stand.errors}, "
+                    f"requests {stand.requests}, "
+                    f"coalesced {stats['coalesced_entries']} entries / "
+                    f"{stats['coalesced_parses']} parses, "
+                    f"parse cache hits {stats['parse_cache_hits']}"
+                )
+    finally:
+        await stand.stop()
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--institutes", type=int, default=10)
+    argparser.add_argument("--courses", type=int, default=4)
+    argparser.add_argument("--sheets", type=int, default=18)
+    argparser.add_argument("--groups", type=int, default=4)
+    argparser.add_argument(
+        "--latency", type=float, nargs=2, default=(0.0, 0.0)
+    )
+    argparser.add_argument("--error-rate", type=float, default=0.0)
+    argparser.add_argument(
+        "--duplicate-rate",
+        type=float,
+        default=0.0,
+        help="доля ссылок индекса на уже выложенный файл"
+    )
+    argparser.add_argument(
+        "--mirror-rate",
+        type=float,
+        default=0.0,
+        help="доля файлов с тем же содержимым под другим URL"
+    )
+    argparser.add_argument("--cycles", type=int, default=1)
+    argparser.add_argument("--max-request-count", type=int, default=40)
+    argparser.add_argument(
+        "--parse-workers",
+        type=int,
+        help="разбирать книги в пуле из N процессов"
+    )
+    argparser.add_argument(
+        "--xls-backend", choices=ExcelFile.BACKENDS, default="native"
+    )
+    argparser.add_argument(
+        "--window-weeks",
+        type=int,
+        help="выгружать только N недель начиная с текущей"
+    )
+    argparser.add_argument("--db-url")
+    argparser.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="пик памяти Python-объектов (заметно замедляет прогон)"
+    )
+    args = argparser.parse_args()
+
+    stand = Stand(
+        institutes=args.institutes,
+        courses=args.courses,
+        sheets=args.sheets,
+        groups=args.groups,
+        latency=tuple(args.latency),
+        error_rate=args.error_rate,
+        duplicate_rate=args.duplicate_rate,
+        mirror_rate=args.mirror_rate
+    )
+    print(f"generating {len(stand.ids)} workbooks...")
+    stand.prepare()
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    asyncio.run(run(
+        stand,
+        cycles=args.cycles,
+        db_url=args.db_url,
+        max_request_count=args.max_request_count,
+        retry_base_delay=0.1,
+        index_full_crawl_every=1,
+        parse_workers=args.parse_workers,
+        xls_backend=args.xls_backend,
+        window_weeks=args.window_weeks
+    ))
+    if args.tracemalloc:
+        _, peak = tracemalloc.get_traced_memory()
+        print(f"peak traced memory: {peak / 1024 ** 2:.1f} MiB")
+    print(f"peak RSS: {_peak_rss_kb() / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Сравнение бэкендов Parser на сохранённой копии страницы расписания.
+
+Запуск (из каталога lib):
+    python -m pysevsu.schedule.benchmarks.index_parser page.html
+    python -m pysevsu.schedule.benchmarks.index_parser page.html --save
+
+С флагом --save страница сначала скачивается с sevsu.ru в page.html.
+"""
+
+import argparse
+import asyncio
+import time
+
+from typing import List
+from typing import Tuple
+
+from ..core.web import Parser
+from ..core.web import _BACKENDS
+
+
+def _measure(
+    content: str, 
+    backend: str, 
+    repeat: int
+) -> Tuple[int, List[float]]:
+    timings: List[float] = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = sum(1 for _ in Parser(content, backend).iter_data())
+        timings.append(time.perf_counter() - start)
+    return count, timings
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("path")
+    argparser.add_argument("--save", action="store_true")
+    argparser.add_argument("--repeat", type=int, default=10)
+    argparser.add_argument(
+        "--backend",
+        action="append",
+        choices=list(_BACKENDS)
+    )
+    args = argparser.parse_args()
+
+    if args.save:
+        content = asyncio.run(Parser.fetch())
+        with open(args.path, "w", encoding="utf-8") as file:
+            file.write(content)
+
+    with open(args.path, encoding="utf-8") as file:
+        content = file.read()
+
+    print(f"page: {len(content) / 1024:.1f} KiB, repeat: {args.repeat}")
+    for backend in args.backend or list(_BACKENDS):
+        try:
+            count, timings = _measure(content, backend, args.repeat)
+        except ImportError as err:
+            print(f"{backend:<12} skipped ({err})")
+            continue
+        print(
+            f"{backend:<12} links: {count:<6} "
+            f"best: {min(timings) * 1000:8.2f} ms  "
+            f"mean: {sum(timings) / len(timings) * 1000:8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Запись уроков в БД: прежний запрос с CTE и значениями в тексте против
+COPY во временную таблицу со слиянием на сервере (BatchCTE_exporter).
+
+Без --db-url меряется только подготовка пачки на клиенте (текст запроса
+против строк для COPY). С --db-url таблицы пересоздаются (Base.metadata)
+и уроки стенда пишутся обоими способами, каждый раз в пустые таблицы:
+прежний запрос - в прежнюю таблицу lesson (строки, уникальное
+ограничение на одиннадцать столбцов), COPY - в текущую (типизированные
+столбцы, справочники, ключ lesson.fingerprint). Затем уроки повторно
+пишутся новым способом в заполненные таблицы - как при повторном
+импорте без изменений (наборы уроков совпадают по отпечаткам и не
+пишутся). После каждого прогона печатаются размеры таблицы lesson и
+её индексов.
+
+Запуск (из каталога lib):
+    python -m pysevsu.schedule.benchmarks.loader --files 16
+    python -m pysevsu.schedule.benchmarks.loader --db-url postgresql+asyncpg://...
+"""
+
+import argparse
+import asyncio
+import time
+
+from collections import Counter
+from typing import Dict
+from typing import Final
+from typing import List
+from typing import Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from .stand import make_workbook
+from ..core.records import GroupKey
+from ..core.records import LessonBatch
+from ..core.records import LessonRecord
+from ..core.records import WeekKey
+from ..core.xls import parse_workbook
+from ..database.tables import Base
+from ..engine.worker import BatchCTE_exporter
+from ..engine.worker import Engine
+
+
+class LegacyCTEExporter(BatchCTE_exporter):
+    """Прежний запрос: недели и группы в CTE, уроки - VALUES с
+    подзапросами. Цель ON CONFLICT - прежнее ограничение
+    uix_lesson_unique (в прежнем списке столбцов не было study_form, и
+    запрос к такой схеме падал), ошибки не глотаются, а дата и время
+    подставляются в ISO, как их теперь принимают столбцы date и time.
+    """
+
+    async def _execute_copy_merge(
+        self,
+        weeks_data: Dict[str, WeekKey],
+        groups_data: Dict[str, GroupKey],
+        lessons_data: List[LessonBatch]
+    ) -> None:
+        async with self.session_factory() as session:
+            async with session.begin():
+                result = await session.execute(self._build_query(
+                    list(weeks_data.values()), 
+                    list(groups_data.values()), 
+                    [
+                        lesson 
+                        for batch in lessons_data 
+                        for lesson in batch.records()
+                    ]
+                ))
+        self.inserted_lessons += result.rowcount
+        self.upserted_keys += len(weeks_data) + len(groups_data)
+
+    def _build_query(
+        self,
+        weeks_data: List[WeekKey],
+        groups_data: List[GroupKey],
+        lessons_data: List[LessonRecord]
+    ):
+        weeks = ", ".join(
+            f"('{w.year}', '{w.semester}', '{w.title}', "
+            f"'{w.start_date}', '{w.end_date}')"
+            for w in weeks_data
+        )
+        groups = ", ".join(
+            f"('{g.name}', '{g.course}', '{g.institute}')"
+            for g in groups_data
+        )
+        lessons = ", ".join(
+            f"("
+            f"(SELECT id FROM week_ids WHERE week_key = "
+            f"'{self._generate_week_temp_key(lesson.week)}'), "
+            f"(SELECT id FROM group_ids WHERE group_key = "
+            f"'{self._generate_group_temp_key(lesson.group)}'), "
+            f"'{lesson.study_form}', '{lesson.weekday}', '{lesson.date}', "
+            f"{lesson.number}, '{lesson.start_time}', "
+            f"'{lesson.title.replace(':', '-')}', '{lesson.teacher}', "
+            f"'{lesson.type}', '{lesson.classroom}')"
+            for lesson in lessons_data
+        )
+        return text(f"""
+            WITH week_ids AS (
+                WITH input_weeks(year, semester, title, start_date, end_date)
+                AS (VALUES {weeks})
+                INSERT INTO week (year, semester, title, start_date, end_date)
+                SELECT * FROM input_weeks
+                ON CONFLICT (title, start_date, end_date) DO UPDATE SET
+                    year = EXCLUDED.year
+                RETURNING id,
+                    CONCAT(title, '|', start_date, '|', end_date) as week_key
+            ), group_ids AS (
+                WITH input_groups(name, course, institute)
+                AS (VALUES {groups})
+                INSERT INTO "group" (name, course, institute)
+                SELECT * FROM input_groups
+                ON CONFLICT (name) DO UPDATE SET
+                    institute = EXCLUDED.institute
+                RETURNING id, name as group_key
+            )
+            INSERT INTO lesson
+                (week_id, group_id, study_form, weekday, date, number,
+                start_time, title, teacher, type_, classroom)
+            VALUES {lessons}
+            ON CONFLICT ON CONSTRAINT uix_lesson_unique DO NOTHING
+        """)
+
+
+def _lessons(files: int, sheets: int, groups: int) -> List[LessonRecord]:
+    collector = BatchCTE_exporter(session_factory=None, batch_size=10 ** 9)
+    engine = Engine(exporter=collector, state_dir=None, parse_workers=0)
+    engine._cycle_stats = Counter()
+
+    async def feed() -> None:
+        for seed in range(files):
+            body = make_workbook(seed, sheets=sheets, groups=groups)
+            await engine._export_sheets(
+                {
+                    "institute": f"Институт {seed % 4 + 1}",
+                    "study_form": "Очная форма",
+                    "semester": "1 семестр",
+                    "course": f"{seed % 4 + 1} курс",
+                },
+                parse_workbook(body, "native")
+            )
+
+    asyncio.run(feed())
+    return [
+        lesson 
+        for batch in collector._lessons_buffer 
+        for lesson in batch.records()
+    ]
+
+
+# Прежняя таблица lesson (строки и ограничение на одиннадцать
+# столбцов): для прогона прежнего запроса
+_LEGACY_SCHEMA: Final[Tuple[str, ...]] = (
+    "DROP TABLE lesson",
+    """
+        CREATE TABLE lesson (
+            id serial PRIMARY KEY,
+            study_form varchar(105),
+            group_id integer NOT NULL REFERENCES "group" (id),
+            week_id integer NOT NULL REFERENCES week (id),
+            weekday varchar(15) NOT NULL,
+            date varchar(15) NOT NULL,
+            number integer NOT NULL,
+            start_time varchar(15) NOT NULL,
+            title varchar(200) NOT NULL,
+            teacher varchar(100),
+            type_ varchar(75),
+            classroom varchar(75),
+            CONSTRAINT uix_lesson_unique UNIQUE (
+                study_form, group_id, week_id, weekday, date, number,
+                start_time, title, teacher, type_, classroom
+            )
+        )
+    """,
+)
+_SIZES: Final[str] = """
+    SELECT pg_table_size('lesson'), pg_indexes_size('lesson')
+"""
+
+
+def _batches(
+    lessons: List[LessonRecord],
+    size: int
+) -> List[List[LessonRecord]]:
+    return [lessons[i:i + size] for i in range(0, len(lessons), size)]
+
+
+def _keys(batch: List[LessonRecord]):
+    # Как в буферах экспортёра: недели и группы пачки без повторов
+    weeks = {lesson.week: None for lesson in batch}
+    groups = {lesson.group.name: lesson.group for lesson in batch}
+    return list(weeks), list(groups.values())
+
+
+def _prepare(lessons: List[LessonRecord], size: int) -> None:
+    legacy = LegacyCTEExporter(session_factory=None)
+    start = time.perf_counter()
+    for batch in _batches(lessons, size):
+        weeks, groups = _keys(batch)
+        str(legacy._build_query(weeks, groups, batch))
+        legacy._week_temp_keys.clear()
+    legacy_time = time.perf_counter() - start
+
+    exporter = BatchCTE_exporter(session_factory=None)
+    # Engine собирает пачки по столбцам сразу, вместо LessonRecord
+    batches = [
+        (batch, LessonBatch.from_records(batch)) 
+        for batch in _batches(lessons, size)
+    ]
+    start = time.perf_counter()
+    for batch, columns in batches:
+        weeks, groups = _keys(batch)
+        # id новых ключей - как если бы их вернул _UPSERT_KEYS
+        for cache, keys in (
+            (exporter._week_ids, {
+                exporter._generate_week_temp_key(week): week for week in weeks
+            }),
+            (exporter._group_ids, {group.name: group for group in groups}),
+        ):
+            for key, row in exporter._changed(cache, {}, keys):
+                cache[key] = (len(cache), row)
+        values = exporter._dimension_values(columns)
+        dimensions = list(exporter._dimension_ids.values())
+        for ids, column in zip(dimensions, values):
+            for value in set(column) - ids.keys() - {None}:
+                ids[value] = len(ids)
+        exporter._group_sets(
+            [columns], 
+            [values], 
+            exporter._week_ids, 
+            exporter._group_ids, 
+            dimensions
+        )
+    copy_time = time.perf_counter() - start
+
+    for name, elapsed in (("CTE text", legacy_time), ("COPY rows", copy_time)):
+        print(
+            f"prepare {name:<10} {elapsed / len(lessons) * 1e6:6.2f} us/lesson"
+        )
+
+
+async def _load(db_url: str, lessons: List[LessonRecord], size: int) -> None:
+    engine = create_async_engine(db_url)
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    try:
+        async def run(name: str, exporter: BatchCTE_exporter) -> None:
+            start = time.perf_counter()
+            await exporter.add_many(lessons)
+            await exporter.finalize()
+            elapsed = time.perf_counter() - start
+            async with engine.connect() as connection:
+                table_size, index_size = (
+                    await connection.execute(text(_SIZES))
+                ).one()
+            print(
+                f"{name:<16} {elapsed:7.2f} s  "
+                f"{len(lessons) / elapsed:8.0f} lessons/s  "
+                f"inserted {exporter.inserted_lessons}, "
+                f"deleted {exporter.deleted_lessons}, "
+                f"week/group upserts {exporter.upserted_keys}, "
+                f"sets skipped {exporter.skipped_sets}\n"
+                f"{'':<16} lesson {table_size / 1024:8.0f} KiB, "
+                f"indexes {index_size / 1024:8.0f} KiB"
+            )
+
+        for name, exporter_class, schema in (
+            ("CTE text", LegacyCTEExporter, _LEGACY_SCHEMA),
+            ("COPY + merge", BatchCTE_exporter, ()),
+            ("COPY, re-import", BatchCTE_exporter, None),
+        ):
+            if schema is not None:
+                async with engine.begin() as connection:
+                    await connection.run_sync(Base.metadata.drop_all)
+                    await connection.run_sync(Base.metadata.create_all)
+                    for statement in schema:
+                        await connection.execute(text(statement))
+            await run(name, exporter_class(session_factory, batch_size=size))
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--files", type=int, default=16)
+    argparser.add_argument("--sheets", type=int, default=18)
+    argparser.add_argument("--groups", type=int, default=4)
+    argparser.add_argument("--batch", type=int, default=600)
+    argparser.add_argument("--db-url")
+    args = argparser.parse_args()
+
+    lessons = _lessons(args.files, args.sheets, args.groups)
+    print(f"{args.files} workbooks, {len(lessons)} lessons, batch {args.batch}")
+    _prepare(lessons, args.batch)
+    if args.db_url:
+        asyncio.run(_load(args.db_url, lessons, args.batch))
+
+
+if __name__ == "__main__":
+    main()
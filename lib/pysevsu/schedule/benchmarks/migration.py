@@ -0,0 +1,532 @@
+"""
+Проверка database.migrate на одноразовой БД: от первой версии схемы до
+текущей.
+
+Все таблицы удаляются, создаются week, "group" и lesson первой версии
+tables.py (строки вместо дат и времени, ограничение на одиннадцать
+столбцов), и в них пишутся уроки книг стенда так, как их писал прежний
+экспорт: str() значений, ':' во времени и предмете - '-', 'None' вместо
+формы обучения, которой нет (последняя книга). Книги с нечётным номером
+пишут даты недель как str() даты из openpyxl ("2025-09-01 00:00:00"),
+каждый седьмой урок повторён с другим написанием даты, дня недели и
+времени - после приведения типов это те же недели и уроки. Неделя без
+дат записана дважды: с 'None' и с пустыми строками.
+
+Шаги применяются в два приёма: сначала до 0006, затем - после ещё
+одной недели без дат с копиями уроков, как её вставлял экспорт между
+0002 и 0006, - остальные. Проверяется, что:
+
+- все шаги записаны в schema_migration, повторный migrate() ничего не
+  применяет;
+- недели и уроки - ровно те, что дают те же строки, приведённые
+  core.xls (as_date, as_time, as_weekday), без повторов;
+- lesson.fingerprint каждого урока равен tables.lesson_fingerprint;
+- каждый урок - ровно в одной части lesson_set с источником '';
+- повторный экспорт стенда через BatchCTE_exporter не вставляет и не
+  удаляет уроков, а части '' недель стенда переходят к книгам.
+
+Нужен PostgreSQL 15+; все таблицы БД удаляются. Запуск (из каталога
+lib):
+    python -m pysevsu.schedule.benchmarks.migration --db-url postgresql+asyncpg://...
+"""
+
+import argparse
+import asyncio
+import datetime
+import time
+
+from collections import Counter
+from typing import Any
+from typing import Dict
+from typing import Final
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from .stand import make_workbook
+from ..core.records import LESSON_FIELDS
+from ..core.xls import as_date
+from ..core.xls import as_time
+from ..core.xls import as_weekday
+from ..core.xls import parse_workbook
+from ..database import migrate as migrations
+from ..database.tables import Base
+from ..database.tables import LESSON_FINGERPRINT_COLUMNS
+from ..database.tables import lesson_fingerprint
+from ..engine.worker import BatchCTE_exporter
+from ..engine.worker import Engine
+
+
+# Таблицы первой версии tables.py
+_BASELINE_SCHEMA: Final[Tuple[str, ...]] = (
+    """
+        CREATE TABLE week (
+            id serial PRIMARY KEY,
+            year varchar(45) NOT NULL,
+            semester varchar(45),
+            title varchar(45) NOT NULL,
+            start_date varchar(45),
+            end_date varchar(45),
+            CONSTRAINT uix_week_unique UNIQUE (title, start_date, end_date)
+        )
+    """,
+    """
+        CREATE TABLE "group" (
+            id serial PRIMARY KEY,
+            name varchar(35) NOT NULL,
+            course varchar(65),
+            institute varchar(105),
+            CONSTRAINT uix_group_unique UNIQUE (name)
+        )
+    """,
+    """
+        CREATE TABLE lesson (
+            id serial PRIMARY KEY,
+            study_form varchar(105),
+            group_id integer NOT NULL REFERENCES "group" (id),
+            week_id integer NOT NULL REFERENCES week (id),
+            weekday varchar(15) NOT NULL,
+            date varchar(15) NOT NULL,
+            number integer NOT NULL,
+            start_time varchar(15) NOT NULL,
+            title varchar(200) NOT NULL,
+            teacher varchar(100),
+            type_ varchar(75),
+            classroom varchar(75),
+            CONSTRAINT uix_lesson_unique UNIQUE (
+                study_form, group_id, week_id, weekday, date, number,
+                start_time, title, teacher, type_, classroom
+            )
+        )
+    """,
+)
+_LESSON_COLUMNS: Final[Tuple[str, ...]] = (
+    "study_form", "group_id", "week_id", "weekday", "date", "number",
+    "start_time", "title", "teacher", "type_", "classroom"
+)
+# Ключи вставлены со своими id: последовательности - за ними
+_SERIALS: Final[Tuple[str, ...]] = tuple(
+    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+    f"(SELECT max(id) FROM {table}))"
+    for table in ("week", '"group"', "lesson")
+)
+
+_YEAR: Final[str] = "2025"
+_SEMESTER: Final[str] = "1 семестр"
+_WEEKDAYS: Final[Tuple[str, ...]] = (
+    "Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота",
+    "Воскресенье"
+)
+_WEEKDAYS_SHORT: Final[Tuple[str, ...]] = (
+    "Пн.", "Вт.", "Ср.", "Чт.", "Пт.", "Сб.", "Вс."
+)
+# Неделя без дат: на стенде таких нет, уроки - копии первого листа
+_UNDATED_WEEK: Final[str] = "уч.н.0"
+_UNDATED_NUMBER: Final[int] = 8
+
+_LESSONS: Final[str] = """
+    SELECT w.title, w.start_date, w.end_date, g.name, l.study_form,
+        l.weekday, l.date, l.number, l.start_time,
+        s.title, t.name, lt.name, c.name
+    FROM lesson l
+    JOIN week w ON w.id = l.week_id
+    JOIN "group" g ON g.id = l.group_id
+    LEFT JOIN subject s ON s.id = l.subject_id
+    LEFT JOIN teacher t ON t.id = l.teacher_id
+    LEFT JOIN lesson_type lt ON lt.id = l.type_id
+    LEFT JOIN classroom c ON c.id = l.classroom_id
+"""
+_FINGERPRINTS: Final[str] = (
+    "SELECT fingerprint, "
+    + ", ".join(LESSON_FINGERPRINT_COLUMNS)
+    + " FROM lesson"
+)
+# Уроки не ровно в одной части '' своего набора
+_UNCLAIMED: Final[str] = """
+    SELECT count(*) FROM lesson l
+    WHERE (
+        SELECT count(*) FROM lesson_set p
+        WHERE p.source = ''
+            AND p.week_id = l.week_id
+            AND p.group_id = l.group_id
+            AND p.study_form = coalesce(l.study_form, '')
+            AND l.fingerprint = ANY (p.lessons)
+    ) <> 1
+"""
+
+Week = Tuple[str, str, str]
+
+
+def _contexts(files: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "institute": f"Институт {seed % 4 + 1}",
+            "study_form": "Очная форма" if seed < files - 1 else None,
+            "semester": _SEMESTER,
+            "course": f"{seed % 4 + 1} курс",
+        }
+        for seed in range(files)
+    ]
+
+
+def _week_date(value: Optional[datetime.date], seed: int) -> str:
+    if value is None:
+        return "None"
+    if seed % 2:
+        return str(datetime.datetime.combine(value, datetime.time()))
+    return f"{value:%d.%m.%Y}"
+
+
+def _lesson_row(
+    study_form: Any,
+    group_id: int,
+    week_id: int,
+    record: Dict[str, Any],
+    variant: bool = False
+) -> Tuple[Any, ...]:
+    # Как подставлял значения в текст запроса прежний экспорт; variant -
+    # то же занятие, записанное иначе ("1.09.2025", "Пн.", "8.30")
+    weekday, date, start_time = (
+        record["weekday"], record["date"], record["start_time"]
+    )
+    if variant:
+        weekday = "None" if weekday is None else _WEEKDAYS_SHORT[weekday - 1]
+        date = "None" if date is None else f"{date.day}.{date:%m.%Y}"
+        start_time = (
+            "None" if start_time is None
+            else f"{start_time.hour}.{start_time:%M}"
+        )
+    else:
+        weekday = "None" if weekday is None else _WEEKDAYS[weekday - 1]
+        date = "None" if date is None else f"{date:%d.%m.%Y}"
+        start_time = (
+            "None" if start_time is None
+            else f"{start_time:%H:%M}".replace(":", "-")
+        )
+    return (
+        str(study_form), group_id, week_id, weekday, date,
+        record["number"], start_time, str(record["title"]).replace(":", "-"),
+        str(record["teacher"]), str(record["type"]), str(record["classroom"])
+    )
+
+
+def _baseline(
+    workbooks: List[Tuple[Dict[str, Any], list]]
+) -> Tuple[Dict[Week, int], Dict[str, Tuple[int, str, str]], List[tuple]]:
+    """Строки week, "group" и lesson первой версии (с id)."""
+    weeks: Dict[Week, int] = dict()
+    groups: Dict[str, Tuple[int, str, str]] = dict()
+    # Повторы отбрасывал ON CONFLICT по uix_lesson_unique
+    lessons: Dict[Tuple[Any, ...], None] = dict()
+
+    def group_id(name: str, data: Dict[str, Any]) -> int:
+        return groups.setdefault(
+            name, (len(groups) + 1, data["course"], data["institute"])
+        )[0]
+
+    for seed, (data, sheets) in enumerate(workbooks):
+        for title, start_date, end_date, records in sheets:
+            week_id = weeks.setdefault((
+                title, _week_date(start_date, seed), _week_date(end_date, seed)
+            ), len(weeks) + 1)
+            for index, values in enumerate(records):
+                record = dict(zip(LESSON_FIELDS, values))
+                row = (
+                    data["study_form"],
+                    group_id(record["group"], data),
+                    week_id,
+                    record
+                )
+                lessons[_lesson_row(*row)] = None
+                if index % 7 == 0:
+                    lessons[_lesson_row(*row, variant=True)] = None
+
+    data, sheets = workbooks[0]
+    *_, records = sheets[0]
+    for dates in ("None", ""):
+        week_id = weeks.setdefault((_UNDATED_WEEK, dates, dates), len(weeks) + 1)
+        for values in records:
+            record = dict(zip(LESSON_FIELDS, values))
+            lessons[_lesson_row(
+                data["study_form"], group_id(record["group"], data),
+                week_id, record
+            )] = None
+    return weeks, groups, list(lessons)
+
+
+def _expected(
+    weeks: Dict[Week, int],
+    groups: Dict[str, Tuple[int, str, str]],
+    lessons: List[tuple]
+) -> Tuple[Set[tuple], Set[tuple]]:
+    """Недели и уроки (как их читает _LESSONS), которые должны получиться
+    из строк первой версии."""
+    def value(text: str) -> Optional[str]:
+        # 'None' от str(None) - NULL (шаги 0003 и 0005)
+        return None if text == "None" else text
+
+    week_of = {
+        week_id: (title, as_date(start_date), as_date(end_date))
+        for (title, start_date, end_date), week_id in weeks.items()
+    }
+    group_of = {group_id: name for name, (group_id, *_) in groups.items()}
+    expected: Set[tuple] = set()
+    for (
+        study_form, group_id, week_id, weekday, date, number, start_time,
+        title, teacher, type_, classroom
+    ) in lessons:
+        day = as_date(date)
+        expected.add((
+            *week_of[week_id], group_of[group_id], value(study_form),
+            as_weekday(weekday, day), day, number, as_time(start_time),
+            value(title), value(teacher), value(type_), value(classroom)
+        ))
+
+    # Урок, который добавляет _duplicate_undated_week
+    first = next(row for row in lessons if row[2] == weeks[
+        (_UNDATED_WEEK, "None", "None")
+    ])
+    day = as_date(first[4])
+    expected.add((
+        _UNDATED_WEEK, None, None, group_of[first[1]], value(first[0]),
+        as_weekday(first[3], day), day, _UNDATED_NUMBER, as_time(first[6]),
+        *map(value, first[7:])
+    ))
+    return set(week_of.values()), expected
+
+
+async def _load_baseline(
+    engine: AsyncEngine,
+    weeks: Dict[Week, int],
+    groups: Dict[str, Tuple[int, str, str]],
+    lessons: List[tuple]
+) -> None:
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.execute(text("DROP TABLE IF EXISTS schema_migration"))
+        for statement in _BASELINE_SCHEMA:
+            await connection.execute(text(statement))
+
+        raw_connection = await connection.get_raw_connection()
+        driver = raw_connection.driver_connection
+        await driver.copy_records_to_table(
+            "week",
+            records=[
+                (week_id, _YEAR, _SEMESTER, *week)
+                for week, week_id in weeks.items()
+            ],
+            columns=("id", "year", "semester", "title", "start_date", "end_date")
+        )
+        await driver.copy_records_to_table(
+            "group",
+            records=[(group_id, name, *rest) for name, (group_id, *rest) in groups.items()],
+            columns=("id", "name", "course", "institute")
+        )
+        # id - в порядке строк: первый урок недели без дат - меньший
+        await driver.copy_records_to_table(
+            "lesson", records=lessons, columns=_LESSON_COLUMNS
+        )
+        for statement in _SERIALS:
+            await connection.execute(text(statement))
+
+
+async def _migrate_until(engine: AsyncEngine, name: str) -> List[str]:
+    # Шаги до name; migrate берёт MIGRATIONS модуля при вызове
+    steps = migrations.MIGRATIONS
+    migrations.MIGRATIONS = steps[:[step for step, _ in steps].index(name)]
+    try:
+        return await migrations.migrate(engine)
+    finally:
+        migrations.MIGRATIONS = steps
+
+
+async def _duplicate_undated_week(engine: AsyncEngine) -> None:
+    # Так неделю без дат писал экспорт между шагами 0002 и 0006: NULL в
+    # uix_week_unique не совпадал сам с собой, и неделя со всеми
+    # уроками вставлялась снова. Один урок есть только в новой копии
+    columns = LESSON_FINGERPRINT_COLUMNS[1:]
+    extra = ", ".join(
+        "CAST(:number AS smallint)" if column == "number" else column for column in columns
+    )
+    columns = ", ".join(columns)
+    async with engine.begin() as connection:
+        parameters = {"title": _UNDATED_WEEK}
+        parameters["old_id"] = await connection.scalar(
+            text("SELECT id FROM week WHERE title = :title"), parameters
+        )
+        parameters["week_id"] = await connection.scalar(
+            text(
+                "INSERT INTO week (year, semester, title) "
+                "VALUES (:year, :semester, :title) RETURNING id"
+            ),
+            {**parameters, "year": _YEAR, "semester": _SEMESTER}
+        )
+        await connection.execute(
+            text(f"""
+                INSERT INTO lesson (week_id, {columns}, fingerprint)
+                SELECT CAST(:week_id AS integer), {columns}, gen_random_uuid()
+                FROM lesson WHERE week_id = :old_id
+            """),
+            parameters
+        )
+        await connection.execute(
+            text(f"""
+                INSERT INTO lesson (week_id, {columns}, fingerprint)
+                SELECT CAST(:week_id AS integer), {extra}, gen_random_uuid()
+                FROM lesson
+                WHERE id = (SELECT min(id) FROM lesson WHERE week_id = :old_id)
+            """),
+            {**parameters, "number": _UNDATED_NUMBER}
+        )
+        await connection.execute(
+            text(f"""
+                UPDATE lesson SET fingerprint = {migrations.LESSON_FINGERPRINT_SQL}
+                WHERE week_id = :week_id
+            """),
+            parameters
+        )
+
+
+async def _check(
+    engine: AsyncEngine,
+    weeks: Set[tuple],
+    lessons: Set[tuple]
+) -> None:
+    async with engine.connect() as connection:
+        raw_connection = await connection.get_raw_connection()
+        driver = raw_connection.driver_connection
+
+        journal = {
+            record[0]
+            for record in await driver.fetch("SELECT name FROM schema_migration")
+        }
+        assert journal == {name for name, _ in migrations.MIGRATIONS}, (
+            f"steps not journaled: {journal}"
+        )
+
+        found = Counter(
+            tuple(record) for record in await driver.fetch(
+                "SELECT title, start_date, end_date FROM week"
+            )
+        )
+        assert set(found) == weeks and max(found.values()) == 1, (
+            f"weeks differ: {found} against {weeks}"
+        )
+
+        found = Counter(
+            tuple(record) for record in await driver.fetch(_LESSONS)
+        )
+        assert max(found.values()) == 1, "lessons repeat after migration"
+        assert set(found) == lessons, (
+            f"lessons differ: {len(set(found) - lessons)} unexpected, "
+            f"{len(lessons - set(found))} missing"
+        )
+
+        mismatched = [
+            record for record in await driver.fetch(_FINGERPRINTS)
+            if record[0].hex != lesson_fingerprint(tuple(record)[1:])
+        ]
+        assert not mismatched, (
+            f"{len(mismatched)} fingerprints differ, e.g. {mismatched[0]}"
+        )
+
+        assert await driver.fetchval(_UNCLAIMED) == 0, (
+            "lessons outside the '' parts of lesson_set"
+        )
+        assert await driver.fetchval(
+            "SELECT count(*) FROM lesson_set WHERE source <> ''"
+        ) == 0, "lesson_set parts with a source after migration"
+
+    print(f"migrated: {len(weeks)} weeks, {len(lessons)} lessons")
+
+
+async def _reexport(
+    engine: AsyncEngine,
+    workbooks: List[Tuple[Dict[str, Any], list]],
+    lessons: int
+) -> None:
+    exporter = BatchCTE_exporter(
+        async_sessionmaker(bind=engine, expire_on_commit=False),
+        batch_size=2000
+    )
+    feeder = Engine(exporter=exporter, state_dir=None, parse_workers=0)
+    feeder._cycle_stats = Counter()
+    for seed, (data, sheets) in enumerate(workbooks):
+        await feeder._export_sheets(data, sheets, source=f"stand-{seed}")
+    await exporter.finalize()
+    # На стенде нет ':' в названиях: после миграции уроки те же
+    assert (exporter.inserted_lessons, exporter.deleted_lessons) == (0, 0), (
+        f"re-export changed lessons: inserted {exporter.inserted_lessons}, "
+        f"deleted {exporter.deleted_lessons}"
+    )
+
+    async with engine.connect() as connection:
+        assert await connection.scalar(
+            text("SELECT count(*) FROM lesson")
+        ) == lessons, "lesson count changed on re-export"
+        unknown = await connection.scalar(
+            text("""
+                SELECT count(*) FROM lesson_set p
+                JOIN week w ON w.id = p.week_id
+                WHERE p.source = '' AND w.title <> :title
+            """),
+            {"title": _UNDATED_WEEK}
+        )
+        assert unknown == 0, f"{unknown} '' parts left after re-export"
+    print(f"re-export: {exporter.synced_sets} sets, no lessons changed")
+
+
+async def _run(args: argparse.Namespace) -> None:
+    workbooks = [
+        (
+            data,
+            parse_workbook(
+                make_workbook(seed, sheets=args.sheets, groups=args.groups),
+                "native"
+            )
+        )
+        for seed, data in enumerate(_contexts(args.files))
+    ]
+    weeks, groups, lessons = _baseline(workbooks)
+    expected_weeks, expected_lessons = _expected(weeks, groups, lessons)
+    print(
+        f"baseline: {len(weeks)} weeks, {len(groups)} groups, "
+        f"{len(lessons)} lessons"
+    )
+
+    engine = create_async_engine(args.db_url)
+    try:
+        await _load_baseline(engine, weeks, groups, lessons)
+        start = time.perf_counter()
+        applied = await _migrate_until(engine, "0006_week_nulls_not_distinct")
+        await _duplicate_undated_week(engine)
+        applied += await migrations.migrate(engine)
+        print(f"applied {len(applied)} steps in {time.perf_counter() - start:.1f} s")
+        assert applied == [name for name, _ in migrations.MIGRATIONS], (
+            f"applied {applied}"
+        )
+        assert await migrations.migrate(engine) == [], "steps applied twice"
+
+        await _check(engine, expected_weeks, expected_lessons)
+        await _reexport(engine, workbooks, len(expected_lessons))
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--db-url", required=True)
+    argparser.add_argument("--files", type=int, default=6)
+    argparser.add_argument("--sheets", type=int, default=6)
+    argparser.add_argument("--groups", type=int, default=4)
+    asyncio.run(_run(argparser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Разбор книги против загрузки результата из ParseCache.
+
+Для каждой книги стенда: время parse_workbook (openpyxl и native) и
+время ParseCache.load того же результата с диска, размер книги и
+сохранённого результата.
+
+Запуск (из каталога lib):
+    python -m pysevsu.schedule.benchmarks.parsecache --files 8
+"""
+
+import argparse
+import tempfile
+import time
+
+from typing import Callable
+from typing import List
+
+from .stand import make_workbook
+from ..core.cache import ParseCache
+from ..core.xls import PARSER_VERSION
+from ..core.xls import parse_workbook
+
+
+def _best(run: Callable[[], object], repeat: int) -> float:
+    timings: List[float] = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--files", type=int, default=8)
+    argparser.add_argument("--sheets", type=int, default=18)
+    argparser.add_argument("--groups", type=int, default=4)
+    argparser.add_argument("--repeat", type=int, default=3)
+    args = argparser.parse_args()
+
+    bodies = [
+        make_workbook(seed, sheets=args.sheets, groups=args.groups)
+        for seed in range(args.files)
+    ]
+    with tempfile.TemporaryDirectory() as root:
+        cache = ParseCache(root, PARSER_VERSION)
+        keys = list()
+        for body in bodies:
+            key = cache.key(cache.digest(body), "native")
+            cache.store(key, parse_workbook(body, "native"))
+            keys.append(key)
+        assert [cache.load(key) for key in keys] == [
+            parse_workbook(body, "openpyxl") for body in bodies
+        ], "cached result differs from parse_workbook"
+
+        timings = {
+            "openpyxl": _best(
+                lambda: [parse_workbook(body, "openpyxl") for body in bodies],
+                args.repeat
+            ),
+            "native": _best(
+                lambda: [parse_workbook(body, "native") for body in bodies],
+                args.repeat
+            ),
+            "ParseCache": _best(
+                lambda: [cache.load(key) for key in keys], args.repeat
+            ),
+        }
+        size = cache.size
+
+    print(
+        f"{args.files} workbooks, {sum(map(len, bodies)) / 1024:.0f} KiB xlsx, "
+        f"{size / 1024:.0f} KiB cached"
+    )
+    for name, elapsed in timings.items():
+        print(
+            f"{name:<10} {elapsed / args.files * 1e3:7.2f} ms/workbook  "
+            f"x{timings['openpyxl'] / elapsed:6.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Масштабирование разбора книг по числу процессов.
+
+Генерирует книги во временный каталог и разбирает их parse_workbook
+в ProcessPoolExecutor с 1, 2, 4... процессами (до числа ядер), как это
+делает Engine с ``parse_workers``. Сеть и БД не участвуют.
+
+Запуск (из каталога lib):
+    python -m pysevsu.schedule.benchmarks.pool --files 32 --groups 8
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+from .stand import make_workbook
+from ..core.xls import parse_workbook
+
+
+def _count(paths: List[str], workers: int) -> int:
+    if workers == 0:
+        return sum(
+            len(records) 
+            for path in paths 
+            for *_, records in parse_workbook(path)
+        )
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        # Прогреть процессы, чтобы не мерить запуск интерпретатора
+        for future in [pool.submit(os.getpid) for _ in range(workers)]:
+            future.result()
+        return sum(
+            len(records)
+            for sheets in pool.map(parse_workbook, paths)
+            for *_, records in sheets
+        )
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--files", type=int, default=16)
+    argparser.add_argument("--sheets", type=int, default=18)
+    argparser.add_argument("--groups", type=int, default=4)
+    argparser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = argparser.parse_args()
+
+    workers = [0]
+    while workers[-1] < args.max_workers:
+        workers.append(max(1, workers[-1] * 2))
+    workers[-1] = min(workers[-1], args.max_workers)
+
+    with tempfile.TemporaryDirectory() as root:
+        paths: List[str] = list()
+        for seed in range(args.files):
+            path = os.path.join(root, str(seed))
+            with open(path, "wb") as file:
+                file.write(make_workbook(
+                    seed, sheets=args.sheets, groups=args.groups
+                ))
+            paths.append(path)
+        print(f"{args.files} workbooks, {os.cpu_count()} cpu")
+
+        baseline = None
+        for count in workers:
+            start = time.perf_counter()
+            lessons = _count(paths, count)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            name = "inline" if count == 0 else f"{count} workers"
+            print(
+                f"{name:<11} {elapsed:7.2f} s  "
+                f"files {args.files / elapsed:6.1f}/s  "
+                f"lessons {lessons / elapsed:8.0f}/s  "
+                f"speedup x{baseline / elapsed:.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
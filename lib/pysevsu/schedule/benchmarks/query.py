@@ -0,0 +1,243 @@
+"""
+Задержка выборок database.query на заполненной БД.
+
+Таблицы пересоздаются (Base.metadata) и заполняются уроками книг стенда
+через BatchCTE_exporter; по умолчанию это около миллиона уроков (50
+книг по 40 недель и 20 групп). Затем VACUUM ANALYZE - без него карта
+видимости пуста, и покрывающие индексы читаются с обращением к таблице.
+С --no-load используются уже загруженные данные.
+
+Каждая функция вызывается ``--calls`` раз со случайными аргументами:
+группа, преподаватель или аудитория и неделя с понедельника, для
+free_classrooms - день и номер пары. ``--concurrency`` - число
+соединений, вызывающих параллельно. Печатаются p50, p99 и максимум
+задержки и число вызовов в секунду; с --explain - план каждого запроса.
+С --cache выборки уроков идут через QueryCache; аргументы берутся из
+``--distinct`` заранее выбранных наборов, и печатается доля попаданий.
+
+Запуск (из каталога lib):
+    python -m pysevsu.schedule.benchmarks.query --db-url postgresql+asyncpg://...
+"""
+
+import argparse
+import asyncio
+import datetime
+import random
+import statistics
+import time
+
+from collections import Counter
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from .stand import make_workbook
+from ..core.xls import parse_workbook
+from ..database import query
+from ..database.query import QueryCache
+from ..database.tables import Base
+from ..engine.worker import BatchCTE_exporter
+from ..engine.worker import Engine
+
+
+Call = Callable[[AsyncConnection], Awaitable[Any]]
+
+
+async def _load(engine: AsyncEngine, args: argparse.Namespace) -> None:
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+
+    exporter = BatchCTE_exporter(
+        async_sessionmaker(bind=engine, expire_on_commit=False),
+        batch_size=2000
+    )
+    feeder = Engine(exporter=exporter, state_dir=None, parse_workers=0)
+    feeder._cycle_stats = Counter()
+    start = time.perf_counter()
+    for seed in range(args.files):
+        body = make_workbook(seed, sheets=args.sheets, groups=args.groups)
+        await feeder._export_sheets(
+            {
+                "institute": f"Институт {seed % 4 + 1}",
+                "study_form": "Очная форма",
+                "semester": "1 семестр",
+                "course": f"{seed % 4 + 1} курс",
+            },
+            parse_workbook(body, "native")
+        )
+    await exporter.finalize()
+    print(
+        f"loaded {exporter.inserted_lessons} lessons "
+        f"in {time.perf_counter() - start:.0f} s"
+    )
+
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(
+            isolation_level="AUTOCOMMIT"
+        )
+        await connection.execute(text("VACUUM ANALYZE"))
+
+
+async def _calls(
+    connection: AsyncConnection,
+    rng: random.Random,
+    cache: Optional[QueryCache],
+    distinct: int
+) -> List[Tuple[str, str, Call]]:
+    async def column(sql: str) -> List[Any]:
+        return list((await connection.execute(text(sql))).scalars())
+
+    groups = await column('SELECT name FROM "group"')
+    teachers = await column("SELECT name FROM teacher")
+    classrooms = await column("SELECT name FROM classroom")
+    dates = await column("SELECT DISTINCT date FROM lesson WHERE date IS NOT NULL")
+
+    def week() -> Tuple[datetime.date, datetime.date]:
+        day = rng.choice(dates)
+        monday = day - datetime.timedelta(days=day.weekday())
+        return monday, monday + datetime.timedelta(days=6)
+
+    def lessons(function: str, names: List[str]) -> Callable[[], Call]:
+        function = getattr(query if cache is None else cache, function)
+        if cache is None:
+            choices = lambda: (rng.choice(names), week())
+        else:
+            # Повторяющиеся запросы: ограниченный набор аргументов
+            arguments = [(rng.choice(names), week()) for _ in range(distinct)]
+            choices = lambda: rng.choice(arguments)
+
+        def make_call() -> Call:
+            name, window = choices()
+            return lambda connection: function(connection, name, window)
+        return make_call
+
+    def free() -> Call:
+        day, number = rng.choice(dates), rng.randint(1, 6)
+        return lambda connection: query.free_classrooms(connection, day, number)
+
+    return [
+        ("lessons_for_group", query._GROUP_LESSONS,
+            lessons("lessons_for_group", groups)),
+        ("lessons_for_teacher", query._TEACHER_LESSONS,
+            lessons("lessons_for_teacher", teachers)),
+        ("lessons_for_classroom", query._CLASSROOM_LESSONS,
+            lessons("lessons_for_classroom", classrooms)),
+        ("free_classrooms", query._FREE_CLASSROOMS, free),
+    ]
+
+
+async def _explain(
+    connection: AsyncConnection,
+    sql: str,
+    call: Call
+) -> None:
+    # Аргументы - те же, что у вызова: перехватываются в _fetch
+    captured: List[Any] = list()
+
+    async def fetch(connection: AsyncConnection, sql: str, *args: Any):
+        captured.extend(args)
+        return []
+
+    original, query._fetch = query._fetch, fetch
+    try:
+        await call(connection)
+    finally:
+        query._fetch = original
+    raw_connection = await connection.get_raw_connection()
+    for record in await raw_connection.driver_connection.fetch(
+        f"EXPLAIN (ANALYZE, BUFFERS) {sql}", *captured
+    ):
+        print(f"    {record[0]}")
+
+
+async def _measure(
+    engine: AsyncEngine,
+    make_call: Callable[[], Call],
+    calls: int,
+    concurrency: int
+) -> Tuple[List[float], float]:
+    latencies: List[float] = list()
+
+    async def worker(count: int) -> None:
+        async with engine.connect() as connection:
+            # Подготовка запроса на соединении - не в замерах
+            await make_call()(connection)
+            for _ in range(count):
+                call = make_call()
+                start = time.perf_counter()
+                await call(connection)
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        worker(calls // concurrency) for _ in range(concurrency)
+    ))
+    return latencies, time.perf_counter() - start
+
+
+async def _run(args: argparse.Namespace) -> None:
+    engine = create_async_engine(args.db_url, pool_size=args.concurrency)
+    try:
+        if not args.no_load:
+            await _load(engine, args)
+        rng = random.Random(args.seed)
+        cache = QueryCache() if args.cache else None
+        async with engine.connect() as connection:
+            if args.explain:
+                # Без кэша: перехваченная выборка в нём сохранилась бы пустой
+                for name, sql, make_call in await _calls(
+                    connection, rng, None, args.distinct
+                ):
+                    print(name)
+                    await _explain(connection, sql, make_call())
+            calls = await _calls(connection, rng, cache, args.distinct)
+
+        for name, _, make_call in calls:
+            latencies, elapsed = await _measure(
+                engine, make_call, args.calls, args.concurrency
+            )
+            percentiles = statistics.quantiles(latencies, n=100)
+            print(
+                f"{name:<22} p50 {percentiles[49] * 1e3:7.2f} ms  "
+                f"p99 {percentiles[98] * 1e3:7.2f} ms  "
+                f"max {max(latencies) * 1e3:7.2f} ms  "
+                f"{len(latencies) / elapsed:7.0f} calls/s"
+            )
+        if cache is not None:
+            print(
+                f"cache: hits {cache.hits}, misses {cache.misses} "
+                f"({cache.hits / max(cache.hits + cache.misses, 1):.1%}), "
+                f"evictions {cache.evictions}"
+            )
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--db-url", required=True)
+    argparser.add_argument("--files", type=int, default=50)
+    argparser.add_argument("--sheets", type=int, default=40)
+    argparser.add_argument("--groups", type=int, default=20)
+    argparser.add_argument("--calls", type=int, default=2000)
+    argparser.add_argument("--concurrency", type=int, default=1)
+    argparser.add_argument("--seed", type=int, default=1)
+    argparser.add_argument("--no-load", action="store_true")
+    argparser.add_argument("--explain", action="store_true")
+    argparser.add_argument("--cache", action="store_true")
+    argparser.add_argument("--distinct", type=int, default=500)
+    asyncio.run(_run(argparser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
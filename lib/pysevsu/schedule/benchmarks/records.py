@@ -0,0 +1,194 @@
+"""
+Аллокации на урок: словари против LessonBatch.
+
+Прежний путь - слияние записи в словарь листа и три словаря на урок в
+BatchCTE_exporter.add - воспроизведён в LegacyDictExporter/_feed_dicts.
+Новый - Engine._export_sheets с уроками листа по столбцам. Оба
+экспортёра только накапливают уроки в буфере (без БД). Разбор книг в
+замер не входит.
+
+Меряется время на урок (под tracemalloc, поэтому с накладными
+расходами), память и число блоков, удерживаемых буфером на урок, и пик
+выделенной памяти - в него входят и временные словари.
+
+Запуск (из каталога lib):
+    python -m pysevsu.schedule.benchmarks.records --files 16
+"""
+
+import argparse
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+
+from collections import Counter
+from typing import Any
+from typing import Callable
+from typing import Coroutine
+from typing import Dict
+from typing import List
+
+from .stand import make_workbook
+from ..core.xls import LESSON_FIELDS
+from ..core.xls import SheetLessons
+from ..core.xls import parse_workbook
+from ..engine.worker import BatchCTE_exporter
+from ..engine.worker import Engine
+
+
+class LegacyDictExporter(BatchCTE_exporter):
+    """Прежний BatchCTE_exporter.add - для сравнения."""
+
+    def __init__(self):
+        super().__init__(session_factory=None, batch_size=10 ** 9)
+        self._weeks_buffer: List[Dict[str, Any]] = []
+        self._groups_buffer: List[Dict[str, Any]] = []
+        self._week_key_cache = set()
+        self._group_key_cache = set()
+
+    async def add(self, data: Dict[str, Any]) -> None:
+        async with self._buffer_lock:
+            week_data = {
+                'year': data.get('year', '2025'),
+                'semester': data.get('semester'),
+                'title': data['week'],
+                'start_date': str(data.get('start_date')),
+                'end_date': str(data.get('end_date'))
+            }
+            week_temp_key = (
+                f"{week_data['title']}|{week_data['start_date']}|"
+                f"{week_data['end_date']}"
+            )
+            group_data = {
+                'name': data['group'],
+                'course': data['course'],
+                'institute': data['institute']
+            }
+            group_temp_key = group_data['name']
+
+            if week_temp_key not in self._week_key_cache:
+                self._weeks_buffer.append(week_data)
+                self._week_key_cache.add(week_temp_key)
+
+            if group_temp_key not in self._group_key_cache:
+                self._groups_buffer.append(group_data)
+                self._group_key_cache.add(group_temp_key)
+
+            self._lessons_buffer.append({
+                'week_key': week_temp_key,
+                'group_key': group_temp_key,
+                'study_form': data.get('study_form'),
+                'weekday': data.get('weekday'),
+                'date': data.get('date'),
+                'number': data.get('number'),
+                'start_time': data.get('start_time'),
+                'title': data.get('title'),
+                'teacher': data.get('teacher'),
+                'type_': data.get('type'),
+                'classroom': data.get('classroom')
+            })
+
+
+async def _feed_dicts(
+    exporter: LegacyDictExporter,
+    files: List[Dict[str, Any]],
+    parsed: List[List[SheetLessons]]
+) -> LegacyDictExporter:
+    for data, sheets in zip(files, parsed):
+        data = dict(data)
+        for title, start_date, end_date, records in sheets:
+            data["week"] = title
+            data["start_date"] = start_date
+            data["end_date"] = end_date
+
+            sheet_data = data.copy()
+            for record in records:
+                sheet_data.update(zip(LESSON_FIELDS, record))
+                await exporter.add(sheet_data)
+    return exporter
+
+
+async def _feed_records(
+    exporter: BatchCTE_exporter,
+    files: List[Dict[str, Any]],
+    parsed: List[List[SheetLessons]]
+) -> BatchCTE_exporter:
+    engine = Engine(exporter=exporter, state_dir=None, parse_workers=0)
+    engine._cycle_stats = Counter()
+    for data, sheets in zip(files, parsed):
+        await engine._export_sheets(dict(data), sheets)
+    return exporter
+
+
+def _measure(
+    name: str,
+    feed: Callable[[], Coroutine[Any, Any, BatchCTE_exporter]],
+    lessons: int
+) -> None:
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    start = time.perf_counter()
+    # Экспортёр жив до замера: его буфер и есть удерживаемая память
+    exporter = asyncio.run(feed())
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    blocks = sys.getallocatedblocks() - blocks
+    del exporter
+
+    print(
+        f"{name:<14} {elapsed / lessons * 1e6:6.2f} us/lesson (traced)  "
+        f"retained {current / lessons:5.0f} B, "
+        f"{blocks / lessons:4.1f} blocks/lesson  "
+        f"peak {peak / 1024 ** 2:5.1f} MiB"
+    )
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--files", type=int, default=16)
+    argparser.add_argument("--sheets", type=int, default=18)
+    argparser.add_argument("--groups", type=int, default=4)
+    args = argparser.parse_args()
+
+    parsed = [
+        parse_workbook(
+            make_workbook(seed, sheets=args.sheets, groups=args.groups),
+            "native"
+        )
+        for seed in range(args.files)
+    ]
+    files = [
+        {
+            "institute": f"Институт {seed % 4 + 1}",
+            "study_form": "Очная форма",
+            "semester": "1 семестр",
+            "course": f"{seed % 4 + 1} курс",
+            "excel_url": f"/download.php?file={seed}"
+        }
+        for seed in range(args.files)
+    ]
+    lessons = sum(len(records) for sheets in parsed for *_, records in sheets)
+    print(f"{args.files} workbooks, {lessons} lessons")
+
+    _measure(
+        "dicts",
+        lambda: _feed_dicts(LegacyDictExporter(), files, parsed),
+        lessons
+    )
+    _measure(
+        "LessonBatch",
+        lambda: _feed_records(
+            BatchCTE_exporter(session_factory=None, batch_size=10 ** 9),
+            files,
+            parsed
+        ),
+        lessons
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Локальная замена sevsu.ru для нагрузочных прогонов.
+
+Отдаёт синтетическую страницу расписания с теми же CSS-классами, что
+разбирает Parser, и ``download.php?file=...`` со сгенерированными
+книгами в формате, который ожидают ExcelFile/Worksheet. Задержка,
+доля ошибок и размер файлов настраиваются.
+
+Запуск (из каталога lib):
+    python -m pysevsu.schedule.benchmarks.stand --port 8080 --latency 0.05 0.3
+"""
+
+import argparse
+import asyncio
+import datetime
+import hashlib
+import random
+import re
+import zipfile
+
+from io import BytesIO
+from html import escape
+from typing import Optional
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Final
+
+import openpyxl
+
+from openpyxl.styles import Font
+
+from aiohttp import web
+
+
+INDEX_PATH: Final[str] = "/univers/shedule/"
+DOWNLOAD_PATH: Final[str] = "/univers/shedule/download.php"
+
+_WEEKDAYS: Final[Tuple[str, ...]] = (
+    "Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота"
+)
+_TIMES: Final[Tuple[str, ...]] = (
+    "08:30", "10:10", "11:50", "14:00", "15:40", "17:20", "19:00", "20:40"
+)
+_TYPES: Final[Tuple[str, ...]] = ("Лек", "ПЗ", "ЛР")
+_SUBJECTS: Final[Tuple[str, ...]] = (
+    "Математический анализ", "Линейная алгебра", "Физика", "Программирование",
+    "Базы данных", "Иностранный язык", "История России", "Философия",
+    "Экономика", "Теория вероятностей", "Дискретная математика",
+    "Операционные системы", "Компьютерные сети", "Физическая культура",
+)
+_TEACHERS: Final[Tuple[str, ...]] = tuple(
+    f"{surname} {first}.{middle}."
+    for surname in (
+        "Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов",
+        "Васильев", "Новиков", "Морозов", "Волков", "Соколов", "Лебедев",
+    )
+    for first, middle in (("А", "В"), ("С", "Н"), ("Е", "П"))
+)
+_CLASSROOMS: Final[Tuple[str, ...]] = tuple(
+    f"{building}-{room}" for building in "АБВГ" for room in range(101, 131)
+)
+
+
+def make_workbook(
+    seed: int,
+    sheets: int = 18,
+    groups: int = 4,
+    lessons_per_day: int = 4,
+    first_monday: datetime.date = datetime.date(2025, 9, 1),
+    shared_strings: bool = True,
+    blank_dates: float = 0.0
+) -> bytes:
+    """Книга из ``sheets`` листов ``уч.н.N`` по образцу sevsu.ru.
+
+    Строки 0-2 - шапка, 3 - группы, 4 - заголовки столбцов, с 6-й строки
+    по 8 строк на каждый из 6 дней недели (ячейки дней и дат заполнены
+    только в первой строке дня, как объединённые ячейки в оригинале).
+    openpyxl пишет строки прямо в ячейки (inlineStr); ``shared_strings``
+    переносит их в sharedStrings.xml, как это делает Excel.
+
+    С вероятностью ``blank_dates`` ячейка даты дня остаётся пустой, но
+    с форматом - Excel пишет такую ячейку самозакрывающейся
+    (``<c r="B47" s="1"/>``).
+    """
+    rng = random.Random(seed)
+    book = openpyxl.Workbook()
+    book.remove(book.active)
+    group_names = [f"ИС/б-{seed % 50 + 20}-{g + 1}-о" for g in range(groups)]
+
+    for week in range(sheets):
+        sheet = book.create_sheet(f"уч.н.{week + 1}")
+        monday = first_monday + datetime.timedelta(weeks=week)
+
+        sheet.cell(1, 1, "Расписание занятий")
+        sheet.cell(2, 1, f"{week + 1} неделя")
+        for col, title in enumerate(("День", "Дата", "№занятия", "Время"), 1):
+            sheet.cell(5, col, title)
+        for g, group in enumerate(group_names):
+            col = 5 + g * 3
+            sheet.cell(4, col, group)
+            sheet.cell(5, col, "Занятие")
+            sheet.cell(5, col + 1, "Тип")
+            sheet.cell(5, col + 2, "Аудитория")
+
+        for day, weekday in enumerate(_WEEKDAYS):
+            date = monday + datetime.timedelta(days=day)
+            first_row = 7 + day * 8
+            sheet.cell(first_row, 1, weekday)
+            if blank_dates and rng.random() < blank_dates:
+                sheet.cell(first_row, 2).font = Font(bold=True)
+            else:
+                sheet.cell(first_row, 2, date.strftime("%d.%m.%Y"))
+            for number in range(8):
+                row = first_row + number
+                sheet.cell(row, 3, number + 1)
+                sheet.cell(row, 4, _TIMES[number])
+                if number >= lessons_per_day:
+                    continue
+                for g in range(groups):
+                    if rng.random() < 0.25:
+                        continue
+                    col = 5 + g * 3
+                    # Иногда две подгруппы в одной ячейке
+                    count = 2 if rng.random() < 0.15 else 1
+                    sheet.cell(row, col, "\n".join(
+                        f"{rng.choice(_SUBJECTS)}, {rng.choice(_TEACHERS)}"
+                        for _ in range(count)
+                    ))
+                    sheet.cell(row, col + 1, "\n".join(
+                        rng.choice(_TYPES) for _ in range(count)
+                    ))
+                    sheet.cell(row, col + 2, "\n".join(
+                        rng.choice(_CLASSROOMS) for _ in range(count)
+                    ))
+
+    file = BytesIO()
+    book.save(file)
+    if shared_strings:
+        return _to_shared_strings(file.getvalue())
+    return file.getvalue()
+
+
+_INLINE_CELL = re.compile(
+    rb'<c r="([A-Z]+[0-9]+)"( s="[0-9]+")? t="inlineStr">'
+    rb'<is><t(?: xml:space="preserve")?>(.*?)</t></is></c>',
+    re.DOTALL
+)
+
+_CHAR_REF = re.compile(rb"&#([1-9][0-9]{2,});")
+# Пустая ячейка с форматом: openpyxl пишет <c ...></c>, Excel - <c .../>
+_EMPTY_CELL = re.compile(rb'<c ([^>]*)></c>')
+
+
+def _to_shared_strings(body: bytes) -> bytes:
+    strings: Dict[bytes, int] = dict()
+
+    def shared(match: "re.Match[bytes]") -> bytes:
+        # openpyxl пишет не-ASCII ссылками &#NNNN;, Excel - в UTF-8
+        text = _CHAR_REF.sub(
+            lambda ref: chr(int(ref[1])).encode("utf-8"), 
+            match[3]
+        )
+        index = strings.setdefault(text, len(strings))
+        return b'<c r="%s"%s t="s"><v>%d</v></c>' % (
+            match[1], match[2] or b"", index
+        )
+
+    source = zipfile.ZipFile(BytesIO(body))
+    file = BytesIO()
+    with zipfile.ZipFile(file, "w", zipfile.ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            data = source.read(info.filename)
+            if info.filename.startswith("xl/worksheets/"):
+                data = _INLINE_CELL.sub(shared, data)
+                data = _EMPTY_CELL.sub(rb"<c \1/>", data)
+            elif info.filename == "xl/_rels/workbook.xml.rels":
+                data = data.replace(b"</Relationships>", (
+                    b'<Relationship Type="http://schemas.openxmlformats.org/'
+                    b'officeDocument/2006/relationships/sharedStrings" '
+                    b'Target="sharedStrings.xml" Id="rIdStrings"/>'
+                    b"</Relationships>"
+                ))
+            elif info.filename == "[Content_Types].xml":
+                data = data.replace(b"</Types>", (
+                    b'<Override PartName="/xl/sharedStrings.xml" '
+                    b'ContentType="application/vnd.openxmlformats-'
+                    b'officedocument.spreadsheetml.sharedStrings+xml"/>'
+                    b"</Types>"
+                ))
+            target.writestr(info, data)
+
+        table = b"".join(
+            b'<si><t xml:space="preserve">%s</t></si>' % text
+            for text in strings
+        )
+        target.writestr("xl/sharedStrings.xml", (
+            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            b'<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/'
+            b'2006/main" count="%d" uniqueCount="%d">%s</sst>'
+        ) % (len(strings), len(strings), table))
+    return file.getvalue()
+
+
+def make_index_page(
+    institutes: int = 10,
+    study_forms: Tuple[str, ...] = ("Очная форма", "Заочная форма"),
+    semesters: int = 2,
+    courses: int = 4,
+    duplicate_rate: float = 0.0,
+    seed: int = 0
+) -> Tuple[str, List[str]]:
+    """HTML страницы расписания и список идентификаторов файлов.
+
+    С вероятностью ``duplicate_rate`` ссылка ведёт на уже выложенный
+    файл - как общий файл нескольких институтов или форм обучения.
+    """
+    rng = random.Random(seed)
+    ids: List[str] = list()
+    parts: List[str] = ['<html><body><div class="schedule-table__content">']
+    for institute in range(institutes):
+        parts.append(f"<h4>Институт {institute + 1}</h4>")
+        for form in study_forms:
+            parts.append(
+                '<div class="schedule-table__column">'
+                f'<div class="schedule-table__column-name">{escape(form)}</div>'
+            )
+            for semester in range(semesters):
+                parts.append(
+                    '<div class="document-link__group-name">'
+                    f'{semester + 1} семестр</div>'
+                )
+                for course in range(courses):
+                    if ids and rng.random() < duplicate_rate:
+                        file_id = rng.choice(ids)
+                    else:
+                        file_id = f"{institute}-{len(ids)}"
+                        ids.append(file_id)
+                    parts.append(
+                        '<div class="document-link">'
+                        f'<a class="document-link__link" href="{DOWNLOAD_PATH}'
+                        f'?file={file_id}"><span class="document-link__name">'
+                        f'{course + 1} курс</span></a></div>'
+                    )
+            parts.append("</div>")
+    parts.append("</div></body></html>")
+    return "".join(parts), ids
+
+
+class Stand:
+    def __init__(
+        self,
+        institutes: int = 10,
+        courses: int = 4,
+        sheets: int = 18,
+        groups: int = 4,
+        latency: Tuple[float, float] = (0.0, 0.0),
+        error_rate: float = 0.0,
+        seed: int = 0,
+        duplicate_rate: float = 0.0,
+        mirror_rate: float = 0.0
+    ):
+        self.sheets = sheets
+        self.groups = groups
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self.index, self.ids = make_index_page(
+            institutes, 
+            courses=courses, 
+            duplicate_rate=duplicate_rate, 
+            seed=seed
+        )
+        self.requests: int = 0
+        self.errors: int = 0
+
+        self._rng = random.Random(seed)
+        # Доля ``mirror_rate`` файлов - копии других под своим URL
+        self._content_of: Dict[str, str] = {
+            file_id: (
+                self._rng.choice(self.ids[:position])
+                if position and self._rng.random() < mirror_rate
+                else file_id
+            )
+            for position, file_id in enumerate(self.ids)
+        }
+        self._files: Dict[str, bytes] = dict()
+        self._runner: Optional[web.AppRunner] = None
+
+    def workbook(self, file_id: str) -> bytes:
+        file_id = self._content_of[file_id]
+        if file_id not in self._files:
+            self._files[file_id] = make_workbook(
+                seed=self.seed * 100_003 + self.ids.index(file_id),
+                sheets=self.sheets,
+                groups=self.groups
+            )
+        return self._files[file_id]
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(INDEX_PATH, self._index)
+        app.router.add_get(DOWNLOAD_PATH, self._download)
+        return app
+
+    async def _delay(self) -> None:
+        low, high = self.latency
+        if high > 0:
+            await asyncio.sleep(self._rng.uniform(low, high))
+
+    async def _index(self, request: web.Request) -> web.Response:
+        await self._delay()
+        return web.Response(text=self.index, content_type="text/html")
+
+    async def _download(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await self._delay()
+        if self._rng.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=503)
+
+        file_id = request.query.get("file")
+        if file_id not in self.ids:
+            return web.Response(status=404)
+
+        body = await asyncio.to_thread(self.workbook, file_id)
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(
+            body=body,
+            headers={"ETag": etag},
+            content_type="application/vnd.openxmlformats-officedocument."
+                         "spreadsheetml.sheet"
+        )
+
+    def prepare(self) -> None:
+        """Заранее сгенерировать все книги, чтобы не мерить генератор."""
+        for file_id in self.ids:
+            self.workbook(file_id)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--host", default="127.0.0.1")
+    argparser.add_argument("--port", type=int, default=8080)
+    argparser.add_argument("--institutes", type=int, default=10)
+    argparser.add_argument("--courses", type=int, default=4)
+    argparser.add_argument("--sheets", type=int, default=18)
+    argparser.add_argument("--groups", type=int, default=4)
+    argparser.add_argument(
+        "--latency", type=float, nargs=2, default=(0.0, 0.0)
+    )
+    argparser.add_argument("--error-rate", type=float, default=0.0)
+    argparser.add_argument("--seed", type=int, default=0)
+    argparser.add_argument("--duplicate-rate", type=float, default=0.0)
+    argparser.add_argument("--mirror-rate", type=float, default=0.0)
+    args = argparser.parse_args()
+
+    stand = Stand(
+        institutes=args.institutes,
+        courses=args.courses,
+        sheets=args.sheets,
+        groups=args.groups,
+        latency=tuple(args.latency),
+        error_rate=args.error_rate,
+        seed=args.seed,
+        duplicate_rate=args.duplicate_rate,
+        mirror_rate=args.mirror_rate
+    )
+    print(f"{len(stand.ids)} files, index: http://{args.host}:{args.port}{INDEX_PATH}")
+    web.run_app(stand.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
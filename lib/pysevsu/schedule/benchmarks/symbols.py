@@ -0,0 +1,112 @@
+"""
+Память под уроки цикла: без интернирования, SymbolTable на книгу и на цикл.
+
+Книги разбираются как в пуле Engine: результат parse_workbook проходит
+через pickle. Без таблицы каждое повторение преподавателя, аудитории,
+предмета, дня и времени - отдельная строка. SymbolTable на книгу
+(parse_workbook) схлопывает повторы внутри книги, и pickle передаёт их
+ссылками; таблица цикла (Engine._export_sheets) - повторы между книгами.
+
+Меряется память, удерживаемая записями всех книг после разбора
+(tracemalloc), и объём pickle.
+
+Запуск (из каталога lib):
+    python -m pysevsu.schedule.benchmarks.symbols --files 16
+"""
+
+import argparse
+import gc
+import pickle
+import tracemalloc
+
+from io import BytesIO
+from typing import Callable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .stand import make_workbook
+from ..core.symbols import SymbolTable
+from ..core.xls import ExcelFile
+from ..core.xls import SheetLessons
+from ..core.xls import _parse_book
+from ..core.xls import parse_workbook
+
+
+def _plain(body: bytes) -> List[SheetLessons]:
+    return _parse_book(ExcelFile(BytesIO(body), "native"), None)
+
+
+def _per_book(body: bytes) -> List[SheetLessons]:
+    return parse_workbook(body, "native")
+
+
+def _intern_cycle(
+    symbols: SymbolTable,
+    sheets: List[SheetLessons]
+) -> List[SheetLessons]:
+    intern = symbols.intern
+    return [
+        (
+            title, intern(start_date), intern(end_date),
+            [tuple(map(intern, record)) for record in records]
+        )
+        for title, start_date, end_date, records in sheets
+    ]
+
+
+def _measure(
+    bodies: List[bytes],
+    parse: Callable[[bytes], List[SheetLessons]],
+    symbols: Optional[SymbolTable] = None
+) -> Tuple[int, int]:
+    # Pickle - как при возврате из процесса пула
+    payloads = [pickle.dumps(parse(body)) for body in bodies]
+    gc.collect()
+    tracemalloc.start()
+    books = [pickle.loads(payload) for payload in payloads]
+    if symbols is not None:
+        books = [_intern_cycle(symbols, sheets) for sheets in books]
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del books
+    return retained, sum(map(len, payloads))
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--files", type=int, default=16)
+    argparser.add_argument("--sheets", type=int, default=18)
+    argparser.add_argument("--groups", type=int, default=4)
+    args = argparser.parse_args()
+
+    bodies = [
+        make_workbook(seed, sheets=args.sheets, groups=args.groups)
+        for seed in range(args.files)
+    ]
+    expected = [_plain(body) for body in bodies]
+    assert [_per_book(body) for body in bodies] == expected
+    lessons = sum(len(records) for sheets in expected for *_, records in sheets)
+    print(f"{args.files} workbooks, {lessons} lessons")
+
+    symbols = SymbolTable()
+    baseline = None
+    for name, parse, table in (
+        ("plain", _plain, None),
+        ("per book", _per_book, None),
+        ("per cycle", _per_book, symbols),
+    ):
+        retained, pickled = _measure(bodies, parse, table)
+        baseline = baseline or retained
+        print(
+            f"{name:<10} retained {retained / 1024 ** 2:6.2f} MiB "
+            f"({retained / lessons:5.0f} B/lesson, "
+            f"-{100 * (1 - retained / baseline):4.1f}%)  "
+            f"pickle {pickled / 1024:6.0f} KiB"
+        )
+    print(f"cycle table: {len(symbols)} values, {symbols.hits} hits")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Микробенчмарк цикла Worksheet.run_data_stream.
+
+Сравнивает план столбцов с прежним обходом всех ячеек, в котором
+шапка (строки 3-5) перечитывалась для каждой ячейки. Лист загружается
+заранее (stream=False), поэтому меряется только цикл по строкам.
+
+Запуск (из каталога lib):
+    python -m pysevsu.schedule.benchmarks.worksheet --groups 12
+    python -m pysevsu.schedule.benchmarks.worksheet --file schedule.xlsx
+"""
+
+import argparse
+import asyncio
+import time
+
+from io import BytesIO
+from typing import Any
+from typing import List
+from typing import Callable
+
+from .stand import make_workbook
+from ..core.xls import ExcelFile
+from ..core.xls import Worksheet
+
+
+class CellLoopWorksheet(Worksheet):
+    """Прежняя реализация run_data_stream - для сравнения."""
+
+    def _process_column_groups(self, col: int) -> None:
+        cell = self._cell(3, col)
+        if cell:
+            self._result["group"] = cell
+
+    @staticmethod
+    def _value_validation(title: str, value: Any) -> bool:
+        return True if value and title != value else False
+
+    def _process_lesson_information(self, title: str, value: Any) -> None:
+        if title == "День":
+            self._result["weekday"] = value
+        if title == "Дата":
+            self._result["date"] = value
+        if title == "№занятия":
+            self._result["number"] = value
+        if title == "Время":
+            self._result["start_time"] = value
+
+    async def run_data_stream(self) -> object:
+        for row in range(self._max_row):
+            for col in range(self._max_col):
+                self._process_column_groups(col)
+                title = self._get_column_title(col)
+                value = self._cell(row, col)
+
+                if not self._value_validation(title, value):
+                    continue
+
+                self._process_lesson_information(title, value)
+                self._process_lesson_data(title, value)
+
+                if title == "Аудитория":
+                    for record in self._run_cell_processing():
+                        yield record
+                        self._result.clear()
+
+
+async def _collect(sheets: List[Worksheet]) -> List[dict]:
+    records: List[dict] = list()
+    for sheet in sheets:
+        async for record in sheet.run_data_stream():
+            records.append(dict(record))
+    return records
+
+
+def _measure(
+    book: ExcelFile,
+    factory: Callable[..., Worksheet],
+    repeat: int
+) -> List[float]:
+    timings: List[float] = list()
+    for _ in range(repeat):
+        sheets = [
+            factory(book.file[name], name, stream=False)
+            for name in book.sheetnames if name.startswith("уч.н.")
+        ]
+        start = time.perf_counter()
+        asyncio.run(_collect(sheets))
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--file")
+    argparser.add_argument("--sheets", type=int, default=18)
+    argparser.add_argument("--groups", type=int, default=8)
+    argparser.add_argument("--repeat", type=int, default=5)
+    args = argparser.parse_args()
+
+    if args.file:
+        with open(args.file, "rb") as file:
+            body = file.read()
+    else:
+        body = make_workbook(0, sheets=args.sheets, groups=args.groups)
+    book = ExcelFile(BytesIO(body))
+
+    def records(factory: Callable[..., Worksheet]) -> List[dict]:
+        return asyncio.run(_collect([
+            factory(book.file[name], name, stream=False)
+            for name in book.sheetnames if name.startswith("уч.н.")
+        ]))
+
+    expected = records(CellLoopWorksheet)
+    assert records(Worksheet) == expected, "column plan changed the output"
+    print(f"records: {len(expected)}")
+
+    for name, factory in (
+        ("cell loop", CellLoopWorksheet),
+        ("column plan", Worksheet)
+    ):
+        timings = _measure(book, factory, args.repeat)
+        print(
+            f"{name:<12} best: {min(timings) * 1000:8.2f} ms  "
+            f"per record: {min(timings) / len(expected) * 1e6:6.2f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
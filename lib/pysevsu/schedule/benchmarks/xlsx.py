@@ -0,0 +1,117 @@
+"""
+Сравнение ExcelFile(backend="openpyxl") и ExcelFile(backend="native").
+
+Обе реализации разбирают одни и те же книги через parse_workbook;
+перед замером проверяется, что потоки уроков совпадают - полные и по
+окну дат (--window, по умолчанию две первые недели стенда). В книгах
+стенда часть ячеек дат пустая и самозакрывающаяся, как у Excel
+(--blank-dates): по ним отбор листов native читает даты точечно. С
+--window дополнительно меряется разбор только недель из окна (листы вне
+окна отбрасываются по первым строкам).
+
+Запуск (из каталога lib):
+    python -m pysevsu.schedule.benchmarks.xlsx --files 8 --groups 4
+    python -m pysevsu.schedule.benchmarks.xlsx --file a.xlsx --file b.xlsx
+    python -m pysevsu.schedule.benchmarks.xlsx --window 2025-09-01 2025-09-14
+"""
+
+import argparse
+import datetime
+import time
+
+from typing import List
+from typing import Optional
+
+from .stand import make_workbook
+from ..core.xls import DateWindow
+from ..core.xls import ExcelFile
+from ..core.xls import parse_workbook
+
+
+def _best(
+    bodies: List[bytes], 
+    backend: str, 
+    repeat: int,
+    date_window: Optional[DateWindow] = None
+) -> float:
+    timings: List[float] = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for body in bodies:
+            parse_workbook(body, backend, date_window)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--file", action="append", default=[])
+    argparser.add_argument("--files", type=int, default=8)
+    argparser.add_argument("--sheets", type=int, default=18)
+    argparser.add_argument("--groups", type=int, default=4)
+    argparser.add_argument("--repeat", type=int, default=3)
+    argparser.add_argument("--blank-dates", type=float, default=0.1)
+    argparser.add_argument(
+        "--window", 
+        nargs=2, 
+        type=datetime.date.fromisoformat,
+        metavar=("FIRST", "LAST")
+    )
+    args = argparser.parse_args()
+
+    bodies: List[bytes] = list()
+    for path in args.file:
+        with open(path, "rb") as file:
+            bodies.append(file.read())
+    if not bodies:
+        bodies = [
+            make_workbook(
+                seed, 
+                sheets=args.sheets, 
+                groups=args.groups, 
+                blank_dates=args.blank_dates
+            )
+            for seed in range(args.files)
+        ]
+
+    expected = [parse_workbook(body, "openpyxl") for body in bodies]
+    assert [
+        parse_workbook(body, "native") for body in bodies
+    ] == expected, "native backend changed the lesson stream"
+    check_window: DateWindow = tuple(args.window or (
+        datetime.date(2025, 9, 1), datetime.date(2025, 9, 14)
+    ))
+    assert [
+        parse_workbook(body, "native", check_window) for body in bodies
+    ] == [
+        parse_workbook(body, "openpyxl", check_window) for body in bodies
+    ], "native backend changed the lesson stream within the date window"
+    lessons = sum(len(records) for sheets in expected for *_, records in sheets)
+    print(f"{len(bodies)} workbooks, {lessons} lessons")
+
+    best = dict()
+    for backend in ExcelFile.BACKENDS:
+        best[backend] = _best(bodies, backend, args.repeat)
+        print(
+            f"{backend:<9} best: {best[backend]:6.3f} s  "
+            f"files {len(bodies) / best[backend]:6.1f}/s  "
+            f"lessons {lessons / best[backend]:8.0f}/s"
+        )
+    print(f"speedup x{best['openpyxl'] / best['native']:.2f}")
+
+    if args.window:
+        window = tuple(args.window)
+        kept = sum(
+            len(parse_workbook(body, "native", window)) for body in bodies
+        )
+        total = sum(len(sheets) for sheets in expected)
+        print(f"window {window[0]}..{window[1]}: {kept} of {total} sheets")
+        for backend in ExcelFile.BACKENDS:
+            elapsed = _best(bodies, backend, args.repeat, window)
+            print(
+                f"{backend:<9} best: {elapsed:6.3f} s  "
+                f"x{best[backend] / elapsed:.2f} against the full parse"
+            )
+
+if __name__ == "__main__":
+    main()
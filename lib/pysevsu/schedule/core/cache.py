@@ -0,0 +1,253 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+import zlib
+
+from collections import Counter
+from collections import OrderedDict
+from typing import Any
+from typing import Optional
+from typing import Dict
+from typing import List
+from typing import Final
+from typing import Callable
+from typing import IO
+
+
+class WorkbookCache:
+    """Контентно-адресуемый кэш скачанных файлов на диске.
+
+    Тела хранятся в ``objects/<sha[:2]>/<sha>`` и адресуются SHA-256,
+    поэтому одинаковые файлы под разными URL занимают место один раз.
+    ``index.json`` хранит URL -> sha256 и порядок последнего доступа к
+    объектам (LRU). При превышении ``max_size`` вытесняются самые давно
+    использованные объекты вместе со ссылающимися на них URL, кроме
+    закреплённых pin() - их путь отдан на чтение (процессу разбора).
+
+    В режиме ``replay`` кэш - единственный источник данных: вызывающий
+    код не должен обращаться к сети.
+    """
+
+    _INDEX: Final[str] = "index.json"
+    _OBJECTS: Final[str] = "objects"
+
+    def __init__(
+        self,
+        root: str,
+        max_size: int = 1024 ** 3,
+        replay: bool = False
+    ):
+        self.root = root
+        self.max_size = max_size
+        self.replay = replay
+
+        self._urls: Dict[str, str] = dict()
+        # sha256 -> [size, atime], от старых к новым
+        self._objects: OrderedDict[str, List[float]] = OrderedDict()
+        self._size: int = 0
+        # sha256 -> число незавершённых чтений по пути
+        self._pins: Counter = Counter()
+
+        index_path = os.path.join(root, self._INDEX)
+        if os.path.exists(index_path):
+            with open(index_path, encoding="utf-8") as file:
+                index = json.load(file)
+            self._urls = index["urls"]
+            for sha256, entry in index["objects"]:
+                self._objects[sha256] = entry
+                self._size += entry[0]
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def urls(self) -> List[str]:
+        return list(self._urls)
+
+    @staticmethod
+    def digest(body: bytes) -> str:
+        return hashlib.sha256(body).hexdigest()
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root, self._OBJECTS, sha256[:2], sha256)
+
+    def lookup(self, url: str) -> Optional[str]:
+        return self._urls.get(url)
+
+    def _touch(self, sha256: str) -> None:
+        self._objects[sha256][1] = time.time()
+        self._objects.move_to_end(sha256)
+
+    def _store(self, sha256: str, size: int, write: Callable) -> None:
+        if sha256 in self._objects:
+            return
+
+        path = self.path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", "wb") as file:
+            write(file)
+        os.replace(f"{path}.tmp", path)
+
+        self._objects[sha256] = [size, time.time()]
+        self._size += size
+
+    def _link(self, url: str, sha256: str) -> str:
+        self._urls[url] = sha256
+        self._touch(sha256)
+        self._evict()
+        return sha256
+
+    def put(self, url: str, body: bytes, sha256: Optional[str] = None) -> str:
+        sha256 = sha256 or self.digest(body)
+        self._store(sha256, len(body), lambda file: file.write(body))
+        return self._link(url, sha256)
+
+    def put_file(self, url: str, source: IO[bytes], sha256: str) -> str:
+        # Копирование кусками: тело не собирается в памяти целиком
+        def write(file: IO[bytes]) -> None:
+            source.seek(0)
+            shutil.copyfileobj(source, file)
+            source.seek(0)
+
+        source.seek(0, os.SEEK_END)
+        size = source.tell()
+        source.seek(0)
+        self._store(sha256, size, write)
+        return self._link(url, sha256)
+
+    def touch(self, url: str) -> None:
+        sha256 = self._urls.get(url)
+        if sha256 in self._objects:
+            self._touch(sha256)
+
+    def locate(self, sha256: str) -> Optional[str]:
+        if sha256 not in self._objects:
+            return None
+        path = self.path(sha256)
+        if not os.path.exists(path):
+            self._drop(sha256)
+            return None
+        self._touch(sha256)
+        return path
+
+    def pin(self, sha256: str) -> None:
+        self._pins[sha256] += 1
+
+    def unpin(self, sha256: str) -> None:
+        self._pins[sha256] -= 1
+        if self._pins[sha256] <= 0:
+            del self._pins[sha256]
+            self._evict()
+
+    def get(self, url: str) -> Optional[bytes]:
+        file = self.open(url)
+        if file is None:
+            return None
+        with file:
+            return file.read()
+
+    def get_by_hash(self, sha256: str) -> Optional[bytes]:
+        file = self.open_by_hash(sha256)
+        if file is None:
+            return None
+        with file:
+            return file.read()
+
+    def open(self, url: str) -> Optional[IO[bytes]]:
+        sha256 = self._urls.get(url)
+        if sha256 is None:
+            return None
+        return self.open_by_hash(sha256)
+
+    def open_by_hash(self, sha256: str) -> Optional[IO[bytes]]:
+        if sha256 not in self._objects:
+            return None
+        try:
+            file = open(self.path(sha256), "rb")
+        except FileNotFoundError:
+            self._drop(sha256)
+            return None
+        self._touch(sha256)
+        return file
+
+    def _drop(self, sha256: str) -> None:
+        size, _ = self._objects.pop(sha256)
+        self._size -= size
+        for url in [u for u, h in self._urls.items() if h == sha256]:
+            del self._urls[url]
+        try:
+            os.remove(self.path(sha256))
+        except FileNotFoundError:
+            ...
+
+    def _evict(self) -> None:
+        if self._size <= self.max_size:
+            return
+        # Последний добавленный объект не вытесняется, даже если он
+        # один больше бюджета - иначе put() терял бы только что записанное
+        newest = next(reversed(self._objects))
+        for sha256 in list(self._objects):
+            if self._size <= self.max_size:
+                break
+            if sha256 != newest and sha256 not in self._pins:
+                self._drop(sha256)
+
+    def save(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        index_path = os.path.join(self.root, self._INDEX)
+        with open(f"{index_path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "urls": self._urls,
+                    "objects": list(self._objects.items())
+                },
+                file
+            )
+        os.replace(f"{index_path}.tmp", index_path)
+
+
+class ParseCache(WorkbookCache):
+    """Результаты parse_workbook на диске, по содержимому книги.
+
+    Ключ - sha256 книги, версия разборщика, backend и окно дат, так что
+    после правки разборщика старые результаты не находятся и уходят
+    при вытеснении. Результат хранится pickle, сжатым zlib; записи в нём
+    уже интернированы, поэтому повторы занимают по ссылке. Размер
+    ограничен ``max_size`` с тем же LRU, что у WorkbookCache.
+    """
+
+    def __init__(
+        self, 
+        root: str, 
+        version: str, 
+        max_size: int = 256 * 1024 ** 2
+    ):
+        super().__init__(root=root, max_size=max_size)
+        self.version = version
+
+    def key(self, sha256: str, backend: str, date_window: Any = None) -> str:
+        return self.digest(
+            f"{sha256}|{self.version}|{backend}|{date_window}".encode()
+        )
+
+    def load(self, key: str) -> Optional[Any]:
+        body = self.get_by_hash(key)
+        if body is None:
+            return None
+        try:
+            return pickle.loads(zlib.decompress(body))
+        except Exception: # недописанный или битый файл
+            self._drop(key)
+            return None
+
+    def store(self, key: str, result: Any) -> None:
+        body = zlib.compress(
+            pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), 1
+        )
+        self._store(key, len(body), lambda file: file.write(body))
+        self._touch(key)
+        self._evict()
@@ -0,0 +1,121 @@
+import json
+import logging
+import os
+import time
+
+from typing import Optional
+from typing import Dict
+from typing import List
+from typing import Any
+from typing import Sequence
+from typing import Set
+
+
+class DeadLetterQueue:
+    """Файлы, которые не удалось скачать после всех повторов.
+
+    Хранит запись индекса целиком (институт, курс, ...), чтобы следующий
+    цикл мог обработать файл без повторного поиска по странице. Записи
+    с тем же файлом (``duplicates``) хранятся вместе с ней.
+
+    Запись с ``max_failures`` неудачами подряд или с ошибкой, которая
+    не пройдёт при повторе (``permanent``), откладывается: остаётся в
+    файле для разбора, но drain её больше не возвращает.
+
+    Как у ValidatorStore, итог цикла применяется в commit: discard
+    (файл обработан) и выдача записей drain только отмечаются, а
+    rollback возвращает выданные записи в очередь - файл, чей экспорт
+    не зафиксирован, повторится в следующем цикле.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_failures: int = 5):
+        self.path = path
+        self.max_failures = max_failures
+        self._entries: Dict[str, Dict[str, Any]] = dict()
+        # URL -> записи, выданные drain в этом цикле
+        self._drained: Dict[str, Dict[str, Any]] = dict()
+        self._discarded: Set[str] = set()
+
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                self._entries = json.load(file)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._entries
+
+    def add(
+        self,
+        url: str,
+        data: Dict[str, Any],
+        reason: str,
+        duplicates: Sequence[Dict[str, Any]] = (),
+        permanent: bool = False
+    ) -> None:
+        entry = self._entries.get(url)
+        if entry is None:
+            # Повтор выданной drain записи продолжает её счёт неудач
+            drained = self._drained.pop(url, None)
+            entry = self._entries[url] = {
+                "failures": drained["failures"] if drained else 0
+            }
+        self._discarded.discard(url)
+        entry.update({
+            "data": data,
+            "duplicates": list(duplicates),
+            "reason": reason,
+            "failed_at": time.time()
+        })
+        entry["failures"] += 1
+        if entry.get("parked"):
+            return
+        if permanent or entry["failures"] >= self.max_failures:
+            entry["parked"] = True
+            logging.warning(
+                "Файл больше не повторяется (неудач %d): %s (%s)",
+                entry["failures"], url, reason
+            )
+
+    def discard(self, url: str) -> None:
+        """Файл обработан: запись уйдёт из очереди при commit."""
+        self._discarded.add(url)
+
+    @property
+    def parked(self) -> int:
+        return sum(1 for entry in self._entries.values() if entry.get("parked"))
+
+    def drain(self) -> List[Dict[str, Any]]:
+        entries: List[Dict[str, Any]] = list()
+        for url, entry in list(self._entries.items()):
+            if entry.get("parked"):
+                continue
+            entries.append(entry["data"])
+            entries.extend(entry.get("duplicates", ()))
+            self._drained[url] = self._entries.pop(url)
+        return entries
+
+    def commit(self) -> None:
+        # Выданная запись, которая не вернулась через add, обработана
+        # (или файл не изменился - 304)
+        for url in self._discarded:
+            self._entries.pop(url, None)
+        self._drained.clear()
+        self._discarded.clear()
+
+    def rollback(self) -> None:
+        for url, entry in self._drained.items():
+            self._entries.setdefault(url, entry)
+        self._drained.clear()
+        self._discarded.clear()
+
+    def save(self) -> None:
+        if not self.path:
+            return
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self._entries, file, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,88 @@
+import json
+import os
+
+from typing import NamedTuple
+from typing import Optional
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Final
+
+
+IndexKey = Tuple[str, str, str, str, str]
+
+
+class IndexDiff(NamedTuple):
+    added: List[Dict[str, str]]
+    removed: List[Dict[str, str]]
+    # Та же позиция индекса (институт/форма/семестр/курс), но новый URL
+    changed: List[Dict[str, str]]
+    unchanged: List[Dict[str, str]]
+
+    @property
+    def scheduled(self) -> List[Dict[str, str]]:
+        return self.added + self.changed
+
+
+class IndexSnapshot:
+    """Снимок записей, выданных ``Parser.run_data_stream`` за цикл."""
+
+    FIELDS: Final[Tuple[str, ...]] = (
+        "institute",
+        "study_form",
+        "semester",
+        "course",
+        "excel_url"
+    )
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.entries: List[Dict[str, str]] = list()
+
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                self.entries = json.load(file)
+
+    @classmethod
+    def key(cls, entry: Dict[str, str]) -> IndexKey:
+        return tuple(entry.get(field) for field in cls.FIELDS)
+
+    def diff(self, entries: List[Dict[str, str]]) -> IndexDiff:
+        old = {self.key(e) for e in self.entries}
+        new = {self.key(e) for e in entries}
+        # Позиции без URL: по ним новые записи отличаются от изменённых
+        old_positions = {key[:-1] for key in old - new}
+
+        added, changed, unchanged = list(), list(), list()
+        for entry in entries:
+            key = self.key(entry)
+            if key in old:
+                unchanged.append(entry)
+            elif key[:-1] in old_positions:
+                changed.append(entry)
+            else:
+                added.append(entry)
+
+        new_positions = {key[:-1] for key in new - old}
+        removed = [
+            e for e in self.entries
+            if self.key(e) not in new and self.key(e)[:-1] not in new_positions
+        ]
+        return IndexDiff(added, removed, changed, unchanged)
+
+    def commit(self, entries: List[Dict[str, str]]) -> None:
+        self.entries = [
+            {field: e.get(field) for field in self.FIELDS}
+            for e in entries
+        ]
+        self.save()
+
+    def save(self) -> None:
+        if not self.path:
+            return
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.entries, file, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,135 @@
+import asyncio
+import random
+import time
+
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+from typing import Deque
+from typing import Tuple
+from typing import AsyncIterator
+
+
+class AdaptiveLimiter:
+    """Ограничитель параллельных запросов по схеме AIMD.
+
+    Пока запросы укладываются в ``target_latency`` и не падают, лимит
+    растёт аддитивно (примерно на 1 за ``limit`` завершённых запросов).
+    При ошибке или превышении задержки лимит умножается на ``decrease``,
+    но не чаще одного раза за окно - иначе пачка одновременно упавших
+    запросов обрушила бы лимит до минимума.
+
+    Использование::
+
+        async with limiter.slot():
+            ...  # исключение внутри считается ошибкой
+    """
+
+    def __init__(
+        self,
+        initial: int = 8,
+        minimum: int = 1,
+        maximum: int = 40,
+        target_latency: float = 5.0,
+        decrease: float = 0.5,
+        window: int = 20
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.decrease = decrease
+
+        self._limit: float = float(max(minimum, min(initial, maximum)))
+        self._in_flight: int = 0
+        self._since_decrease: int = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._samples: Deque[Tuple[float, bool]] = deque(maxlen=window)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def error_rate(self) -> float:
+        if not self._samples:
+            return 0.0
+        return sum(1 for _, ok in self._samples if not ok) / len(self._samples)
+
+    @property
+    def mean_latency(self) -> float:
+        if not self._samples:
+            return 0.0
+        return sum(latency for latency, _ in self._samples) / len(self._samples)
+
+    async def acquire(self) -> float:
+        while self._in_flight >= int(self._limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._wake() # передать пробуждение следующему
+                else:
+                    self._discard(waiter)
+                raise
+        self._in_flight += 1
+        return time.monotonic()
+
+    def release(self, started: float, ok: bool = True) -> None:
+        latency = time.monotonic() - started
+        self._in_flight -= 1
+        self._samples.append((latency, ok))
+        self._since_decrease += 1
+
+        if not ok or latency > self.target_latency:
+            if self._since_decrease >= int(self._limit):
+                self._limit = max(
+                    float(self.minimum),
+                    self._limit * self.decrease
+                )
+                self._since_decrease = 0
+        else:
+            self._limit = min(
+                float(self.maximum),
+                self._limit + 1 / self._limit
+            )
+        self._wake()
+
+    def _discard(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            ...
+
+    def _wake(self) -> None:
+        free = int(self._limit) - self._in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        started = await self.acquire()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.release(started, ok)
+
+
+def backoff_delay(
+    attempt: int,
+    base: float = 1.0,
+    cap: float = 60.0,
+    rng: Optional[random.Random] = None
+) -> float:
+    """Экспоненциальная задержка с полным джиттером (0..base*2^attempt)."""
+    return (rng or random).uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,186 @@
+from array import array
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Final
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Tuple
+
+
+# Порядок полей в компактных записях parse_workbook
+LESSON_FIELDS: Final[Tuple[str, ...]] = (
+    "weekday",
+    "group",
+    "date",
+    "number",
+    "start_time",
+    "title",
+    "teacher",
+    "classroom",
+    "type",
+)
+
+
+class WeekKey(NamedTuple):
+    year: str
+    semester: Any
+    title: str
+    start_date: Any
+    end_date: Any
+
+
+class GroupKey(NamedTuple):
+    name: str
+    course: Any
+    institute: Any
+
+
+class LessonRecord(NamedTuple):
+    """Урок в пути от разбора книги до экспорта.
+
+    Неделя и группа - общие для многих уроков объекты, поэтому запись
+    занимает один кортеж и не копирует полей листа и файла.
+    """
+
+    week: WeekKey
+    group: GroupKey
+    study_form: Any
+    weekday: Any
+    date: Any
+    number: Any
+    start_time: Any
+    title: Any
+    teacher: Any
+    type: Any
+    classroom: Any
+
+
+class DictColumn:
+    """Столбец со словарным кодированием: ``values[codes[i]]``.
+
+    Значений в столбцах расписания на порядки меньше, чем строк, так что
+    преобразование значения (id справочника, дата) делается один раз на
+    значение, а не на урок.
+    """
+
+    __slots__ = ("values", "codes", "_index", "_others")
+
+    def __init__(self):
+        self.values: List[Any] = list()
+        self.codes: array = array("I")
+        self._index: Dict[Any, int] = dict()
+        # 1, 1.0 и True равны как ключи словаря, но это разные значения:
+        # равное значение другого класса - по ключу с классом
+        self._others: Dict[Tuple[type, Any], int] = dict()
+
+    def code(self, value: Any) -> int:
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = self._add(value)
+        elif self.values[code].__class__ is not value.__class__:
+            key = (value.__class__, value)
+            code = self._others.get(key)
+            if code is None:
+                code = self._others[key] = self._add(value)
+        return code
+
+    def _add(self, value: Any) -> int:
+        self.values.append(value)
+        return len(self.values) - 1
+
+    def append(self, value: Any) -> None:
+        self.codes.append(self.code(value))
+
+    def extend(self, values: Iterable[Any]) -> None:
+        code = self.code
+        self.codes.extend(array("I", [code(value) for value in values]))
+
+    def repeat(self, value: Any, count: int) -> None:
+        self.codes.extend(array("I", [self.code(value)]) * count)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __iter__(self) -> Iterator[Any]:
+        values = self.values
+        return (values[code] for code in self.codes)
+
+
+class LessonBatch:
+    """Уроки по столбцам LessonRecord - то, что принимает экспортёр.
+
+    Неделя и форма обучения на листе одни, группа - одна на много
+    уроков, поэтому BatchCTE_exporter считает их id, как и id
+    справочников, по ``values`` столбца, а строки собирает по кодам.
+    """
+
+    FIELDS: Final[Tuple[str, ...]] = LessonRecord._fields
+
+    __slots__ = ("columns", "source")
+
+    def __init__(self, source: str = ""):
+        self.columns: Dict[str, DictColumn] = {
+            field: DictColumn() for field in self.FIELDS
+        }
+        # Книга, из которой уроки (URL); '' - неизвестна
+        self.source = source
+
+    @classmethod
+    def from_records(
+        cls, 
+        lessons: Iterable[LessonRecord], 
+        source: str = ""
+    ) -> "LessonBatch":
+        batch = cls(source)
+        columns = [batch.columns[field] for field in cls.FIELDS]
+        for lesson in lessons:
+            for column, value in zip(columns, lesson):
+                column.append(value)
+        return batch
+
+    def __len__(self) -> int:
+        return len(self.columns["week"])
+
+    def __getitem__(self, field: str) -> DictColumn:
+        return self.columns[field]
+
+    def extend(
+        self,
+        week: WeekKey,
+        study_form: Any,
+        group_of: Callable[[Any], GroupKey],
+        records: List[Tuple[Any, ...]]
+    ) -> None:
+        """Добавить записи листа (кортежи по LESSON_FIELDS).
+
+        ``group_of`` - группа по имени из записи; вызывается по разу на
+        имя.
+        """
+        if not records:
+            return
+
+        self.columns["week"].repeat(week, len(records))
+        self.columns["study_form"].repeat(study_form, len(records))
+        for field, values in zip(LESSON_FIELDS, zip(*records)):
+            if field == "group":
+                groups = self.columns["group"]
+                codes: Dict[Any, int] = dict()
+                for name in values:
+                    code = codes.get(name)
+                    if code is None:
+                        code = codes[name] = groups.code(group_of(name))
+                    groups.codes.append(code)
+            else:
+                self.columns[field].extend(values)
+
+    def rows(self) -> Iterator[Tuple[int, ...]]:
+        """Коды строк: кортеж кодов по FIELDS на урок."""
+        return zip(*(self.columns[field].codes for field in self.FIELDS))
+
+    def records(self) -> Iterator[LessonRecord]:
+        return map(LessonRecord._make, zip(*(
+            self.columns[field] for field in self.FIELDS
+        )))
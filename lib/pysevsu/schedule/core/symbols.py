@@ -0,0 +1,56 @@
+from typing import Any
+from typing import Dict
+from typing import Hashable
+from typing import List
+from typing import Tuple
+
+
+class SymbolTable:
+    """Таблица повторяющихся значений: один объект и код на значение.
+
+    Преподаватели, аудитории, названия предметов, дни недели и время
+    повторяются в расписании тысячи раз, а splitlines и split в разборе
+    листа создают для каждого повторения новую строку. intern возвращает
+    первый встреченный объект с тем же значением, code - его номер.
+    Таблица живёт один прогон (книгу или цикл Engine) и только растёт.
+    """
+
+    __slots__ = ("values", "hits", "_codes", "_others")
+
+    def __init__(self):
+        self.values: List[Any] = list()
+        self.hits: int = 0
+        self._codes: Dict[Hashable, int] = dict()
+        # 1, 1.0 и True - один ключ словаря, но разные значения ячеек:
+        # равное значение другого класса - по ключу с классом, иначе оно
+        # вытесняло бы первое, и коды менялись бы при каждой встрече
+        self._others: Dict[Tuple[type, Hashable], int] = dict()
+
+    def code(self, value: Hashable) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = self._add(value)
+            return code
+        if self.values[code].__class__ is not value.__class__:
+            key = (value.__class__, value)
+            code = self._others.get(key)
+            if code is None:
+                code = self._others[key] = self._add(value)
+                return code
+        self.hits += 1
+        return code
+
+    def _add(self, value: Hashable) -> int:
+        self.values.append(value)
+        return len(self.values) - 1
+
+    def intern(self, value: Hashable) -> Any:
+        if value is None:
+            return None
+        return self.values[self.code(value)]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, code: int) -> Any:
+        return self.values[code]
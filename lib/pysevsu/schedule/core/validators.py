@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+
+from typing import Optional
+from typing import Mapping
+from typing import Dict
+from typing import Final
+
+
+class ValidatorStore:
+    """Хранилище HTTP-валидаторов (ETag / Last-Modified / SHA-256) по URL.
+
+    Новые значения попадают в ``_pending`` и переносятся в основное
+    хранилище только через ``commit()`` - после того, как данные файла
+    действительно выгружены в БД. Иначе упавший цикл пометил бы файл
+    как неизменённый, и следующий цикл его пропустил бы.
+    """
+
+    _ETAG: Final[str] = "etag"
+    _LAST_MODIFIED: Final[str] = "last_modified"
+    _SHA256: Final[str] = "sha256"
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._entries: Dict[str, Dict[str, str]] = dict()
+        self._pending: Dict[str, Dict[str, str]] = dict()
+
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                self._entries = json.load(file)
+
+    @staticmethod
+    def digest(body: bytes) -> str:
+        return hashlib.sha256(body).hexdigest()
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        entry = self._entries.get(url, {})
+        headers: Dict[str, str] = dict()
+        if entry.get(self._ETAG):
+            headers["If-None-Match"] = entry[self._ETAG]
+        if entry.get(self._LAST_MODIFIED):
+            headers["If-Modified-Since"] = entry[self._LAST_MODIFIED]
+        return headers
+
+    def is_unchanged(self, url: str, sha256: str) -> bool:
+        return self._entries.get(url, {}).get(self._SHA256) == sha256
+
+    def stage(
+        self,
+        url: str,
+        headers: Mapping[str, str],
+        sha256: str
+    ) -> None:
+        entry = {self._SHA256: sha256}
+        if headers.get("ETag"):
+            entry[self._ETAG] = headers["ETag"]
+        if headers.get("Last-Modified"):
+            entry[self._LAST_MODIFIED] = headers["Last-Modified"]
+        self._pending[url] = entry
+
+    def commit(self) -> None:
+        self._entries.update(self._pending)
+        self._pending.clear()
+        self.save()
+
+    def rollback(self) -> None:
+        self._pending.clear()
+
+    def save(self) -> None:
+        if not self.path:
+            return
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self._entries, file, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
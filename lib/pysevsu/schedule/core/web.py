@@ -1,28 +1,196 @@
 import asyncio
 import aiohttp
+import hashlib
 import requests
 
 from aiohttp import ClientTimeout
-from io import BytesIO
+from tempfile import SpooledTemporaryFile
 from bs4 import BeautifulSoup
 from typing import Optional
 from typing import Dict
 from typing import Tuple
 from typing import Final
 from typing import Any
+from typing import List
+from typing import Iterator
+from typing import Callable
+from typing import IO
 
 from .config import _URL
 from .config import _COOKIES
 from .config import _HEADERS
+from .cache import WorkbookCache
 from ..utilites.logger import log
 
 
-async def async_xls_request(url: str) -> BytesIO:
+# Размер куска при чтении ответа и порог, после которого тело файла
+# уходит из памяти во временный файл на диске
+_CHUNK_SIZE: Final[int] = 64 * 1024
+_SPOOL_SIZE: Final[int] = 1024 * 1024
+
+
+async def read_to_spool(
+    response: aiohttp.ClientResponse,
+    spool_size: int = _SPOOL_SIZE
+) -> Tuple[IO[bytes], str]:
+    file = SpooledTemporaryFile(max_size=spool_size)
+    sha256 = hashlib.sha256()
+    try:
+        async for chunk in response.content.iter_chunked(_CHUNK_SIZE):
+            sha256.update(chunk)
+            file.write(chunk)
+    except BaseException:
+        file.close()
+        raise
+    file.seek(0)
+    return file, sha256.hexdigest()
+
+
+async def async_xls_request(
+    url: str, 
+    cache: Optional[WorkbookCache] = None,
+    spool_size: int = _SPOOL_SIZE
+) -> IO[bytes]:
+    if cache is not None and cache.replay:
+        file = cache.open(url)
+        if file is None:
+            raise LookupError(f"File is not cached.\nURL: {url}.")
+        return file
+
     async with aiohttp.ClientSession() as session:
         async with session.get(url) as response:
             response.raise_for_status()
-            resp = await response.read()
-            return BytesIO(resp)
+            file, sha256 = await read_to_spool(response, spool_size)
+
+    if cache is not None:
+        cache.put_file(url, file, sha256)
+        cache.save()
+    return file
+
+
+def _no_schedule_table() -> LookupError:
+    # Одна ошибка для всех backend'ов: страница без таблицы - не пустой
+    # индекс (иначе IndexSnapshot решил бы, что все файлы удалены)
+    return LookupError(
+        f"Schedule table is not found: div.{Parser._SCHEDULE_TABLE}."
+    )
+
+
+class _Bs4Backend:
+    def __init__(self, content: str, features: str = "html.parser"):
+        self.bs4: BeautifulSoup = BeautifulSoup(content, features)
+
+    def nodes(self) -> Iterator[Any]:
+        table = self.bs4.find('div', class_=Parser._SCHEDULE_TABLE)
+        if table is None:
+            raise _no_schedule_table()
+        for e in table.descendants:
+            if hasattr(e, 'get'):
+                yield e
+
+    @staticmethod
+    def tag(e: Any) -> str:
+        return e.name
+
+    @staticmethod
+    def classes(e: Any) -> List[str]:
+        return e.get("class")
+
+    @staticmethod
+    def text(e: Any) -> str:
+        return e.get_text()
+
+    @staticmethod
+    def href(e: Any) -> Optional[str]:
+        return e.get("href")
+
+
+class _LxmlBackend:
+    _TABLE_XPATH: Final[str] = (
+        "(//div[contains(concat(' ', normalize-space(@class), ' '), "
+        "' {table} ')])[1]"
+    )
+    # Только узлы таблицы, которые интересны Parser, в порядке документа
+    _XPATH: Final[str] = (
+        ".//*[self::{institute} or self::{url}[@class] "
+        "or contains(concat(' ', normalize-space(@class), ' '), ' {form} ') "
+        "or contains(concat(' ', normalize-space(@class), ' '), ' {semester} ') "
+        "or contains(concat(' ', normalize-space(@class), ' '), ' {title} ')]"
+    )
+
+    def __init__(self, content: str):
+        from lxml import html
+
+        self.tree = html.fromstring(content)
+
+    def nodes(self) -> Iterator[Any]:
+        tables = self.tree.xpath(
+            self._TABLE_XPATH.format(table=Parser._SCHEDULE_TABLE)
+        )
+        if not tables:
+            raise _no_schedule_table()
+        return iter(tables[0].xpath(self._XPATH.format(
+            institute=Parser._INSTITUTE_TAG,
+            url=Parser._URL_TAG,
+            form=Parser._STUDY_FORM_CLASS,
+            semester=Parser._SEMESTER_CLASS,
+            title=Parser._LINK_TITLE
+        )))
+
+    @staticmethod
+    def tag(e: Any) -> str:
+        return e.tag
+
+    @staticmethod
+    def classes(e: Any) -> List[str]:
+        return e.get("class", "").split()
+
+    @staticmethod
+    def text(e: Any) -> str:
+        return e.text_content()
+
+    @staticmethod
+    def href(e: Any) -> Optional[str]:
+        return e.get("href")
+
+
+class _SelectolaxBackend:
+    def __init__(self, content: str):
+        from selectolax.lexbor import LexborHTMLParser
+
+        self.tree = LexborHTMLParser(content)
+
+    def nodes(self) -> Iterator[Any]:
+        table = self.tree.css_first(f"div.{Parser._SCHEDULE_TABLE}")
+        if table is None:
+            raise _no_schedule_table()
+        nodes = table.traverse(include_text=False)
+        next(nodes, None) # сам table
+        return nodes
+
+    @staticmethod
+    def tag(e: Any) -> str:
+        return e.tag
+
+    @staticmethod
+    def classes(e: Any) -> List[str]:
+        return (e.attributes.get("class") or "").split()
+
+    @staticmethod
+    def text(e: Any) -> str:
+        return e.text(deep=True)
+
+    @staticmethod
+    def href(e: Any) -> Optional[str]:
+        return e.attributes.get("href")
+
+
+_BACKENDS: Final[Dict[str, Callable[[str], Any]]] = {
+    "html.parser": _Bs4Backend,
+    "bs4-lxml": lambda content: _Bs4Backend(content, "lxml"),
+    "lxml": _LxmlBackend,
+    "selectolax": _SelectolaxBackend,
+}
 
 
 class Parser:
@@ -33,53 +201,117 @@ class Parser:
     _LINK_TITLE: Final[str] = "document-link__name"
     _URL_TAG: Final[str] = "a"
 
-    def __init__(self, **kw: Any):
+    def __init__(
+        self, 
+        content: Optional[str] = None, 
+        backend: str = "html.parser",
+        **kw: Any
+    ):
+        if backend not in _BACKENDS:
+            raise ValueError(
+                f"Unknown parser backend: {backend}. "
+                f"Available: {', '.join(_BACKENDS)}."
+            )
+
+        if content is None:
+            try:
+                content = requests.get(
+                    url=_URL, 
+                    cookies=_COOKIES, 
+                    headers=_HEADERS
+                ).text
+            except Exception as err:
+                raise(
+                    ConnectionError(f"{err}.\nURL: {_URL}.")
+                )
+
+        self.backend = backend
+        self._tree = _BACKENDS[backend](content)
+        self.kw = kw
+
+    @staticmethod
+    async def fetch(
+        session: Optional[aiohttp.ClientSession] = None,
+        url: str = _URL,
+        cache: Optional[WorkbookCache] = None
+    ) -> str:
+        if cache is not None and cache.replay:
+            content = cache.get(url)
+            if content is None:
+                raise LookupError(f"Page is not cached.\nURL: {url}.")
+            return content.decode("utf-8")
+
+        if session is None:
+            async with aiohttp.ClientSession() as session:
+                return await Parser.fetch(session, url, cache)
+
         try:
-            _CONTENT: Final[str] = requests.get(
-                url=_URL, 
+            async with session.get(
+                url, 
                 cookies=_COOKIES, 
                 headers=_HEADERS
-            ).text
-        except Exception as err:
+            ) as response:
+                response.raise_for_status()
+                content = await response.text()
+        except aiohttp.ClientError as err:
             raise(
-                ConnectionError(f"{err}.\nURL: {_URL}.")
+                ConnectionError(f"{err}.\nURL: {url}.")
             )
 
-        self.bs4: BeautifulSoup = BeautifulSoup(_CONTENT, "html.parser")
-        self.kw = kw
+        if cache is not None:
+            cache.put(url, content.encode("utf-8"))
+        return content
 
-    async def run_data_stream(self):
-        table = self.bs4.find('div', class_=Parser._SCHEDULE_TABLE)
-        res: Dict[str, str] = dict()
+    @classmethod
+    async def create(
+        cls,
+        session: Optional[aiohttp.ClientSession] = None,
+        backend: str = "html.parser",
+        url: str = _URL,
+        cache: Optional[WorkbookCache] = None,
+        **kw: Any
+    ) -> "Parser":
+        content = await cls.fetch(session, url, cache)
+        # Разбор HTML не должен блокировать event loop
+        return await asyncio.to_thread(cls, content, backend, **kw)
 
-        for e in table.descendants:
-            if not hasattr(e, 'get'):
-                continue
+    def iter_data(self) -> Iterator[Dict[str, str]]:
+        tree = self._tree
+        res: Dict[str, str] = dict()
 
-            classname = e.get("class")
-            tag = e.name
+        for e in tree.nodes():
+            classname = tree.classes(e)
+            tag = tree.tag(e)
 
             if tag == Parser._INSTITUTE_TAG:
-                res["institute"] = e.get_text().strip()
+                res["institute"] = tree.text(e).strip()
 
             if classname:
                 if Parser._STUDY_FORM_CLASS in classname:
-                    res["study_form"] = e.get_text().strip()
+                    res["study_form"] = tree.text(e).strip()
 
                 if Parser._SEMESTER_CLASS in classname:
-                    res["semester"] = e.get_text().strip()
+                    res["semester"] = tree.text(e).strip()
 
                 if tag == Parser._URL_TAG:
-                    res["excel_url"] = e.get("href").strip()
+                    res["excel_url"] = tree.href(e).strip()
 
                 if Parser._LINK_TITLE in classname:
-                    res["course"] = e.get_text().strip()
+                    res["course"] = tree.text(e).strip()
                     yield res
                     
                     res.pop("semester", None)
                     res.pop("course", None)
                     res.pop("excel_url", None)
 
+    async def run_data_stream(self):
+        for res in self.iter_data():
+            yield res
+
 if __name__ == "__main__":
-    parser = Parser()
-    asyncio.run(parser.start())
\ No newline at end of file
+    async def _main():
+        parser = await Parser.create()
+        async for i in parser.run_data_stream():
+            print(i)
+
+    asyncio.run(_main())
\ No newline at end of file
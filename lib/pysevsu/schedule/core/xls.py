@@ -1,57 +1,202 @@
 import asyncio
+import datetime
+import functools
+import hashlib
 import openpyxl
+import os
+import re
 
 from typing import Any
 from typing import List
 from typing import Dict
-from typing import Any
 from typing import Optional
+from typing import IO
+from typing import Iterator
+from typing import Tuple
+from typing import Deque
+from typing import Final
+from typing import Union
+from collections import deque
 from io import BytesIO
 
+from .records import LESSON_FIELDS
+from .symbols import SymbolTable
+from .xlsx import XlsxWorkbook
 from ..utilites.logger import log
 
 
+# Первый и последний день (включительно) нужных недель
+DateWindow = Tuple[datetime.date, datetime.date]
+
+
 class ExcelFile:
-    def __init__(self, file: BytesIO):
-        self.file = openpyxl.load_workbook(
-            filename=file, 
-            read_only=True
-        ) 
+    # "native" читает xml листов сам (core.xlsx), значения те же
+    BACKENDS: Final[Tuple[str, ...]] = ("openpyxl", "native")
+
+    def __init__(
+        self, 
+        file: Union[str, IO[bytes]], 
+        backend: str = "openpyxl",
+        symbols: Optional[SymbolTable] = None
+    ):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown xlsx backend: {backend!r}")
+
+        self.backend = backend
+        # Общая для всех листов: значения уроков повторяются между ними
+        self.symbols = symbols
+        if backend == "native":
+            self.file = XlsxWorkbook(file)
+        else:
+            self.file = openpyxl.load_workbook(
+                filename=file, 
+                read_only=True
+            ) 
 
     @property
     def sheetnames(self) -> List[str]:
         return self.file.sheetnames
 
-    async def run_worksheets_stream(self) -> object:
+    def iter_worksheets(
+        self, 
+        date_window: Optional[DateWindow] = None
+    ) -> Iterator["Worksheet"]:
+        """Листы ``уч.н.*`` с расписанием.
+
+        Размер и шапка листа проверяются в конструкторе Worksheet по
+        первым строкам, до разбора уроков. С ``date_window`` пропускаются
+        и недели вне окна; у "native" даты читаются из xml листа точечно,
+        и лист вне окна не разбирается вовсе.
+        """
         for sheetname in self.sheetnames:
-            if sheetname.startswith("уч.н."):
-                try:
-                    yield Worksheet(self.file[sheetname], sheetname)
-                except RuntimeError:
-                    ...
+            if not sheetname.startswith("уч.н."):
+                continue
+
+            content = self.file[sheetname]
+            if (
+                date_window is not None 
+                and not self._peek_date_window(content, date_window)
+            ):
+                continue
+            try:
+                sheet = Worksheet(content, sheetname, symbols=self.symbols)
+            except RuntimeError:
+                continue
+            if date_window is None or sheet.in_date_window(*date_window):
+                yield sheet
+
+    def _peek_date_window(self, content: Any, date_window: DateWindow) -> bool:
+        if self.backend != "native":
+            return True
+        # Те же ячейки, что берёт get_dates_of_the_week (столбец B)
+        start_row, end_row = Worksheet._DATE_ROWS
+        start, end = f"B{start_row + 1}", f"B{end_row + 1}"
+        cells = content.read_cells(start, end)
+        return _week_in_window(cells.get(start), cells.get(end), date_window)
+
+    async def run_worksheets_stream(
+        self, 
+        date_window: Optional[DateWindow] = None
+    ) -> object:
+        for sheet in self.iter_worksheets(date_window):
+            yield sheet
+
+    def close(self) -> None:
+        self.file.close()
 
 
 class Worksheet:
+    # Строки 0-5: шапка, группы (3) и заголовки столбцов (4, 5)
+    _HEADER_ROWS: Final[int] = 6
+    _MIN_ROWS: Final[int] = 50
+    # Строки, из которых get_dates_of_the_week берёт даты (столбец 1)
+    _DATE_ROWS: Final[Tuple[int, int]] = (6, 46)
+    _INFORMATION_KEYS: Final[Dict[str, str]] = {
+        "День": "weekday",
+        "Дата": "date",
+        "№занятия": "number",
+        "Время": "start_time",
+    }
+    _COLUMN_TITLES: Final[Tuple[str, ...]] = (
+        *_INFORMATION_KEYS, "Занятие", "Тип", "Аудитория"
+    )
+
     def __init__(
         self, 
         content: ExcelFile, 
-        title: Optional[str] = ...
+        title: Optional[str] = ...,
+        stream: bool = True,
+        symbols: Optional[SymbolTable] = None
     ):
         self.content = content
         self.title = title
-        self.data = self._load_cache()
+        self.stream = stream
+        self.symbols = symbols
 
         self._result: Dict[str, Any] = dict()
         self._tmp: Dict[str, Any] = dict()
-        
-        if self._max_row < 50:
-            raise RuntimeError("Invalid size of the worksheet.")
+
+        if stream:
+            # Лист читается один раз; в памяти остаются только шапка
+            # и строки, прочитанные наперёд (не больше _MIN_ROWS)
+            self.data = None
+            self._rows: Iterator[Tuple[Any, ...]] = iter(
+                content.iter_rows(values_only=True)
+            )
+            self._head: List[List[Any]] = list()
+            self._lookahead: Deque[List[Any]] = deque()
+            self._read: int = 0
+            self._dates: Dict[int, Any] = dict()
+
+            if (
+                (content.max_row is not None and content.max_row < self._MIN_ROWS)
+                or self._fetch(self._MIN_ROWS) < self._MIN_ROWS
+            ):
+                raise RuntimeError("Invalid size of the worksheet.")
+        else:
+            self.data = self._load_cache()
+            if self._max_row < self._MIN_ROWS:
+                raise RuntimeError("Invalid size of the worksheet.")
+
+        # Без столбца "Аудитория" iter_data не выдаст ни одного урока
+        self._plan = self._build_column_plan()
+        if not any(title == "Аудитория" for _, _, title in self._plan):
+            raise RuntimeError("Invalid header of the worksheet.")
 
     def _load_cache(self) -> List[List[Any]]:
         return [
-            [cell.value for cell in row] 
-            for row in self.content.rows
-        ] # TODO: Сделать динамическую выгрузку с последющим подхватом
+            list(row) 
+            for row in self.content.iter_rows(values_only=True)
+        ]
+
+    def _fetch(self, count: int) -> int:
+        """Дочитать лист до ``count`` строк (или до конца)."""
+        while self._read < count:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            row = list(row)
+            if self._read < self._HEADER_ROWS:
+                self._head.append(row)
+            else:
+                self._lookahead.append(row)
+            if self._read in self._DATE_ROWS:
+                self._dates[self._read] = row[1] if len(row) > 1 else None
+            self._read += 1
+        return self._read
+
+    def _iter_rows(self) -> Iterator[List[Any]]:
+        if not self.stream:
+            yield from self.data
+            return
+
+        yield from self._head
+        while True:
+            if not self._lookahead:
+                read = self._read
+                if self._fetch(read + 1) == read:
+                    return
+            yield self._lookahead.popleft()
 
     @property
     def _max_row(self) -> int:
@@ -59,10 +204,16 @@ class Worksheet:
     
     @property
     def _max_col(self) -> int:
+        if self.stream:
+            return len(self._head[0])
         return len(self.data[0])
 
     def _cell(self, row: int, column: int) -> Optional[str]:
         try: 
+            if self.stream:
+                if row < self._HEADER_ROWS:
+                    return self._head[row][column]
+                return self._dates.get(row) if column == 1 else None
             return self.data[row][column]
         except IndexError: 
             return None
@@ -76,25 +227,6 @@ class Worksheet:
             title = self._cell(5, col)
         return title
     
-    def _process_column_groups(self, col):
-        cell = self._cell(3, col)
-        if cell:
-            self._result["group"] = cell
-
-    @staticmethod
-    def _value_validation(title: str, value: Any):
-        return True if value and title != value else False
-    
-    def _process_lesson_information(self, title: str, value: Any):
-        if title == "День":
-            self._result["weekday"] = value
-        if title == "Дата":
-            self._result["date"] = value
-        if title == "№занятия":
-            self._result["number"] = value
-        if title == "Время":
-            self._result["start_time"] = value
-    
     def _process_lesson_data(self, title: str, value: Any):
         if title == "Занятие":
             self._tmp["lessons"] = value.splitlines()
@@ -105,7 +237,7 @@ class Worksheet:
         if title == "Аудитория":
             self._tmp["classrooms"] = value.splitlines()
 
-    async def _run_cell_processing(self):
+    def _run_cell_processing(self) -> Iterator[Dict[str, Any]]:
         len_: int = len(self._tmp.get("lessons"))
         for index in range(len_):
             title, teacher = self._parse_lesson_line(
@@ -127,24 +259,72 @@ class Worksheet:
             
             yield self._result
 
-    async def run_data_stream(self) -> object:
-        for row in range(self._max_row):
-            for col in range(self._max_col):
-                self._process_column_groups(col)
-                title = self._get_column_title(col)
-                value = self._cell(row, col)
-        
-                if not self._value_validation(title, value):
+    def _build_column_plan(self) -> List[Tuple[int, Any, Any]]:
+        """Столбцы, которые что-то значат: (номер, группа, заголовок).
+
+        Группа и заголовок столбца не зависят от строки, поэтому шапка
+        разбирается один раз на лист. Столбцы без группы и без
+        известного заголовка в обработке строк не участвуют.
+        """
+        plan: List[Tuple[int, Any, Any]] = list()
+        for col in range(self._max_col):
+            group = self._cell(3, col)
+            title = self._get_column_title(col)
+            if title not in self._COLUMN_TITLES:
+                title = None
+            if group or title:
+                plan.append((col, group, title))
+        return plan
+
+    def iter_data(self) -> Iterator[Dict[str, Any]]:
+        for row in self._iter_rows():
+            width = len(row)
+            for col, group, title in self._plan:
+                if group:
+                    self._result["group"] = group
+                if title is None:
+                    continue
+
+                value = row[col] if col < width else None
+                if not value or title == value:
                     continue
                 
-                self._process_lesson_information(title, value)
+                if title in self._INFORMATION_KEYS:
+                    self._result[self._INFORMATION_KEYS[title]] = value
+                    continue
                 self._process_lesson_data(title, value)
                 
                 if title == "Аудитория":
-                    async for record in self._run_cell_processing():
+                    for record in self._run_cell_processing():
                         yield record
                         self._result.clear()
 
+    async def run_data_stream(self) -> object:
+        for record in self.iter_data():
+            yield record
+
+    def iter_records(self) -> Iterator[Tuple[Any, ...]]:
+        """Уроки листа кортежами по LESSON_FIELDS.
+
+        Поля, которых нет в записи iter_data, берутся из предыдущей
+        записи листа - как при слиянии словарей в Engine. Дата, время,
+        день недели и номер пары приводятся к date, time и int (None,
+        если не распознаны). Значения проходят через таблицу symbols,
+        если она задана.
+        """
+        state = dict.fromkeys(LESSON_FIELDS)
+        intern = self.symbols.intern if self.symbols is not None else None
+        for record in self.iter_data():
+            state.update(record)
+            date = state["date"] = as_date(state["date"])
+            state["weekday"] = as_weekday(state["weekday"], date)
+            state["number"] = as_number(state["number"])
+            state["start_time"] = as_time(state["start_time"])
+            if intern is None:
+                yield tuple(state.values())
+            else:
+                yield tuple(map(intern, state.values()))
+
     @staticmethod
     def _parse_lesson_line(str_: str):
         if ', ' in str_:
@@ -157,11 +337,187 @@ class Worksheet:
         return title, teacher
 
     def get_dates_of_the_week(self) -> Dict[str, str]:
+        if self.stream:
+            self._fetch(self._DATE_ROWS[-1] + 1)
         return {
             "start_date" : self._cell(6, 1), 
             "end_date" : self._cell(46, 1)
         }
 
+    def in_date_window(
+        self, 
+        first: datetime.date, 
+        last: datetime.date
+    ) -> bool:
+        """Пересекается ли неделя листа с [first, last].
+
+        Лист с нераспознанной датой начала не отбрасывается.
+        """
+        dates = self.get_dates_of_the_week()
+        return _week_in_window(
+            dates["start_date"], 
+            dates["end_date"], 
+            (first, last)
+        )
+
+
+def _week_in_window(start: Any, end: Any, date_window: DateWindow) -> bool:
+    start = as_date(start)
+    if start is None:
+        return True
+    end = as_date(end) or start + datetime.timedelta(days=6)
+    first, last = date_window
+    return start <= last and end >= first
+
+
+# "2025-09-01", "2025-09-01 00:00:00" (str() даты и datetime) - те же
+# форматы, что принимает _DATE_SQL в migrate
+_ISO_DATE: Final[re.Pattern] = re.compile(r"\s*(\d{4}-\d{2}-\d{2})")
+
+
+# Значения ячеек повторяются (интернированы), поэтому разбор кэшируется
+@functools.lru_cache(maxsize=4096)
+def as_date(value: Any) -> Optional[datetime.date]:
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    if isinstance(value, str):
+        for fmt in ("%d.%m.%Y", "%d.%m.%y"):
+            try:
+                return datetime.datetime.strptime(value.strip(), fmt).date()
+            except ValueError:
+                ...
+        match = _ISO_DATE.match(value)
+        if match is not None:
+            try:
+                return datetime.date.fromisoformat(match[1])
+            except ValueError:
+                ...
+    return None
+
+
+# "8:30", "08.30", "08-30" (так время писал прежний экспорт), "8:30-10:00"
+_TIME: Final[re.Pattern] = re.compile(r"\s*([01]?\d|2[0-3])[:.\-]([0-5]\d)")
+
+
+@functools.lru_cache(maxsize=4096)
+def as_time(value: Any) -> Optional[datetime.time]:
+    if isinstance(value, datetime.datetime):
+        return value.time()
+    if isinstance(value, datetime.time):
+        return value
+    if isinstance(value, datetime.timedelta):
+        return (datetime.datetime.min + value).time()
+    if isinstance(value, str):
+        match = _TIME.match(value)
+        if match is not None:
+            return datetime.time(int(match[1]), int(match[2]))
+    return None
+
+
+_WEEKDAYS: Final[Dict[str, int]] = {
+    name: number
+    for number, names in enumerate((
+        ("понедельник", "пн"), ("вторник", "вт"), ("среда", "ср"),
+        ("четверг", "чт"), ("пятница", "пт"), ("суббота", "сб"),
+        ("воскресенье", "вс"),
+    ), 1)
+    for name in names
+}
+
+
+@functools.lru_cache(maxsize=4096)
+def as_weekday(
+    value: Any, 
+    date: Optional[datetime.date] = None
+) -> Optional[int]:
+    """День недели ISO (1 - понедельник); без названия - по дате."""
+    if isinstance(value, int) and 1 <= value <= 7:
+        return value
+    if isinstance(value, str):
+        weekday = _WEEKDAYS.get(value.strip().rstrip(".").lower())
+        if weekday is not None:
+            return weekday
+    return date.isoweekday() if date is not None else None
+
+
+def as_number(value: Any) -> Optional[int]:
+    # Ячейка номера пары бывает числом, дробным числом и строкой
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def current_weeks(
+    count: int, 
+    today: Optional[datetime.date] = None
+) -> DateWindow:
+    """Окно из ``count`` недель, начиная с текущей (с понедельника)."""
+    today = today or datetime.date.today()
+    monday = today - datetime.timedelta(days=today.weekday())
+    return monday, monday + datetime.timedelta(weeks=count, days=-1)
+
+
+SheetLessons = Tuple[str, Any, Any, List[Tuple[Any, ...]]]
+
+
+def _parser_version() -> str:
+    # Результат parse_workbook зависит только от этих модулей и openpyxl
+    digest = hashlib.sha256(openpyxl.__version__.encode())
+    root = os.path.dirname(os.path.abspath(__file__))
+    for name in ("xls.py", "xlsx.py", "records.py", "symbols.py"):
+        with open(os.path.join(root, name), "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+
+# Версия разбора для ключей кэша результатов (ParseCache): любая правка
+# разборщика меняет её, и старые результаты больше не находятся
+PARSER_VERSION: Final[str] = _parser_version()
+
+
+def parse_workbook(
+    source: Union[str, bytes], 
+    backend: str = "openpyxl",
+    date_window: Optional[DateWindow] = None
+) -> List[SheetLessons]:
+    """Разобрать книгу целиком: (лист, начало недели, конец, записи).
+
+    Функция без состояния, её можно отдавать в ProcessPoolExecutor.
+    ``source`` - путь к файлу или его содержимое, ``backend`` и
+    ``date_window`` - как у ExcelFile. Записи - из Worksheet.iter_records,
+    повторяющиеся значения в них - один объект (SymbolTable на книгу), и
+    pickle передаёт каждое значение из пула один раз.
+    """
+    # openpyxl проверяет расширение у путей, а у файлов кэша его нет
+    if isinstance(source, bytes):
+        return _parse_book(
+            ExcelFile(BytesIO(source), backend, SymbolTable()), date_window
+        )
+    with open(source, "rb") as file:
+        return _parse_book(ExcelFile(file, backend, SymbolTable()), date_window)
+
+
+def _parse_book(
+    book: ExcelFile, 
+    date_window: Optional[DateWindow]
+) -> List[SheetLessons]:
+    sheets: List[SheetLessons] = list()
+    try:
+        for sheet in book.iter_worksheets(date_window):
+            dates = sheet.get_dates_of_the_week()
+            sheets.append((
+                sheet.title, 
+                as_date(dates["start_date"]), 
+                as_date(dates["end_date"]), 
+                list(sheet.iter_records())
+            ))
+    finally:
+        book.close()
+    return sheets
+
 
 async def test():
     from .web import async_xls_request
@@ -0,0 +1,389 @@
+import posixpath
+import re
+import zipfile
+
+from contextlib import closing
+
+from typing import Any
+from typing import Optional
+from typing import Dict
+from typing import List
+from typing import Set
+from typing import Tuple
+from typing import Final
+from typing import Iterator
+from typing import Union
+from typing import IO
+from xml.etree.ElementTree import iterparse
+
+from openpyxl.formula.translate import Translator
+from openpyxl.styles.numbers import BUILTIN_FORMATS
+from openpyxl.styles.numbers import is_date_format
+from openpyxl.styles.numbers import is_timedelta_format
+from openpyxl.utils.cell import column_index_from_string
+from openpyxl.utils.cell import coordinate_from_string
+from openpyxl.utils.cell import range_boundaries
+from openpyxl.utils.datetime import CALENDAR_MAC_1904
+from openpyxl.utils.datetime import WINDOWS_EPOCH
+from openpyxl.utils.datetime import from_excel
+from openpyxl.utils.datetime import from_ISO8601
+from openpyxl.worksheet.formula import ArrayFormula
+from openpyxl.worksheet.formula import DataTableFormula
+
+
+_MAIN: Final[str] = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL: Final[str] = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL: Final[str] = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_REL_TYPES: Final[str] = (
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+)
+
+_ROW: Final[str] = f"{_MAIN}row"
+_CELL: Final[str] = f"{_MAIN}c"
+_VALUE: Final[str] = f"{_MAIN}v"
+_FORMULA: Final[str] = f"{_MAIN}f"
+_INLINE: Final[str] = f"{_MAIN}is"
+_TEXT: Final[str] = f"{_MAIN}t"
+_RUN: Final[str] = f"{_MAIN}r"
+_STRING: Final[str] = f"{_MAIN}si"
+_DIMENSION_REF: Final["re.Pattern[bytes]"] = re.compile(
+    rb'<(?:[\w.-]+:)?dimension\b[^>]*?\bref="([^"]+)"'
+)
+
+_DIGITS: Final[str] = "0123456789"
+
+
+def _text_content(node: Any) -> str:
+    # Как openpyxl.cell.text.Text.content: <t> и <r><t>, без <rPh>
+    parts: List[str] = list()
+    for child in node:
+        if child.tag == _TEXT:
+            parts.append(child.text or "")
+        elif child.tag == _RUN:
+            text = child.find(_TEXT)
+            if text is not None and text.text is not None:
+                parts.append(text.text)
+    return "".join(parts)
+
+
+def _iter_rows(source: IO[bytes]) -> Iterator[Any]:
+    """Элементы <row> листа по мере чтения."""
+    for _, node in iterparse(source):
+        if node.tag == _ROW:
+            yield node
+
+
+def _cast_number(value: str) -> Union[int, float]:
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+class XlsxWorkbook:
+    """Чтение xlsx прямо из zip-архива, без объектов ячеек openpyxl.
+
+    Повторяет ту часть интерфейса ``openpyxl`` в режиме ``read_only``,
+    которой пользуется ``Worksheet``: ``sheetnames``, ``book[name]``,
+    ``iter_rows(values_only=True)``, ``max_row``/``max_column`` и
+    ``close()``. Значения ячеек совпадают с openpyxl: общие строки,
+    числа, даты по стилю ячейки, формулы в виде текста.
+    """
+
+    def __init__(self, file: Union[str, IO[bytes]]):
+        self._archive = zipfile.ZipFile(file)
+        try:
+            self._parts = self._read_relationships()
+            self._sheets = self._read_sheets()
+            self._date_formats, self._timedelta_formats = self._read_styles()
+            self._shared_strings: Optional[List[str]] = None
+        except Exception:
+            self._archive.close()
+            raise
+
+    @property
+    def sheetnames(self) -> List[str]:
+        return list(self._sheets)
+
+    @property
+    def shared_strings(self) -> List[str]:
+        # Читаются один раз на книгу и только если понадобились
+        if self._shared_strings is None:
+            self._shared_strings = self._read_shared_strings()
+        return self._shared_strings
+
+    def __getitem__(self, name: str) -> "XlsxWorksheet":
+        return XlsxWorksheet(self, name, self._sheets[name])
+
+    def _open(self, rel_type: str, default: str) -> Optional[IO[bytes]]:
+        paths = [p for _, p in self._parts.get(rel_type, ())] or [default]
+        try:
+            return self._archive.open(paths[0])
+        except KeyError:
+            return None
+
+    def _read_relationships(self) -> Dict[str, List[Tuple[str, str]]]:
+        """Части книги по типу связи: {тип: [(rId, путь в архиве)]}."""
+        parts: Dict[str, List[Tuple[str, str]]] = dict()
+        with self._archive.open("xl/_rels/workbook.xml.rels") as src:
+            for _, node in iterparse(src):
+                if node.tag != f"{_PKG_REL}Relationship":
+                    continue
+                rel_type = node.get("Type", "")
+                if not rel_type.startswith(_REL_TYPES):
+                    continue
+                target = node.get("Target")
+                if target.startswith("/"):
+                    target = target[1:]
+                else:
+                    target = posixpath.normpath(f"xl/{target}")
+                parts.setdefault(rel_type[len(_REL_TYPES):], list()).append(
+                    (node.get("Id"), target)
+                )
+        return parts
+
+    def _read_sheets(self) -> Dict[str, str]:
+        targets = dict(self._parts.get("worksheet", ()))
+        self.epoch = WINDOWS_EPOCH
+        sheets: Dict[str, str] = dict()
+        with self._archive.open("xl/workbook.xml") as src:
+            for _, node in iterparse(src):
+                if node.tag == f"{_MAIN}workbookPr":
+                    if node.get("date1904") in ("1", "true"):
+                        self.epoch = CALENDAR_MAC_1904
+                elif node.tag == f"{_MAIN}sheet":
+                    target = targets.get(node.get(f"{_REL}id"))
+                    if target is not None:
+                        sheets[node.get("name")] = target
+        return sheets
+
+    def _read_styles(self) -> Tuple[Set[int], Set[int]]:
+        date_formats: Set[int] = set()
+        timedelta_formats: Set[int] = set()
+        src = self._open("styles", "xl/styles.xml")
+        if src is None:
+            return date_formats, timedelta_formats
+
+        custom: Dict[int, str] = dict()
+        with src:
+            for _, node in iterparse(src):
+                if node.tag == f"{_MAIN}numFmt":
+                    custom[int(node.get("numFmtId"))] = node.get("formatCode")
+                elif node.tag == f"{_MAIN}cellXfs":
+                    for idx, xf in enumerate(node.iter(f"{_MAIN}xf")):
+                        fmt_id = int(xf.get("numFmtId", 0))
+                        fmt = custom.get(fmt_id, BUILTIN_FORMATS.get(fmt_id))
+                        if fmt is None:
+                            continue
+                        if is_date_format(fmt):
+                            date_formats.add(idx)
+                        if is_timedelta_format(fmt):
+                            timedelta_formats.add(idx)
+        return date_formats, timedelta_formats
+
+    def _read_shared_strings(self) -> List[str]:
+        strings: List[str] = list()
+        src = self._open("sharedStrings", "xl/sharedStrings.xml")
+        if src is None:
+            return strings
+
+        with src:
+            for _, node in iterparse(src):
+                if node.tag == _STRING:
+                    strings.append(_text_content(node).replace("x005F_", ""))
+                    node.clear()
+        return strings
+
+    def close(self) -> None:
+        self._archive.close()
+
+
+class XlsxWorksheet:
+    def __init__(self, parent: XlsxWorkbook, title: str, path: str):
+        self.parent = parent
+        self.title = title
+        self._path = path
+        self.max_row: Optional[int] = None
+        self.max_column: Optional[int] = None
+
+        # Размеры листа в <dimension> до <sheetData>: хватает начала файла
+        with parent._archive.open(path) as src:
+            head = b""
+            while b"sheetData" not in head:
+                chunk = src.read(4096)
+                if not chunk:
+                    break
+                head += chunk
+            match = _DIMENSION_REF.search(head.split(b"sheetData", 1)[0])
+            if match:
+                *_, self.max_column, self.max_row = range_boundaries(
+                    match[1].decode()
+                )
+
+    def iter_rows(self, values_only: bool = True) -> Iterator[Tuple[Any, ...]]:
+        """Строки как в ``ReadOnlyWorksheet.iter_rows(values_only=True)``.
+
+        При известных размерах листа строки дополняются до ширины
+        ``max_column``, пропущенные строки отдаются пустыми; без
+        размеров строка заканчивается последней ячейкой.
+        """
+        if not values_only:
+            raise NotImplementedError("Only values_only=True is supported.")
+
+        max_row, max_col = self.max_row, self.max_column
+        empty_row: Tuple[Any, ...] = (
+            (None,) * max_col if max_col is not None else ()
+        )
+        counter = idx = 1
+        for idx, row in self._parse():
+            if max_row is not None and idx > max_row:
+                break
+            while counter < idx:
+                counter += 1
+                yield empty_row
+            if counter <= idx:
+                counter += 1
+                yield self._get_row(row, max_col)
+
+        if max_row is not None and max_row < idx:
+            for _ in range(counter, max_row + 1):
+                yield empty_row
+
+    @staticmethod
+    def _get_row(
+        row: List[Tuple[int, Any]],
+        max_col: Optional[int]
+    ) -> Tuple[Any, ...]:
+        if not row and not max_col:
+            return ()
+        width = max_col or row[-1][0]
+        values: List[Any] = [None] * width
+        for column, value in row:
+            if 1 <= column <= width:
+                values[column - 1] = value
+        return tuple(values)
+
+    def _parse(self) -> Iterator[Tuple[int, List[Tuple[int, Any]]]]:
+        strings = self.parent.shared_strings
+        shared_formulae: Dict[str, Translator] = dict()
+        columns: Dict[str, int] = dict()
+        row_counter = 0
+
+        with self.parent._archive.open(self._path) as src:
+            for node in _iter_rows(src):
+                r = node.get("r")
+                row_counter = int(float(r)) if r else row_counter + 1
+                col_counter = 0
+                cells: List[Tuple[int, Any]] = list()
+
+                for cell in node:
+                    if cell.tag != _CELL:
+                        continue
+                    coordinate = cell.get("r")
+                    if coordinate:
+                        letters = coordinate.rstrip(_DIGITS)
+                        col_counter = columns.get(letters)
+                        if col_counter is None:
+                            col_counter = column_index_from_string(letters)
+                            columns[letters] = col_counter
+                    else:
+                        col_counter += 1
+
+                    cells.append((
+                        col_counter, 
+                        self._cell_value(cell, shared_formulae, strings)
+                    ))
+
+                node.clear()
+                yield row_counter, cells
+
+    def read_cells(self, *coordinates: str) -> Dict[str, Any]:
+        """Значения отдельных ячеек без разбора всего листа.
+
+        Лист читается потоком до строки последней из ячеек, дальше xml
+        не распаковывается. Отсутствующая в результате ячейка значит
+        "нет в xml", а не "пустая".
+        """
+        wanted: Dict[Tuple[int, int], str] = dict()
+        for coordinate in coordinates:
+            letters, row = coordinate_from_string(coordinate)
+            wanted[row, column_index_from_string(letters)] = coordinate
+        last_row = max((row for row, _ in wanted), default=0)
+
+        values: Dict[str, Any] = dict()
+        with closing(self._parse()) as rows:
+            for row, cells in rows:
+                if row > last_row:
+                    break
+                for column, value in cells:
+                    coordinate = wanted.get((row, column))
+                    if coordinate is not None:
+                        values[coordinate] = value
+        return values
+
+    def _cell_value(
+        self, 
+        cell: Any, 
+        shared_formulae: Dict[str, Translator],
+        strings: List[str]
+    ) -> Any:
+        # Дочерние <v>, <f>, <is> разбираются за один проход
+        value = formula = inline = None
+        for child in cell:
+            tag = child.tag
+            if tag == _VALUE:
+                value = child.text
+            elif tag == _FORMULA:
+                formula = child
+            elif tag == _INLINE:
+                inline = child
+
+        data_type = cell.get("t", "n")
+        if formula is not None:
+            return self._formula(formula, cell.get("r"), shared_formulae)
+        if data_type == "inlineStr":
+            return _text_content(inline) if inline is not None else None
+        if not value:
+            return None
+        if data_type == "s":
+            return strings[int(value)]
+        return self._cast(value, data_type, int(cell.get("s", 0)))
+
+    def _cast(self, value: str, data_type: str, style_id: int) -> Any:
+        if data_type == "n":
+            value = _cast_number(value)
+            if style_id in self.parent._date_formats:
+                try:
+                    return from_excel(
+                        value,
+                        self.parent.epoch,
+                        timedelta=style_id in self.parent._timedelta_formats
+                    )
+                except (OverflowError, ValueError):
+                    return "#VALUE!"
+            return value
+        if data_type == "b":
+            return bool(int(value))
+        if data_type == "d":
+            return from_ISO8601(value)
+        return value
+
+    @staticmethod
+    def _formula(
+        formula: Any,
+        coordinate: Optional[str],
+        shared_formulae: Dict[str, Translator]
+    ) -> Any:
+        # Без data_only openpyxl отдаёт формулу, а не её значение
+        formula_type = formula.get("t")
+        value = "=" + (formula.text or "")
+        if formula_type == "array":
+            return ArrayFormula(ref=formula.get("ref"), text=value)
+        if formula_type == "shared":
+            idx = formula.get("si")
+            if idx in shared_formulae:
+                return shared_formulae[idx].translate_formula(coordinate)
+            if value != "=":
+                shared_formulae[idx] = Translator(value, coordinate)
+        elif formula_type == "dataTable":
+            return DataTableFormula(**formula.attrib)
+        return value
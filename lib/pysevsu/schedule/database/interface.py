@@ -3,7 +3,8 @@
 
 Этот модуль обеспечивает создание таблиц и асинхронное добавление данных в таблицы,
 такие как недели, группы и уроки. В качестве ORM используется SQLAlchemy с асинхронным
-подключением, а база данных — PostgreSQL.
+подключением, а база данных — PostgreSQL 15+
+(uix_week_unique с NULLS NOT DISTINCT).
 
 Зависимости:
     - sqlalchemy
@@ -0,0 +1,445 @@
+"""
+Миграции схемы для баз, созданных прежними версиями tables.py.
+
+create_all создаёт недостающие таблицы, но не меняет существующие,
+поэтому изменения схемы описаны здесь шагами SQL. Применённые шаги
+записываются в таблицу schema_migration, шаг выполняется одной
+транзакцией. Если таблицу lesson создал сам migrate (по текущему
+tables.py), все шаги отмечаются применёнными без выполнения. Шаги
+проверяет benchmarks.migration: от первой версии схемы на одноразовой
+БД.
+
+Запуск (из каталога lib):
+    python -m pysevsu.schedule.database.migrate
+"""
+
+import asyncio
+import logging
+
+from typing import Dict
+from typing import Final
+from typing import List
+from typing import Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .tables import Base
+from .tables import LESSON_FINGERPRINT_COLUMNS
+
+
+# Столбцы отпечатка до справочников (шаги 0001 и 0002)
+_TEXT_FINGERPRINT_COLUMNS: Final[Tuple[str, ...]] = (
+    "week_id", "group_id", "study_form", "weekday", "date", "number",
+    "start_time", "title", "teacher", "type_", "classroom"
+)
+# Дата и время - как str(date) и str(time), независимо от DateStyle
+_TYPED: Final[Dict[str, str]] = {
+    "date": "to_char({}, 'YYYY-MM-DD')",
+    "start_time": "to_char({}, 'HH24:MI:SS')",
+}
+
+
+def _fingerprint_sql(columns: Tuple[str, ...], **texts: str) -> str:
+    # То же, что tables.lesson_fingerprint; texts - как привести столбец
+    # к тексту, который даёт str() в Python (по умолчанию ::text)
+    return "md5(concat_ws(chr(31), {}))::uuid".format(", ".join(
+        "coalesce({}, chr(30))".format(
+            texts.get(column, "{}::text").format(column)
+        )
+        for column in columns
+    ))
+
+
+LESSON_FINGERPRINT_SQL: Final[str] = _fingerprint_sql(
+    LESSON_FINGERPRINT_COLUMNS, **_TYPED
+)
+
+# Отпечаток урока с study_form NULL (шаг 0005)
+_NULL_STUDY_FORM_FINGERPRINT_SQL: Final[str] = _fingerprint_sql(
+    LESSON_FINGERPRINT_COLUMNS, **_TYPED, study_form="NULL"
+)
+
+# Даты, как их писал прежний экспорт (str() ячейки); те же форматы
+# принимает core.xls.as_date
+_DATE_SQL: Final[str] = """
+    CASE
+        WHEN btrim({0}) ~ '^\\d{{1,2}}\\.\\d{{1,2}}\\.\\d{{4}}$'
+            THEN to_date(btrim({0}), 'DD.MM.YYYY')
+        WHEN btrim({0}) ~ '^\\d{{1,2}}\\.\\d{{1,2}}\\.\\d{{2}}$'
+            THEN to_date(btrim({0}), 'DD.MM.YY')
+        WHEN btrim({0}) ~ '^\\d{{4}}-\\d{{2}}-\\d{{2}}'
+            THEN left(btrim({0}), 10)::date
+    END
+"""
+
+MIGRATIONS: Final[List[Tuple[str, Tuple[str, ...]]]] = [
+    # Уникальный ключ урока - uuid вместо индекса на одиннадцать
+    # varchar; отпечатки наборов lesson_set считались по-другому и
+    # сбрасываются (наборы один раз перепишутся)
+    ("0001_lesson_fingerprint", (
+        "ALTER TABLE lesson ADD COLUMN IF NOT EXISTS fingerprint uuid",
+        # Столбцы здесь ещё текстовые
+        f"""
+            UPDATE lesson 
+            SET fingerprint = {_fingerprint_sql(_TEXT_FINGERPRINT_COLUMNS)}
+            WHERE fingerprint IS NULL
+        """,
+        # Старое ограничение пропускало повторы со значениями NULL
+        """
+            DELETE FROM lesson a USING lesson b
+            WHERE a.fingerprint = b.fingerprint AND a.id > b.id
+        """,
+        "ALTER TABLE lesson ALTER COLUMN fingerprint SET NOT NULL",
+        """
+            CREATE UNIQUE INDEX IF NOT EXISTS uix_lesson_fingerprint
+            ON lesson (fingerprint)
+        """,
+        "ALTER TABLE lesson DROP CONSTRAINT IF EXISTS uix_lesson_unique",
+        "DELETE FROM lesson_set",
+    )),
+    # Дата, время, день недели и номер пары - date, time, smallint
+    # (как их теперь отдаёт разбор) и индексы для выборок по датам.
+    # Нераспознанные значения становятся NULL; отпечатки пересчитываются
+    ("0002_typed_lesson_columns", (
+        "DROP INDEX IF EXISTS uix_lesson_fingerprint",
+        "ALTER TABLE lesson ALTER COLUMN weekday DROP NOT NULL",
+        "ALTER TABLE lesson ALTER COLUMN date DROP NOT NULL",
+        "ALTER TABLE lesson ALTER COLUMN start_time DROP NOT NULL",
+        f"""
+            ALTER TABLE lesson ALTER COLUMN date TYPE date
+            USING {_DATE_SQL.format("date")}
+        """,
+        # Прежний экспорт писал время через "-", "8:30-10:00" - начало
+        r"""
+            ALTER TABLE lesson ALTER COLUMN start_time TYPE time
+            USING CASE
+                WHEN start_time ~ '^\s*([01]?\d|2[0-3])[:.\-][0-5]\d'
+                THEN make_time(
+                    substring(start_time from '^\s*(\d+)')::integer,
+                    substring(start_time from '^\s*\d+[:.\-](\d{2})')::integer,
+                    0
+                )
+            END
+        """,
+        """
+            ALTER TABLE lesson ALTER COLUMN weekday TYPE smallint
+            USING coalesce(
+                CASE rtrim(lower(trim(weekday)), '.')
+                    WHEN 'понедельник' THEN 1 WHEN 'пн' THEN 1
+                    WHEN 'вторник' THEN 2 WHEN 'вт' THEN 2
+                    WHEN 'среда' THEN 3 WHEN 'ср' THEN 3
+                    WHEN 'четверг' THEN 4 WHEN 'чт' THEN 4
+                    WHEN 'пятница' THEN 5 WHEN 'пт' THEN 5
+                    WHEN 'суббота' THEN 6 WHEN 'сб' THEN 6
+                    WHEN 'воскресенье' THEN 7 WHEN 'вс' THEN 7
+                END,
+                extract(isodow FROM date)::integer
+            )
+        """,
+        "ALTER TABLE lesson ALTER COLUMN number TYPE smallint",
+        # Недели, которые после приведения дат совпадут ("01.09.2025" и
+        # "1.09.2025"), иначе нарушат uix_week_unique: остаётся меньший
+        # id, уроки переводятся на него. PARTITION BY объединяет и NULL -
+        # недели без дат тоже сливаются (шаг 0006)
+        f"""
+            CREATE TEMP TABLE week_canonical ON COMMIT DROP AS
+            SELECT id, 
+                min(id) OVER (PARTITION BY title, start_date, end_date)
+                    AS canonical_id
+            FROM (
+                SELECT id, title, 
+                    {_DATE_SQL.format("start_date")} AS start_date,
+                    {_DATE_SQL.format("end_date")} AS end_date
+                FROM week
+            ) w
+        """,
+        """
+            UPDATE lesson SET week_id = c.canonical_id
+            FROM week_canonical c
+            WHERE lesson.week_id = c.id AND c.id <> c.canonical_id
+        """,
+        "DELETE FROM lesson_set",
+        """
+            DELETE FROM week USING week_canonical c
+            WHERE week.id = c.id AND c.id <> c.canonical_id
+        """,
+        f"""
+            ALTER TABLE week 
+                ALTER COLUMN start_date TYPE date
+                    USING {_DATE_SQL.format("start_date")},
+                ALTER COLUMN end_date TYPE date
+                    USING {_DATE_SQL.format("end_date")}
+        """,
+        "UPDATE lesson SET fingerprint = "
+        + _fingerprint_sql(_TEXT_FINGERPRINT_COLUMNS, **_TYPED),
+        # "01.09.2025" и "1.09.2025" теперь один урок
+        """
+            DELETE FROM lesson a USING lesson b
+            WHERE a.fingerprint = b.fingerprint AND a.id > b.id
+        """,
+        """
+            CREATE UNIQUE INDEX uix_lesson_fingerprint
+            ON lesson (fingerprint)
+        """,
+        """
+            CREATE INDEX IF NOT EXISTS ix_lesson_group_date
+            ON lesson (group_id, date)
+        """,
+        """
+            CREATE INDEX IF NOT EXISTS ix_lesson_date_number
+            ON lesson (date, number)
+        """,
+    )),
+    # Предмет, преподаватель, тип и аудитория - ссылки на справочники
+    # (таблицы создаёт create_all); 'None', которое писал прежний
+    # экспорт, становится NULL. Названия переносятся как есть: прежний
+    # экспорт заменял в них ':' на '-', новый пишет их без замены, и
+    # наборы с такими предметами перепишутся при следующем экспорте.
+    # Место на диске освобождает только VACUUM FULL (или pg_repack)
+    # после миграции
+    ("0003_lesson_dimensions", (
+        """
+            INSERT INTO subject (title)
+            SELECT DISTINCT title FROM lesson WHERE title <> 'None'
+            ON CONFLICT DO NOTHING
+        """,
+        """
+            INSERT INTO teacher (name)
+            SELECT DISTINCT teacher FROM lesson WHERE teacher <> 'None'
+            ON CONFLICT DO NOTHING
+        """,
+        """
+            INSERT INTO lesson_type (name)
+            SELECT DISTINCT type_ FROM lesson WHERE type_ <> 'None'
+            ON CONFLICT DO NOTHING
+        """,
+        """
+            INSERT INTO classroom (name)
+            SELECT DISTINCT classroom FROM lesson WHERE classroom <> 'None'
+            ON CONFLICT DO NOTHING
+        """,
+        """
+            ALTER TABLE lesson
+                ADD COLUMN subject_id integer REFERENCES subject (id),
+                ADD COLUMN teacher_id integer REFERENCES teacher (id),
+                ADD COLUMN type_id integer REFERENCES lesson_type (id),
+                ADD COLUMN classroom_id integer REFERENCES classroom (id)
+        """,
+        "DROP INDEX uix_lesson_fingerprint",
+        # Один проход по таблице; подзапросы - по уникальным индексам
+        """
+            UPDATE lesson l SET
+                subject_id = (
+                    SELECT id FROM subject WHERE title = l.title
+                ),
+                teacher_id = (
+                    SELECT id FROM teacher WHERE name = l.teacher
+                ),
+                type_id = (
+                    SELECT id FROM lesson_type WHERE name = l.type_
+                ),
+                classroom_id = (
+                    SELECT id FROM classroom WHERE name = l.classroom
+                )
+        """,
+        f"UPDATE lesson SET fingerprint = {LESSON_FINGERPRINT_SQL}",
+        # Уроки, различавшиеся только 'None' и NULL
+        """
+            DELETE FROM lesson a USING lesson b
+            WHERE a.fingerprint = b.fingerprint AND a.id > b.id
+        """,
+        """
+            ALTER TABLE lesson
+                DROP COLUMN title,
+                DROP COLUMN teacher,
+                DROP COLUMN type_,
+                DROP COLUMN classroom
+        """,
+        """
+            CREATE UNIQUE INDEX uix_lesson_fingerprint
+            ON lesson (fingerprint)
+        """,
+        "CREATE INDEX ix_lesson_teacher_date ON lesson (teacher_id, date)",
+        """
+            CREATE INDEX ix_lesson_classroom_date 
+            ON lesson (classroom_id, date)
+        """,
+        "DELETE FROM lesson_set",
+    )),
+    # Покрывающие индексы для database.query
+    ("0004_covering_indexes", (
+        "DROP INDEX ix_lesson_group_date",
+        "DROP INDEX ix_lesson_teacher_date",
+        "DROP INDEX ix_lesson_classroom_date",
+        "DROP INDEX ix_lesson_date_number",
+        """
+            CREATE INDEX ix_lesson_group_date ON lesson (group_id, date)
+            INCLUDE (number, start_time, weekday, study_form,
+                subject_id, teacher_id, type_id, classroom_id)
+        """,
+        """
+            CREATE INDEX ix_lesson_teacher_date ON lesson (teacher_id, date)
+            INCLUDE (number, start_time, weekday, study_form,
+                group_id, subject_id, type_id, classroom_id)
+        """,
+        """
+            CREATE INDEX ix_lesson_classroom_date 
+            ON lesson (classroom_id, date)
+            INCLUDE (number, start_time, weekday, study_form,
+                group_id, subject_id, teacher_id, type_id)
+        """,
+        """
+            CREATE INDEX ix_lesson_date_number ON lesson (date, number)
+            INCLUDE (classroom_id)
+        """,
+    )),
+    # Форма обучения без значения - NULL, а не 'None' от str(None);
+    # отпечатки таких уроков пересчитываются, их наборы перепишутся
+    ("0005_null_study_form", (
+        f"""
+            DELETE FROM lesson 
+            WHERE study_form = 'None' 
+                AND {_NULL_STUDY_FORM_FINGERPRINT_SQL} IN (
+                    SELECT fingerprint FROM lesson WHERE study_form IS NULL
+                )
+        """,
+        f"""
+            UPDATE lesson SET 
+                study_form = NULL,
+                fingerprint = {_NULL_STUDY_FORM_FINGERPRINT_SQL}
+            WHERE study_form = 'None'
+        """,
+        "DELETE FROM lesson_set WHERE study_form = 'None'",
+    )),
+    # Неделя без дат в uix_week_unique не совпадала сама с собой: каждый
+    # запуск вставлял её и её уроки заново. Дубликаты сливаются в
+    # меньший id, ограничение пересоздаётся с NULLS NOT DISTINCT
+    ("0006_week_nulls_not_distinct", (
+        """
+            CREATE TEMP TABLE week_canonical ON COMMIT DROP AS
+            SELECT id, 
+                min(id) OVER (PARTITION BY title, start_date, end_date)
+                    AS canonical_id
+            FROM week
+        """,
+        "DELETE FROM week_canonical WHERE id = canonical_id",
+        "DROP INDEX uix_lesson_fingerprint",
+        """
+            UPDATE lesson SET week_id = c.canonical_id
+            FROM week_canonical c
+            WHERE lesson.week_id = c.id
+        """,
+        f"""
+            UPDATE lesson SET fingerprint = {LESSON_FINGERPRINT_SQL}
+            WHERE week_id IN (SELECT canonical_id FROM week_canonical)
+        """,
+        """
+            DELETE FROM lesson a USING lesson b
+            WHERE a.fingerprint = b.fingerprint AND a.id > b.id
+                AND a.week_id IN (SELECT canonical_id FROM week_canonical)
+        """,
+        """
+            CREATE UNIQUE INDEX uix_lesson_fingerprint
+            ON lesson (fingerprint)
+        """,
+        """
+            DELETE FROM lesson_set 
+            WHERE week_id IN (SELECT id FROM week_canonical)
+                OR week_id IN (SELECT canonical_id FROM week_canonical)
+        """,
+        "DELETE FROM week WHERE id IN (SELECT id FROM week_canonical)",
+        """
+            ALTER TABLE week 
+                DROP CONSTRAINT uix_week_unique,
+                ADD CONSTRAINT uix_week_unique 
+                    UNIQUE NULLS NOT DISTINCT (title, start_date, end_date)
+        """,
+    )),
+    # Части наборов по книгам: lesson_set хранит и уроки части, а урок
+    # удаляется, только когда его нет ни в одной части. Книга уже
+    # загруженных уроков неизвестна: они числятся за источником '' и
+    # переходят к книге, в которой встретятся. Урок, которого больше нет
+    # ни в одной книге, остаётся за '' - до полной перезагрузки (цикл с
+    # пустым state_dir) и DELETE частей с source = ''
+    ("0007_lesson_set_source", (
+        "DELETE FROM lesson_set",
+        # IF NOT EXISTS: lesson_set могла создать create_all этой версии
+        """
+            ALTER TABLE lesson_set
+                ADD COLUMN IF NOT EXISTS source varchar(1024) NOT NULL,
+                ADD COLUMN IF NOT EXISTS lessons uuid[] NOT NULL
+        """,
+        """
+            ALTER TABLE lesson_set
+                DROP CONSTRAINT lesson_set_pkey,
+                ADD PRIMARY KEY (week_id, group_id, study_form, source)
+        """,
+        """
+            INSERT INTO lesson_set 
+                (week_id, group_id, study_form, source, fingerprint, lessons)
+            SELECT week_id, group_id, coalesce(study_form, ''), '', '', 
+                array_agg(fingerprint)
+            FROM lesson
+            GROUP BY week_id, group_id, coalesce(study_form, '')
+        """,
+    )),
+]
+
+_CREATE_JOURNAL: Final[str] = """
+    CREATE TABLE IF NOT EXISTS schema_migration (
+        name text PRIMARY KEY,
+        applied_at timestamptz NOT NULL DEFAULT now()
+    )
+"""
+# Два процесса не применяют один шаг дважды
+_LOCK_KEY: Final[int] = 0x73657673
+
+
+async def migrate(engine: AsyncEngine) -> List[str]:
+    """Создать недостающие таблицы и применить новые шаги.
+
+    Возвращает имена применённых шагов.
+    """
+    async with engine.begin() as conn:
+        fresh = not await conn.run_sync(
+            lambda sync_conn: inspect(sync_conn).has_table("lesson")
+        )
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text(_CREATE_JOURNAL))
+        if fresh:
+            for name, _ in MIGRATIONS:
+                await conn.execute(
+                    text(
+                        "INSERT INTO schema_migration (name) VALUES (:name) "
+                        "ON CONFLICT DO NOTHING"
+                    ),
+                    {"name": name}
+                )
+
+    applied: List[str] = list()
+    for name, statements in MIGRATIONS:
+        async with engine.begin() as conn:
+            await conn.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY}
+            )
+            if await conn.scalar(
+                text("SELECT 1 FROM schema_migration WHERE name = :name"),
+                {"name": name}
+            ):
+                continue
+            for statement in statements:
+                await conn.execute(text(statement))
+            await conn.execute(
+                text("INSERT INTO schema_migration (name) VALUES (:name)"),
+                {"name": name}
+            )
+        logging.info(f"Миграция {name} применена")
+        applied.append(name)
+    return applied
+
+
+if __name__ == "__main__":
+    from .engine import engine
+    asyncio.run(migrate(engine))
@@ -0,0 +1,276 @@
+"""
+Чтение расписания из БД.
+
+Функции берут соединение SQLAlchemy (``engine.connect()``) и выполняют
+запрос через asyncpg напрямую: запрос готовится один раз на соединение
+(кэш prepared statements asyncpg), а строки возвращаются кортежами
+LessonRow, без объектов ORM. Выборки по группе, преподавателю и
+аудитории читают покрывающие индексы ix_lesson_*_date (tables.Lesson),
+справочники и группа - по первичным ключам.
+
+Период - DateWindow, как у разбора: первый и последний день включительно.
+
+QueryCache хранит результаты выборок в памяти процесса до следующего
+импорта: Engine(query_cache=...) сбрасывает его после фиксации цикла, а
+импорт в другом процессе он замечает по номеру в import_generation.
+"""
+
+import asyncio
+import datetime
+import math
+import time
+
+from collections import OrderedDict
+
+from typing import Any
+from typing import Final
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from ..core.xls import DateWindow
+
+
+class LessonRow(NamedTuple):
+    date: datetime.date
+    number: int
+    start_time: Optional[datetime.time]
+    weekday: Optional[int]
+    study_form: Optional[str]
+    group: str
+    subject: Optional[str]
+    teacher: Optional[str]
+    type: Optional[str]
+    classroom: Optional[str]
+
+
+# k - строка группы или справочника, по которой выбираются уроки;
+# условие на l.{column} и l.date ложится на покрывающий индекс
+_SELECT_LESSONS: Final[str] = """
+    SELECT l.date, l.number, l.start_time, l.weekday, l.study_form,
+        g.name, s.title, t.name, lt.name, c.name
+    FROM {table} k
+    JOIN lesson l ON l.{column} = k.id
+    JOIN "group" g ON g.id = l.group_id
+    LEFT JOIN subject s ON s.id = l.subject_id
+    LEFT JOIN teacher t ON t.id = l.teacher_id
+    LEFT JOIN lesson_type lt ON lt.id = l.type_id
+    LEFT JOIN classroom c ON c.id = l.classroom_id
+    WHERE k.name = $1 AND l.date BETWEEN $2 AND $3
+    ORDER BY l.date, l.number, l.start_time
+"""
+_GROUP_LESSONS: Final[str] = _SELECT_LESSONS.format(
+    table='"group"', column="group_id"
+)
+_TEACHER_LESSONS: Final[str] = _SELECT_LESSONS.format(
+    table="teacher", column="teacher_id"
+)
+_CLASSROOM_LESSONS: Final[str] = _SELECT_LESSONS.format(
+    table="classroom", column="classroom_id"
+)
+# Аудитории, известные по расписанию, в которых на эту пару нет уроков
+_FREE_CLASSROOMS: Final[str] = """
+    SELECT c.name FROM classroom c
+    WHERE NOT EXISTS (
+        SELECT 1 FROM lesson l
+        WHERE l.date = $1 AND l.number = $2 AND l.classroom_id = c.id
+    )
+    ORDER BY c.name
+"""
+_SELECT_GENERATION: Final[str] = """
+    SELECT generation FROM import_generation WHERE id = 1
+"""
+
+
+async def _fetch(connection: AsyncConnection, query: str, *args: Any) -> List:
+    raw_connection = await connection.get_raw_connection()
+    return await raw_connection.driver_connection.fetch(query, *args)
+
+
+async def _lessons(
+    connection: AsyncConnection,
+    query: str,
+    name: str,
+    date_range: DateWindow
+) -> List[LessonRow]:
+    first, last = date_range
+    return list(map(
+        LessonRow._make, await _fetch(connection, query, name, first, last)
+    ))
+
+
+async def lessons_for_group(
+    connection: AsyncConnection,
+    name: str,
+    date_range: DateWindow
+) -> List[LessonRow]:
+    """Уроки группы за период по дате и номеру пары."""
+    return await _lessons(connection, _GROUP_LESSONS, name, date_range)
+
+
+async def lessons_for_teacher(
+    connection: AsyncConnection,
+    name: str,
+    date_range: DateWindow
+) -> List[LessonRow]:
+    """Уроки преподавателя за период по дате и номеру пары."""
+    return await _lessons(connection, _TEACHER_LESSONS, name, date_range)
+
+
+async def lessons_for_classroom(
+    connection: AsyncConnection,
+    name: str,
+    date_range: DateWindow
+) -> List[LessonRow]:
+    """Уроки в аудитории за период по дате и номеру пары."""
+    return await _lessons(connection, _CLASSROOM_LESSONS, name, date_range)
+
+
+async def free_classrooms(
+    connection: AsyncConnection,
+    date: datetime.date,
+    number: int
+) -> List[str]:
+    """Аудитории, свободные на пару ``number`` в день ``date``."""
+    return [
+        record[0]
+        for record in await _fetch(connection, _FREE_CLASSROOMS, date, number)
+    ]
+
+
+class QueryCache:
+    """TTL+LRU кэш выборок уроков в памяти процесса.
+
+    bump() (Engine, после finalize цикла, изменившего уроки) начинает
+    новое поколение импорта и сбрасывает записи; результат выборки,
+    начатой в прежнем поколении, не сохраняется. Импорт в другом
+    процессе увеличивает номер в import_generation (BatchCTE_exporter,
+    в транзакции с уроками); кэш сверяется с ним не чаще раза в
+    ``recheck`` секунд, и не дольше этого отдаёт прежние уроки. ``ttl``
+    ограничивает возраст записи на случай записи в БД мимо экспортёра
+    (engine.create), ``max_entries`` - число записей: сверх него
+    вытесняются давно не читанные.
+
+    Кэш не блокирует: записи меняются без await между чтением и
+    записью, так что он безопасен для задач одного event loop, но не
+    для потоков. Вызов из другого loop - RuntimeError.
+
+    Счётчики: hits, misses, evictions (вытеснены по размеру),
+    expirations (по ttl), invalidations (записей сброшено bump).
+    """
+
+    def __init__(
+        self, 
+        max_entries: int = 4096, 
+        ttl: float = 60 * 60 * 2,
+        recheck: float = 1.0
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.recheck = recheck
+        self.generation: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.expirations: int = 0
+        self.invalidations: int = 0
+        # ключ -> (момент записи, строки) текущего поколения,
+        # от давно читанных к недавним
+        self._entries: OrderedDict[
+            Tuple, Tuple[float, Tuple[LessonRow, ...]]
+        ] = OrderedDict()
+        # Номер import_generation при последней сверке и её момент
+        self._imported: Optional[int] = None
+        self._checked: float = -math.inf
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def bump(self) -> int:
+        self.generation += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        return self.generation
+
+    async def _check_import(self, connection: AsyncConnection) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._loop = loop
+        elif self._loop is not loop:
+            raise RuntimeError("QueryCache is bound to another event loop")
+        if time.monotonic() - self._checked < self.recheck:
+            return
+
+        self._checked = time.monotonic()
+        records = await _fetch(connection, _SELECT_GENERATION)
+        imported = records[0][0] if records else 0
+        if imported != self._imported:
+            # Первая сверка: записей ещё нет
+            if self._imported is not None:
+                self.bump()
+            self._imported = imported
+
+    async def _lessons(
+        self,
+        connection: AsyncConnection,
+        query: str,
+        name: str,
+        date_range: DateWindow
+    ) -> List[LessonRow]:
+        await self._check_import(connection)
+        key = (query, name, *date_range)
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored, rows = entry
+            if time.monotonic() - stored < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return list(rows)
+            del self._entries[key]
+            self.expirations += 1
+
+        self.misses += 1
+        # Номер в БД прочитан до выборки: строки не старше него
+        generation = self.generation
+        rows = tuple(await _lessons(connection, query, name, date_range))
+        # Импорт завершился во время выборки: строки могут быть старыми
+        if generation == self.generation:
+            self._entries[key] = (time.monotonic(), rows)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return list(rows)
+
+    async def lessons_for_group(
+        self,
+        connection: AsyncConnection,
+        name: str,
+        date_range: DateWindow
+    ) -> List[LessonRow]:
+        return await self._lessons(
+            connection, _GROUP_LESSONS, name, date_range
+        )
+
+    async def lessons_for_teacher(
+        self,
+        connection: AsyncConnection,
+        name: str,
+        date_range: DateWindow
+    ) -> List[LessonRow]:
+        return await self._lessons(
+            connection, _TEACHER_LESSONS, name, date_range
+        )
+
+    async def lessons_for_classroom(
+        self,
+        connection: AsyncConnection,
+        name: str,
+        date_range: DateWindow
+    ) -> List[LessonRow]:
+        return await self._lessons(
+            connection, _CLASSROOM_LESSONS, name, date_range
+        )
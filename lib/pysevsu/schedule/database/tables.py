@@ -1,13 +1,55 @@
+import datetime
+import hashlib
+import uuid
+
+from typing import Any
+from typing import Final
 from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from sqlalchemy import ARRAY
+from sqlalchemy import BigInteger
+from sqlalchemy import Date
 from sqlalchemy import ForeignKey
+from sqlalchemy import Index
 from sqlalchemy import String
 from sqlalchemy import UniqueConstraint
-from sqlalchemy import Integer
+from sqlalchemy import SmallInteger
+from sqlalchemy import Time
+from sqlalchemy import Uuid
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column 
 from sqlalchemy.orm import relationship
 
+# Столбцы отпечатка урока, в порядке строк lesson_stage экспортёра
+LESSON_FINGERPRINT_COLUMNS: Final[Tuple[str, ...]] = (
+    "week_id", "group_id", "study_form", "weekday", "date", "number",
+    "start_time", "subject_id", "teacher_id", "type_id", "classroom_id"
+)
+
+
+def lesson_fingerprint(values: Sequence[Any]) -> str:
+    """md5 значений урока (hex), как LESSON_FINGERPRINT_SQL в migrate.
+
+    Значения через \\x1f, NULL - \\x1e; дата и время - в ISO, как их
+    даёт str(). Столбец uuid, но asyncpg принимает и hex-строку, а
+    uuid.UUID на урок заметно дороже.
+    """
+    body = "\x1f".join(
+        "\x1e" if value is None else str(value) for value in values
+    )
+    return hashlib.md5(body.encode(), usedforsecurity=False).hexdigest()
+
+
+def _fingerprint_default(context: Any) -> uuid.UUID:
+    # Для вставок через ORM (engine.create)
+    parameters = context.get_current_parameters()
+    return uuid.UUID(lesson_fingerprint(
+        [parameters.get(column) for column in LESSON_FINGERPRINT_COLUMNS]
+    ))
+
+
 class Base(DeclarativeBase): 
     ...
 
@@ -23,29 +65,74 @@ class Lesson(Base):
     group: Mapped["Group"] = relationship("Group", back_populates="lessons")
     week: Mapped["Week"] = relationship("Week", back_populates="lessons")
 
-    weekday: Mapped[str] = mapped_column(String(15))
-    date: Mapped[str] = mapped_column(String(15))
-    number: Mapped[int] = mapped_column(Integer)
-    start_time: Mapped[str] = mapped_column(String(15))
-    title: Mapped[str] = mapped_column(String(200))
-    teacher: Mapped[Optional[str]] = mapped_column(String(100))
-    type_: Mapped[Optional[str]] = mapped_column(String(75))
-    classroom: Mapped[Optional[str]] = mapped_column(String(75))
+    # День недели ISO: 1 - понедельник
+    weekday: Mapped[Optional[int]] = mapped_column(SmallInteger)
+    date: Mapped[Optional[datetime.date]] = mapped_column(Date)
+    number: Mapped[int] = mapped_column(SmallInteger)
+    start_time: Mapped[Optional[datetime.time]] = mapped_column(Time)
 
-    __table_args__ = (UniqueConstraint(
-        "study_form",
-        "group_id", 
-        "week_id",
-        "weekday",
-        "date", 
-        "number", 
-        "start_time", 
-        "title", 
-        "teacher", 
-        "type_", 
-        "classroom",
-        name='uix_lesson_unique'
-    ),)
+    # Предмет, преподаватель, тип и аудитория повторяются в тысячах
+    # уроков и хранятся в справочниках
+    subject_id: Mapped[Optional[int]] = mapped_column(ForeignKey('subject.id'))
+    teacher_id: Mapped[Optional[int]] = mapped_column(ForeignKey('teacher.id'))
+    type_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey('lesson_type.id')
+    )
+    classroom_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey('classroom.id')
+    )
+
+    subject: Mapped[Optional["Subject"]] = relationship(
+        "Subject", back_populates="lessons"
+    )
+    teacher: Mapped[Optional["Teacher"]] = relationship(
+        "Teacher", back_populates="lessons"
+    )
+    type_: Mapped[Optional["LessonType"]] = relationship(
+        "LessonType", back_populates="lessons"
+    )
+    classroom: Mapped[Optional["Classroom"]] = relationship(
+        "Classroom", back_populates="lessons"
+    )
+
+    # md5 значений урока (BatchCTE_exporter): узкий уникальный ключ
+    # вместо ограничения на одиннадцать столбцов
+    fingerprint: Mapped[uuid.UUID] = mapped_column(
+        Uuid, default=_fingerprint_default
+    )
+
+    __table_args__ = (
+        Index('uix_lesson_fingerprint', 'fingerprint', unique=True),
+        # Покрывающие индексы выборок database.query: расписание группы,
+        # преподавателя и аудитории за период читается из индекса без
+        # обращения к таблице (после VACUUM)
+        Index(
+            'ix_lesson_group_date', 'group_id', 'date',
+            postgresql_include=[
+                'number', 'start_time', 'weekday', 'study_form',
+                'subject_id', 'teacher_id', 'type_id', 'classroom_id'
+            ]
+        ),
+        Index(
+            'ix_lesson_teacher_date', 'teacher_id', 'date',
+            postgresql_include=[
+                'number', 'start_time', 'weekday', 'study_form',
+                'group_id', 'subject_id', 'type_id', 'classroom_id'
+            ]
+        ),
+        Index(
+            'ix_lesson_classroom_date', 'classroom_id', 'date',
+            postgresql_include=[
+                'number', 'start_time', 'weekday', 'study_form',
+                'group_id', 'subject_id', 'teacher_id', 'type_id'
+            ]
+        ),
+        # Занятые аудитории пары
+        Index(
+            'ix_lesson_date_number', 'date', 'number',
+            postgresql_include=['classroom_id']
+        ),
+    )
 
 class Week(Base):
     __tablename__ = 'week'
@@ -54,18 +141,22 @@ class Week(Base):
     year: Mapped[str] = mapped_column(String(45))
     semester: Mapped[Optional[str]] = mapped_column(String(45))
     title: Mapped[str] = mapped_column(String(45))
-    start_date: Mapped[Optional[str]] = mapped_column(String(45))
-    end_date: Mapped[Optional[str]] = mapped_column(String(45))
+    start_date: Mapped[Optional[datetime.date]] = mapped_column(Date)
+    end_date: Mapped[Optional[datetime.date]] = mapped_column(Date)
 
     lessons: Mapped[list["Lesson"]] = relationship(
         "Lesson", back_populates="week"
     ) 
 
+    # NULLS NOT DISTINCT (PostgreSQL 15+): иначе неделя без дат не
+    # совпадает сама с собой, и ON CONFLICT экспортёра вставляет её
+    # заново в каждом процессе
     __table_args__ = (UniqueConstraint(
         'title', 
         'start_date', 
         'end_date', 
-        name='uix_week_unique'
+        name='uix_week_unique',
+        postgresql_nulls_not_distinct=True
     ),)
 
 class Group(Base):
@@ -80,4 +171,97 @@ class Group(Base):
         "Lesson", back_populates="group"
     )
 
-    __table_args__ = (UniqueConstraint('name', name='uix_group_unique'),)
\ No newline at end of file
+    __table_args__ = (UniqueConstraint('name', name='uix_group_unique'),)
+
+
+class LessonSet(Base):
+    """Часть набора уроков (неделя, группа, форма обучения) из одной
+    книги: её отпечаток и уроки, которые она содержит.
+
+    По отпечатку экспортёр пропускает неизменённые части и заменяет
+    изменённые целиком. Урок набора удаляется, только когда его не
+    содержит ни одна часть, так что замена части из одной книги не
+    трогает уроки других книг того же набора.
+    """
+    __tablename__ = 'lesson_set'
+
+    week_id: Mapped[int] = mapped_column(
+        ForeignKey('week.id'), primary_key=True
+    )
+    group_id: Mapped[int] = mapped_column(
+        ForeignKey('group.id'), primary_key=True
+    )
+    # '' - уроки без формы обучения (NULL в lesson)
+    study_form: Mapped[str] = mapped_column(String(105), primary_key=True)
+    # URL книги; '' - источник неизвестен (уроки, загруженные до
+    # миграции 0007, и экспорт без источника)
+    source: Mapped[str] = mapped_column(String(1024), primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String(32))
+    # lesson.fingerprint уроков части
+    lessons: Mapped[list[uuid.UUID]] = mapped_column(ARRAY(Uuid))
+
+
+class ImportGeneration(Base):
+    """Номер импорта (одна строка, id = 1).
+
+    Экспортёр увеличивает его в транзакции, изменившей уроки; по нему
+    QueryCache в других процессах узнаёт, что его записи устарели.
+    """
+    __tablename__ = 'import_generation'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    generation: Mapped[int] = mapped_column(BigInteger)
+
+
+class Subject(Base):
+    __tablename__ = 'subject'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    title: Mapped[str] = mapped_column(String(200))
+
+    lessons: Mapped[list["Lesson"]] = relationship(
+        "Lesson", back_populates="subject"
+    )
+
+    __table_args__ = (UniqueConstraint('title', name='uix_subject_unique'),)
+
+
+class Teacher(Base):
+    __tablename__ = 'teacher'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(100))
+
+    lessons: Mapped[list["Lesson"]] = relationship(
+        "Lesson", back_populates="teacher"
+    )
+
+    __table_args__ = (UniqueConstraint('name', name='uix_teacher_unique'),)
+
+
+class LessonType(Base):
+    __tablename__ = 'lesson_type'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(75))
+
+    lessons: Mapped[list["Lesson"]] = relationship(
+        "Lesson", back_populates="type_"
+    )
+
+    __table_args__ = (
+        UniqueConstraint('name', name='uix_lesson_type_unique'),
+    )
+
+
+class Classroom(Base):
+    __tablename__ = 'classroom'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(75))
+
+    lessons: Mapped[list["Lesson"]] = relationship(
+        "Lesson", back_populates="classroom"
+    )
+
+    __table_args__ = (UniqueConstraint('name', name='uix_classroom_unique'),)
@@ -7,6 +7,7 @@ from typing import List
 from typing import Callable
 from typing import Dict
 from typing import Any
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -14,6 +15,10 @@ from ..core.web import Parser
 from ..core.web import async_xls_request
 from ..core.xls import ExcelFile
 from ..core.xls import Worksheet
+from ..core.xls import as_date
+from ..core.xls import as_number
+from ..core.xls import as_time
+from ..core.xls import as_weekday
 from ..database import tables as table
 from ..utilites.logger import log
 
@@ -64,6 +69,7 @@ class Process:
         self.generator_type = generator_type
         self.args = args
         self._cache: Dict[Any] = dict()
+        self._dimension_ids: Dict[Tuple[Any, str], int] = dict()
         self._lock = asyncio.Lock()
 
         for key, value in kwargs.items():
@@ -107,8 +113,8 @@ class Process:
                     year=str(sheet.get_dates_of_the_week()["start_date"]).split(".")[-1],
                     semester=data.get("semester"),
                     title=sheet.title,
-                    start_date=str(sheet.get_dates_of_the_week()["start_date"]),
-                    end_date=str(sheet.get_dates_of_the_week()["end_date"])
+                    start_date=as_date(sheet.get_dates_of_the_week()["start_date"]),
+                    end_date=as_date(sheet.get_dates_of_the_week()["end_date"])
                 )
                 buffer.append(week)
                 self._cache[sheet.title] = week
@@ -166,6 +172,24 @@ class Process:
         await asyncio.gather(*tasks)
         await asyncio.gather(*db_tasks)
 
+    async def _dimension_id(self, model: Any, value: Optional[str]) -> Optional[int]:
+        # id значения справочника (Subject, Teacher, ...), с вставкой
+        if value is None:
+            return None
+        if (model, value) not in self._dimension_ids:
+            column = "title" if model is table.Subject else "name"
+            async with AsyncSessionLocal() as session:
+                async with session.begin():
+                    self._dimension_ids[(model, value)] = await session.scalar(
+                        insert(model)
+                        .values({column: value})
+                        .on_conflict_do_update(
+                            index_elements=[column], set_={column: value}
+                        )
+                        .returning(model.id)
+                    )
+        return self._dimension_ids[(model, value)]
+
     @log
     async def sheet_an_3(self, data):
         buffer: List[table.Week] = list()
@@ -189,14 +213,19 @@ class Process:
                     study_form=data["study_form"],
                     group_id=self._cache[data["Группа"]].id,
                     week_id=self._cache[data["week"]].id,
-                    weekday=data.get("День"),
-                    date=data.get("Дата"),
-                    number=int(data.get("№занятия")),
-                    start_time=data.get("Время"),
-                    title=title,
-                    teacher=teacher,
-                    type_=types[index] if types else "...",
-                    classroom=classrooms[index] if classrooms else "..."
+                    weekday=as_weekday(data.get("День"), as_date(data.get("Дата"))),
+                    date=as_date(data.get("Дата")),
+                    number=as_number(data.get("№занятия")),
+                    start_time=as_time(data.get("Время")),
+                    subject_id=await self._dimension_id(table.Subject, title),
+                    teacher_id=await self._dimension_id(table.Teacher, teacher),
+                    type_id=await self._dimension_id(
+                        table.LessonType, types[index] if types else "..."
+                    ),
+                    classroom_id=await self._dimension_id(
+                        table.Classroom, 
+                        classrooms[index] if classrooms else "..."
+                    )
                 )
             except:
                 raise RuntimeError(types, classrooms)
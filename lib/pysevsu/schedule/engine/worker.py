@@ -1,16 +1,56 @@
 import asyncio
 import aiohttp
+import hashlib
+import logging
+import multiprocessing
+import os
 import time
 
 from typing import Coroutine
 from typing import List
 from typing import Dict
 from typing import Any
-from io import BytesIO
+from typing import Optional
+from typing import Mapping
+from typing import Tuple
+from typing import IO
+from typing import Union
+from typing import Iterable
+from typing import Sequence
+from typing import Final
+from typing import Set
+from collections import ChainMap
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
 from ..core.web import Parser
+from ..core.web import read_to_spool
+from ..core.config import _URL
+from ..core.xls import DateWindow
 from ..core.xls import ExcelFile
-from ..core.xls import Worksheet
+from ..core.xls import PARSER_VERSION
+from ..core.xls import SheetLessons
+from ..core.xls import as_date
+from ..core.xls import as_number
+from ..core.xls import as_time
+from ..core.xls import as_weekday
+from ..core.xls import current_weeks
+from ..core.xls import parse_workbook
+from ..core.records import GroupKey
+from ..core.records import LessonBatch
+from ..core.records import LessonRecord
+from ..core.records import WeekKey
+from ..core.symbols import SymbolTable
+from ..core.validators import ValidatorStore
+from ..core.cache import ParseCache
+from ..core.cache import WorkbookCache
+from ..core.limiter import AdaptiveLimiter
+from ..core.limiter import backoff_delay
+from ..core.deadletter import DeadLetterQueue
+from ..database.query import QueryCache
+from ..database.tables import lesson_fingerprint
+from ..core.index import IndexSnapshot
+from ..core.index import IndexDiff
 from ..utilites.logger import log
 
 from sqlalchemy import text
@@ -19,95 +59,367 @@ from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
+def _peak_rss_kb() -> int:
+    try:
+        import resource
+    except ImportError: # Windows
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _is_permanent(err: BaseException) -> bool:
+    # Ошибка в самом запросе: не пройдёт ни сейчас, ни в другом цикле
+    return isinstance(err, (aiohttp.InvalidURL, aiohttp.TooManyRedirects))
+
+
+def _is_retryable(err: BaseException) -> bool:
+    if _is_permanent(err):
+        return False
+    # 4xx (кроме 408 и 429) повторять бессмысленно
+    if isinstance(err, aiohttp.ClientResponseError):
+        return err.status >= 500 or err.status in (408, 429)
+    return True
+
+
 class BatchCTE_exporter:
+    """Пачечная запись уроков в БД (COPY и слияние на стороне сервера).
+
+    Название осталось от записи через CTE с подставленными в текст
+    запроса значениями.
+
+    id недель, групп и значений справочников (предметы, преподаватели,
+    типы занятий, аудитории) запоминаются на всё время жизни экспортёра
+    (с ``warm_start`` - сначала читаются из БД), так что неделя, группа
+    или значение записывается, только когда встретилось впервые или
+    изменилось, а уроки попадают во временную таблицу уже с id. Кэш
+    предполагает, что эти строки не удаляются, пока экспортёр работает.
+
+    Уроки принимаются пачками по столбцам (LessonBatch, add_batch):
+    неделя, группа и id справочников считаются по значениям столбцов, а
+    не по урокам; add и add_many собирают такую пачку из LessonRecord.
+
+    Уроки синхронизируются наборами (неделя, группа, форма обучения),
+    каждая книга (источник пачки) - своей частью набора: по отпечатку
+    части (таблица lesson_set) неизменённая часть не отправляется в БД
+    вовсе, а изменённая заменяется - её уроки записываются в lesson_set,
+    из набора удаляются уроки, которых больше нет ни в одной его части,
+    и вставляются новые. Поэтому книга, которую цикл не обработал (304,
+    тот же sha256), своих уроков не теряет. Часть, которая за цикл
+    пришла ещё раз с другими уроками, дополняется без удаления. Цикл
+    заканчивается вызовом finalize.
+
+    Уникальность урока - по столбцу lesson.fingerprint (md5 значений
+    урока), который экспортёр считает сам (tables.lesson_fingerprint);
+    миграция database.migrate заполняет его для старых строк тем же
+    выражением на сервере.
+    """
+
+    # Временная таблица живёт в соединении и очищается после коммита;
+    # в WAL она не пишется
+    _STAGE: Final[str] = "lesson_stage"
+    _STAGE_COLUMNS: Final[Tuple[str, ...]] = (
+        "week_id", "group_id", "study_form", "weekday", "date", "number",
+        "start_time", "subject_id", "teacher_id", "type_id",
+        "classroom_id", "source", "fingerprint"
+    )
+    # Справочники в порядке параметров _UPSERT_KEYS и столбцов урока
+    _DIMENSIONS: Final[Tuple[str, ...]] = (
+        "subject", "teacher", "type", "classroom"
+    )
+    # Их столбцы в LessonBatch
+    _DIMENSION_FIELDS: Final[Tuple[str, ...]] = (
+        "title", "teacher", "type", "classroom"
+    )
+    _CREATE_STAGE: Final[str] = """
+        CREATE TEMPORARY TABLE IF NOT EXISTS lesson_stage (
+            week_id integer, group_id integer, study_form text,
+            weekday smallint, date date, number smallint, start_time time,
+            subject_id integer, teacher_id integer, type_id integer,
+            classroom_id integer, source text, fingerprint uuid
+        ) ON COMMIT DELETE ROWS
+    """
+    # Новые недели, группы и значения справочников одним запросом; DO
+    # UPDATE, чтобы RETURNING вернул id и уже существующих строк. Даты
+    # недели приходят строками str() (ISO или 'None'), ключ собирается
+    # так же
+    _UPSERT_KEYS: Final[str] = """
+        WITH weeks AS (
+            INSERT INTO week (year, semester, title, start_date, end_date)
+            SELECT year, semester, title,
+                NULLIF(start_date, 'None')::date, NULLIF(end_date, 'None')::date
+            FROM unnest(
+                $1::text[], $2::text[], $3::text[], $4::text[], $5::text[]
+            ) AS w(year, semester, title, start_date, end_date)
+            ON CONFLICT (title, start_date, end_date) DO UPDATE SET
+                year = EXCLUDED.year
+            RETURNING id, CONCAT(
+                title, 
+                '|', coalesce(to_char(start_date, 'YYYY-MM-DD'), 'None'),
+                '|', coalesce(to_char(end_date, 'YYYY-MM-DD'), 'None')
+            ) AS key
+        ), groups AS (
+            INSERT INTO "group" (name, course, institute)
+            SELECT * FROM unnest($6::text[], $7::text[], $8::text[])
+            ON CONFLICT (name) DO UPDATE SET
+                course = EXCLUDED.course,
+                institute = EXCLUDED.institute
+            RETURNING id, name AS key
+        ), subjects AS (
+            INSERT INTO subject (title) SELECT * FROM unnest($9::text[])
+            ON CONFLICT (title) DO UPDATE SET title = EXCLUDED.title
+            RETURNING id, title AS key
+        ), teachers AS (
+            INSERT INTO teacher (name) SELECT * FROM unnest($10::text[])
+            ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+            RETURNING id, name AS key
+        ), types AS (
+            INSERT INTO lesson_type (name) SELECT * FROM unnest($11::text[])
+            ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+            RETURNING id, name AS key
+        ), classrooms AS (
+            INSERT INTO classroom (name) SELECT * FROM unnest($12::text[])
+            ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+            RETURNING id, name AS key
+        )
+        SELECT 'week' AS kind, id, key FROM weeks
+        UNION ALL
+        SELECT 'group' AS kind, id, key FROM groups
+        UNION ALL
+        SELECT 'subject' AS kind, id, key FROM subjects
+        UNION ALL
+        SELECT 'teacher' AS kind, id, key FROM teachers
+        UNION ALL
+        SELECT 'type' AS kind, id, key FROM types
+        UNION ALL
+        SELECT 'classroom' AS kind, id, key FROM classrooms
+    """
+    _SELECT_KEYS: Final[str] = """
+        SELECT 'week' AS kind, id, year, semester, title, start_date, end_date
+        FROM week
+        UNION ALL
+        SELECT 'group' AS kind, id, name, course, institute, NULL, NULL
+        FROM "group"
+        UNION ALL
+        SELECT 'subject' AS kind, id, title, NULL, NULL, NULL, NULL
+        FROM subject
+        UNION ALL
+        SELECT 'teacher' AS kind, id, name, NULL, NULL, NULL, NULL
+        FROM teacher
+        UNION ALL
+        SELECT 'type' AS kind, id, name, NULL, NULL, NULL, NULL
+        FROM lesson_type
+        UNION ALL
+        SELECT 'classroom' AS kind, id, name, NULL, NULL, NULL, NULL
+        FROM classroom
+    """
+    # study_form - часть первичного ключа lesson_set: NULL там - ''.
+    # Уроки частей не читаются: они нужны только серверу
+    _SELECT_FINGERPRINTS: Final[str] = """
+        SELECT week_id, group_id, NULLIF(study_form, ''), source, fingerprint 
+        FROM lesson_set
+    """
+    # Заменяемые части: отпечаток и уроки - из lesson_stage
+    _UPSERT_FINGERPRINTS: Final[str] = """
+        INSERT INTO lesson_set 
+            (week_id, group_id, study_form, source, fingerprint, lessons)
+        SELECT u.week_id, u.group_id, coalesce(u.study_form, ''), u.source,
+            u.fingerprint, ARRAY(
+                SELECT s.fingerprint FROM lesson_stage s
+                WHERE s.week_id = u.week_id 
+                    AND s.group_id = u.group_id
+                    AND s.study_form IS NOT DISTINCT FROM u.study_form
+                    AND s.source = u.source
+            )
+        FROM unnest(
+            $1::integer[], $2::integer[], $3::text[], $4::text[], $5::text[]
+        ) AS u(week_id, group_id, study_form, source, fingerprint)
+        ON CONFLICT (week_id, group_id, study_form, source) DO UPDATE SET
+            fingerprint = EXCLUDED.fingerprint,
+            lessons = EXCLUDED.lessons
+    """
+    # Дополняемые части: уроки добавляются к уже записанным
+    _APPEND_LESSONS: Final[str] = """
+        UPDATE lesson_set p SET lessons = ARRAY(
+            SELECT unnest(p.lessons)
+            UNION
+            SELECT s.fingerprint FROM lesson_stage s
+            WHERE s.week_id = u.week_id 
+                AND s.group_id = u.group_id
+                AND s.study_form IS NOT DISTINCT FROM u.study_form
+                AND s.source = u.source
+        )
+        FROM unnest($1::integer[], $2::integer[], $3::text[], $4::text[])
+            AS u(week_id, group_id, study_form, source)
+        WHERE p.week_id = u.week_id 
+            AND p.group_id = u.group_id
+            AND p.study_form = coalesce(u.study_form, '')
+            AND p.source = u.source
+    """
+    # Уроки, которые нашлись в книге, больше не числятся за неизвестным
+    # источником ('' - загруженные до миграции 0007)
+    _RELEASE_UNKNOWN: Final[str] = """
+        UPDATE lesson_set p SET lessons = ARRAY(
+            SELECT unnest(p.lessons)
+            EXCEPT
+            SELECT s.fingerprint FROM lesson_stage s
+            WHERE s.week_id = p.week_id 
+                AND s.group_id = p.group_id
+                AND s.study_form IS NOT DISTINCT FROM NULLIF(p.study_form, '')
+                AND s.source <> ''
+        )
+        FROM unnest($1::integer[], $2::integer[], $3::text[])
+            AS u(week_id, group_id, study_form)
+        WHERE p.source = ''
+            AND p.week_id = u.week_id 
+            AND p.group_id = u.group_id
+            AND p.study_form = coalesce(u.study_form, '')
+    """
+    _DELETE_RELEASED: Final[str] = """
+        DELETE FROM lesson_set p
+        USING unnest($1::integer[], $2::integer[], $3::text[])
+            AS u(week_id, group_id, study_form)
+        WHERE p.source = ''
+            AND p.week_id = u.week_id 
+            AND p.group_id = u.group_id
+            AND p.study_form = coalesce(u.study_form, '')
+            AND p.lessons = '{}'
+    """
+    # Уроки заменённых наборов, которых нет ни в одной части набора
+    _DELETE_STALE: Final[str] = """
+        DELETE FROM lesson l
+        USING unnest($1::integer[], $2::integer[], $3::text[])
+            AS u(week_id, group_id, study_form)
+        WHERE l.week_id = u.week_id 
+            AND l.group_id = u.group_id 
+            AND l.study_form IS NOT DISTINCT FROM u.study_form
+            AND NOT EXISTS (
+                SELECT 1 FROM lesson_set p
+                WHERE p.week_id = u.week_id 
+                    AND p.group_id = u.group_id
+                    AND p.study_form = coalesce(u.study_form, '')
+                    AND l.fingerprint = ANY (p.lessons)
+            )
+    """
+    # Уроки без номера пары не проходят NOT NULL и раньше роняли всю пачку
+    _MERGE_LESSONS: Final[str] = """
+        INSERT INTO lesson
+            (week_id, group_id, study_form, weekday, date, number,
+            start_time, subject_id, teacher_id, type_id, classroom_id,
+            fingerprint)
+        SELECT week_id, group_id, study_form, weekday, date, number,
+            start_time, subject_id, teacher_id, type_id, classroom_id,
+            fingerprint
+        FROM lesson_stage
+        WHERE number IS NOT NULL
+        ON CONFLICT (fingerprint) DO NOTHING
+    """
+    # Номер импорта для QueryCache (tables.ImportGeneration)
+    _BUMP_GENERATION: Final[str] = """
+        INSERT INTO import_generation (id, generation) VALUES (1, 1)
+        ON CONFLICT (id) DO UPDATE 
+        SET generation = import_generation.generation + 1
+    """
+
     def __init__(
         self,
         session_factory: async_sessionmaker[AsyncSession],
         batch_size: int = 100,
-        max_concurrent_batches: int = 4
+        max_concurrent_batches: int = 4,
+        warm_start: bool = False
     ):
         self.session_factory = session_factory
         self.batch_size = batch_size
         self._semaphore = asyncio.Semaphore(max_concurrent_batches)
 
-        self._weeks_buffer: List[Dict[str, Any]] = []
-        self._groups_buffer: List[Dict[str, Any]] = []
-        self._lessons_buffer: List[Dict[str, Any]] = []
+        # Недели и группы пачки по ключам слияния
+        self._weeks_buffer: Dict[str, WeekKey] = dict()
+        self._groups_buffer: Dict[str, GroupKey] = dict()
+        # Первая строка группы в цикле: записи индекса с одним файлом
+        # (duplicates) дают той же группе другие курс и институт, и без
+        # этого строка перезаписывалась бы в каждой пачке
+        self._cycle_groups: Dict[str, GroupKey] = dict()
+        self._lessons_buffer: List[LessonBatch] = []
+        self._buffered_lessons: int = 0
+        self._week_temp_keys: Dict[WeekKey, str] = dict()
+
+        # Ключ -> (id, записанная строка): строка с другими значениями
+        # (год недели, институт группы) записывается заново
+        self._week_ids: Dict[str, Tuple[int, Tuple[str, ...]]] = dict()
+        self._group_ids: Dict[str, Tuple[int, Tuple[str, ...]]] = dict()
+        # Вид справочника -> значение -> id
+        self._dimension_ids: Dict[str, Dict[str, int]] = {
+            kind: dict() for kind in self._DIMENSIONS
+        }
+        self._warm_start = warm_start
 
-        self._week_key_cache = set()
-        self._group_key_cache = set()
+        # (week_id, group_id, study_form) -> отпечаток набора в БД; None -
+        # ещё не прочитаны
+        self._fingerprints: Optional[Dict[Tuple[Any, ...], str]] = None
+        # Наборы, записанные в этом цикле, и отпечатки их частей
+        self._synced: Dict[Tuple[Any, ...], Set[str]] = dict()
+        # Наборы, которые сейчас заменяет какая-то пачка
+        self._replacing: Dict[Tuple[Any, ...], asyncio.Event] = dict()
 
         self._buffer_lock = asyncio.Lock()
+        self.inserted_lessons: int = 0
+        self.deleted_lessons: int = 0
+        self.upserted_keys: int = 0
+        self.skipped_sets: int = 0
+        self.synced_sets: int = 0
 
-    @staticmethod
-    def _generate_week_temp_key(data: Dict[str, Any]) -> str:
-        return f"{data['title']}|{data['start_date']}|{data['end_date']}"
-    
-    @staticmethod
-    def _generate_group_temp_key(data: Dict[str, Any]) -> str:
-        return data['name']
-    
-    @staticmethod
-    def _get_week(data: Dict[str, Any]) -> Dict[str, Any]:
-        return {
-            'year': data.get('year', '2025'),
-            'semester': data.get('semester'),
-            'title': data['week'],
-            'start_date': str(data.get('start_date')),
-            'end_date': str(data.get('end_date'))
-        }
-    
-    @staticmethod
-    def _get_group(data: Dict[str, Any]) -> Dict[str, Any]:
-        return {
-            'name': data['group'],
-            'course': data['course'],
-            'institute': data['institute']
-        }
+    @property
+    def changes(self) -> int:
+        """Изменённые строки: растёт, если экспорт что-то записал."""
+        return self.inserted_lessons + self.deleted_lessons + self.upserted_keys
+
+    def _generate_week_temp_key(self, week: WeekKey) -> str:
+        key = self._week_temp_keys.get(week)
+        if key is None:
+            key = f"{week.title}|{week.start_date}|{week.end_date}"
+            self._week_temp_keys[week] = key
+        return key
     
     @staticmethod
-    def _get_lesson(
-        week_temp_key: str, 
-        group_temp_key: str, 
-        data: Dict[str, Any]
-    ) -> Dict[str, Any]:
-        return {
-            'week_key': week_temp_key,
-            'group_key': group_temp_key,
-            'study_form': data.get('study_form'),
-            'weekday': data.get('weekday'),
-            'date': data.get('date'),
-            'number': data.get('number'),
-            'start_time': data.get('start_time'),
-            'title': data.get('title'),
-            'teacher': data.get('teacher'),
-            'type_': data.get('type'),
-            'classroom': data.get('classroom')
-        }
+    def _generate_group_temp_key(group: GroupKey) -> str:
+        return group.name
 
-    async def add(self, data: Dict[str, Any]) -> None:
-        async with self._buffer_lock:
-            week_data = self._get_week(data)
-            week_temp_key = self._generate_week_temp_key(week_data)
-            group_data = self._get_group(data)
-            group_temp_key = self._generate_group_temp_key(group_data)
-
-            if week_temp_key not in self._week_key_cache:
-                self._weeks_buffer.append(week_data)
-                self._week_key_cache.add(week_temp_key)
-
-            if group_temp_key not in self._group_key_cache:
-                self._groups_buffer.append(group_data)
-                self._group_key_cache.add(group_temp_key)
-
-            lesson_data = self._get_lesson(
-                week_temp_key=week_temp_key,
-                group_temp_key=group_temp_key,
-                data=data
-            )
-            self._lessons_buffer.append(lesson_data)
+    def _append(self, batch: LessonBatch) -> None:
+        # Без await внутри: в event loop это и так атомарно
+        for week in batch["week"].values:
+            week_temp_key = self._generate_week_temp_key(week)
+            if week_temp_key not in self._weeks_buffer:
+                self._weeks_buffer[week_temp_key] = week
+
+        for group in batch["group"].values:
+            group_temp_key = self._generate_group_temp_key(group)
+            if group_temp_key not in self._groups_buffer:
+                group = self._cycle_groups.setdefault(group_temp_key, group)
+                self._groups_buffer[group_temp_key] = group
+
+        self._lessons_buffer.append(batch)
+        self._buffered_lessons += len(batch)
+
+    async def add(self, lesson: LessonRecord, source: str = "") -> None:
+        await self.add_batch(LessonBatch.from_records((lesson,), source))
+
+    async def add_many(
+        self, 
+        lessons: Iterable[LessonRecord], 
+        source: str = ""
+    ) -> None:
+        """Как add_batch для пачки из ``lessons``."""
+        await self.add_batch(LessonBatch.from_records(lessons, source))
+
+    async def add_batch(self, batch: LessonBatch) -> None:
+        """Добавить пачку уроков (обычно - лист книги).
 
-        if len(self._lessons_buffer) >= self.batch_size:
+        Пачка не делится между записями в БД, поэтому набор уроков листа
+        сравнивается со старым целиком (у add набор может разделиться).
+        """
+        if not len(batch):
+            return
+        self._append(batch)
+        if self._buffered_lessons >= self.batch_size:
             await self._flush_buffered_data()
 
     async def _flush_buffered_data(self) -> None:
@@ -115,143 +427,366 @@ class BatchCTE_exporter:
             return
         
         async with self._buffer_lock:
-            weeks_to_insert = self._weeks_buffer.copy()
-            groups_to_insert = self._groups_buffer.copy()
-            lessons_to_insert = self._lessons_buffer.copy()
-
-            self._weeks_buffer.clear()
-            self._groups_buffer.clear()
-            self._lessons_buffer.clear()
-            self._week_key_cache.clear()
-            self._group_key_cache.clear()
-
-        async with self.semaphore:
-            await self._execute_cte_insertion(
+            weeks_to_insert = self._weeks_buffer
+            groups_to_insert = self._groups_buffer
+            lessons_to_insert = self._lessons_buffer
+
+            self._weeks_buffer = dict()
+            self._groups_buffer = dict()
+            self._lessons_buffer = []
+            self._buffered_lessons = 0
+
+        async with self._semaphore:
+            await self._execute_copy_merge(
                 weeks_to_insert,
                 groups_to_insert,
                 lessons_to_insert
             )
 
-    async def _execute_cte_insertion(
+    async def _execute_copy_merge(
         self,
-        weeks_data: List[Dict[str, Any]],
-        groups_data: List[Dict[str, Any]],
-        lessons_data: List[Dict[str, Any]]
+        weeks_data: Dict[str, WeekKey],
+        groups_data: Dict[str, GroupKey],
+        lessons_data: List[LessonBatch]
     ) -> None:
+        """Записать пачку одной транзакцией.
+
+        Недели, группы и значения справочников, которых нет в кэше id, -
+        один INSERT из unnest() параметров. Уроки изменённых наборов - COPY во временную таблицу,
+        DELETE уроков, которых в наборах больше нет, и INSERT ... SELECT
+        новых. Ошибка не глотается: транзакция откатывается, а цикл
+        Engine завершается с ошибкой и не фиксирует валидаторы.
+        """
         if not lessons_data:
             return
-        
-        week_cte = self._build_week_cte(weeks_data)
-        group_cte = self._build_group_cte(groups_data)
-        insert_query = self._build_final_insert_query(
-            week_cte,
-            group_cte,
-            lessons_data
-        )
 
-        async with self.session_factory() as session:
-            async with session.begin():
-                try:
-                    await session.execute(insert_query)
-                except Exception as e:
-                    ... # TODO: Блокировка транзакций БД, исправить
-
-    def _build_week_cte(self, weeks_data: List[Dict[str, Any]]) -> str:
-        if not weeks_data:
-            return """
-            week_ids AS (
-                SELECT NULL::bigint as id, NULL::text as week_key WHERE FALSE
-            )
-            """
-        
-        values_clause = ", ".join([
-            f"('{w['year']}', '{w['semester']}', '{w['title']}', "
-            f"'{w['start_date']}', '{w['end_date']}')"
-            for w in weeks_data
-        ])
-        unique_key = "title, start_date, end_date"
-
-        return f"""
-        week_ids AS (
-            WITH input_weeks(year, semester, title, start_date, end_date) AS (
-                VALUES {values_clause}
+        week_ids: Dict[str, Tuple[int, Tuple[str, ...]]] = dict()
+        group_ids: Dict[str, Tuple[int, Tuple[str, ...]]] = dict()
+        dimension_ids: Dict[str, Dict[str, int]] = {
+            kind: dict() for kind in self._DIMENSIONS
+        }
+        dimensions = [ChainMap(
+            dimension_ids[kind], self._dimension_ids[kind]
+        ) for kind in self._DIMENSIONS]
+        values = [self._dimension_values(batch) for batch in lessons_data]
+        # Снимается, когда наборы, заменяемые этой пачкой, записаны
+        done = asyncio.Event()
+        replaced: Dict[Tuple[Any, ...], str] = dict()
+        try:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    connection = await session.connection()
+                    # Первый запрос через SQLAlchemy открывает транзакцию,
+                    # в которой дальше работает и соединение asyncpg
+                    await connection.execute(text(self._CREATE_STAGE))
+                    raw_connection = await connection.get_raw_connection()
+                    driver = raw_connection.driver_connection
+
+                    if self._warm_start:
+                        await self._load_ids(
+                            driver, week_ids, group_ids, dimension_ids
+                        )
+                    await self._resolve_ids(
+                        driver, 
+                        self._changed(self._week_ids, week_ids, weeks_data), 
+                        self._changed(self._group_ids, group_ids, groups_data), 
+                        [
+                            sorted(
+                                set().union(*columns) - found.keys() - {None}
+                            )
+                            for columns, found in zip(zip(*values), dimensions)
+                        ],
+                        week_ids, 
+                        group_ids,
+                        dimension_ids
+                    )
+                    if self._fingerprints is None:
+                        self._fingerprints = {
+                            tuple(record[:4]): record[4] for record in 
+                            await driver.fetch(self._SELECT_FINGERPRINTS)
+                        }
+
+                    sets = self._group_sets(
+                        lessons_data, 
+                        values,
+                        ChainMap(week_ids, self._week_ids), 
+                        ChainMap(group_ids, self._group_ids),
+                        dimensions
+                    )
+                    replaced, appended, waits = self._plan_sets(sets, done)
+                    # Запись в набор ждёт его замены в параллельной пачке:
+                    # её DELETE не видит ещё не записанных частей и удалил
+                    # бы их уроки
+                    if waits:
+                        await asyncio.gather(*(e.wait() for e in waits))
+                    await self._write_sets(driver, sets, replaced, appended)
+        except BaseException:
+            # Цикл завершится ошибкой; в следующем наборы сверяются заново
+            self._synced.clear()
+            raise
+        finally:
+            done.set()
+            for part in replaced:
+                if self._replacing.get(part[:3]) is done:
+                    del self._replacing[part[:3]]
+
+        # Только после коммита: откаченные строки не должны попасть в кэш
+        self._week_ids.update(week_ids)
+        self._group_ids.update(group_ids)
+        for kind, found in dimension_ids.items():
+            self._dimension_ids[kind].update(found)
+        self._warm_start = False
+        self._fingerprints.update(replaced)
+
+    def _group_sets(
+        self,
+        lessons_data: List[LessonBatch],
+        values: List[List[List[Optional[str]]]],
+        weeks: Mapping[str, Tuple[int, Tuple[str, ...]]],
+        groups: Mapping[str, Tuple[int, Tuple[str, ...]]],
+        dimensions: List[Mapping[str, int]]
+    ) -> Dict[Tuple[Any, ...], List[Tuple[Any, ...]]]:
+        """Строки для COPY по частям наборов (week_id, group_id,
+        study_form, source).
+
+        id и приведённые значения считаются по значениям столбцов пачки;
+        на урок - только сборка строки по кодам и её отпечаток.
+        """
+        sets: Dict[Tuple[Any, ...], List[Tuple[Any, ...]]] = dict()
+        for batch, batch_values in zip(lessons_data, values):
+            week_ids = [
+                weeks[self._generate_week_temp_key(week)][0]
+                for week in batch["week"].values
+            ]
+            group_ids = [
+                groups[self._generate_group_temp_key(group)][0]
+                for group in batch["group"].values
+            ]
+            study_forms = [
+                None if value is None else str(value)
+                for value in batch["study_form"].values
+            ]
+            weekdays = batch["weekday"].values
+            source = batch.source
+            # Разбор уже привёл дату, время, день и номер; здесь - для
+            # уроков не из parse_workbook (значения кэшированы, это дёшево)
+            dates = list(map(as_date, batch["date"].values))
+            numbers = list(map(as_number, batch["number"].values))
+            times = list(map(as_time, batch["start_time"].values))
+            subjects, teachers, types, classrooms = (
+                [None if value is None else ids[value] for value in column]
+                for ids, column in zip(dimensions, batch_values)
             )
-            INSERT INTO week (year, semester, title, start_date, end_date)
-            SELECT iw.year, iw.semester, iw.title, iw.start_date, iw.end_date 
-            FROM input_weeks iw
-            ON CONFLICT ({unique_key}) DO UPDATE SET
-                year = EXCLUDED.year
-            RETURNING id, 
-                CONCAT(title, '|', start_date, '|', end_date) as week_key
-        )
+            for (
+                week, group, study_form, weekday, date, number, start_time,
+                subject, teacher, type_, classroom
+            ) in batch.rows():
+                date = dates[date]
+                row = (
+                    week_ids[week],
+                    group_ids[group],
+                    study_forms[study_form],
+                    as_weekday(weekdays[weekday], date),
+                    date,
+                    numbers[number],
+                    times[start_time],
+                    subjects[subject],
+                    teachers[teacher],
+                    types[type_],
+                    classrooms[classroom],
+                )
+                sets.setdefault((*row[:3], source), []).append(
+                    (*row, source, lesson_fingerprint(row))
+                )
+        return sets
+
+    def _plan_sets(
+        self,
+        sets: Dict[Tuple[Any, ...], List[Tuple[Any, ...]]],
+        done: asyncio.Event
+    ) -> Tuple[
+        Dict[Tuple[Any, ...], str], 
+        List[Tuple[Any, ...]], 
+        List[asyncio.Event]
+    ]:
+        """Части наборов пачки: заменяемые (с отпечатками) и дополняемые.
+
+        Остальные не изменились и не пишутся. Без await: решение и
+        отметка в _synced атомарны относительно параллельных пачек.
+        Пачка ждёт только пачки, спланированные раньше неё, так что
+        ожидания не замыкаются в круг.
         """
-    
-    def _build_group_cte(self, groups_data: List[Dict[str, Any]]) -> str:
-        if not groups_data:
-            return """group_ids AS (
-                SELECT NULL::bigint as id, NULL::text as group_key WHERE FALSE
-            )"""
-
-        values_clause = ", ".join([
-            f"('{g['name']}', '{g['course']}', '{g['institute']}')"
-            for g in groups_data
-        ])
-        unique_key = "name"
-
-        return f"""
-        group_ids AS (
-            WITH input_groups(name, course, institute) AS (
-                VALUES {values_clause}
+        replaced: Dict[Tuple[Any, ...], str] = dict()
+        appended: List[Tuple[Any, ...]] = list()
+        waits: List[asyncio.Event] = list()
+        for part, rows in sets.items():
+            fingerprint = self._fingerprint(rows)
+            seen = self._synced.setdefault(part, set())
+            if fingerprint in seen:
+                self.skipped_sets += 1
+            elif not seen and self._fingerprints.get(part) == fingerprint:
+                self.skipped_sets += 1
+            else:
+                # Набор заменяет другая пачка (часть той же или другой
+                # книги)
+                running = self._replacing.get(part[:3])
+                if running is not None and running is not done:
+                    waits.append(running)
+                if seen:
+                    appended.append(part)
+                else:
+                    replaced[part] = fingerprint
+                    self._replacing[part[:3]] = done
+            seen.add(fingerprint)
+        return replaced, appended, waits
+
+    async def _write_sets(
+        self,
+        driver: Any,
+        sets: Dict[Tuple[Any, ...], List[Tuple[Any, ...]]],
+        replaced: Dict[Tuple[Any, ...], str],
+        appended: List[Tuple[Any, ...]]
+    ) -> None:
+        if not replaced and not appended:
+            return
+
+        await driver.copy_records_to_table(
+            self._STAGE,
+            records=[
+                row for part in (*replaced, *appended) for row in sets[part]
+            ],
+            columns=self._STAGE_COLUMNS
+        )
+        # Сначала уроки частей: по ним DELETE решает, что удалить
+        if replaced:
+            await driver.execute(
+                self._UPSERT_FINGERPRINTS, 
+                *map(list, zip(*(
+                    (*part, fingerprint) 
+                    for part, fingerprint in replaced.items()
+                )))
             )
-            INSERT INTO "group" (name, course, institute)
-            SELECT ig.name, ig.course, ig.institute FROM input_groups ig
-            ON CONFLICT ({unique_key}) DO UPDATE SET 
-                institute = EXCLUDED.institute
-            RETURNING id, name as group_key
+        if appended:
+            await driver.execute(
+                self._APPEND_LESSONS, *map(list, zip(*appended))
+            )
+        # Наборы, куда записала книга с известным источником; в одном
+        # порядке в параллельных пачках
+        known = sorted(
+            {part[:3] for part in (*replaced, *appended) if part[3]},
+            key=lambda unit: (unit[0], unit[1], unit[2] or "")
         )
-        """
+        if known:
+            units = list(map(list, zip(*known)))
+            await driver.execute(self._RELEASE_UNKNOWN, *units)
+            await driver.execute(self._DELETE_RELEASED, *units)
+        deleted = 0
+        if replaced:
+            units = list(map(list, zip(*dict.fromkeys(
+                part[:3] for part in replaced
+            ))))
+            status = await driver.execute(self._DELETE_STALE, *units)
+            deleted = int(status.split()[-1])
+        status = await driver.execute(self._MERGE_LESSONS)
+        inserted = int(status.split()[-1])
+        # Последним запросом: строка номера заблокирована до коммита, и
+        # параллельные пачки ждут её недолго
+        if deleted or inserted:
+            await driver.execute(self._BUMP_GENERATION)
+        self.deleted_lessons += deleted
+        self.inserted_lessons += inserted
+        self.synced_sets += len(replaced) + len(appended)
 
-    def _build_final_insert_query(
-        self, 
-        week_cte: str, 
-        group_cte: str, 
-        lessons_data: List[Dict[str, Any]]
-    ) -> str:
-        lesson_values = []
-        for lesson in lessons_data:
-            values = (
-                f"("
-                f"(SELECT id FROM week_ids WHERE week_key = '{lesson['week_key']}'), "
-                f"(SELECT id FROM group_ids WHERE group_key = '{lesson['group_key']}'), "
-                f"'{lesson.get('study_form', '')}', "
-                f"'{lesson.get('weekday', '')}', "
-                f"'{lesson.get('date', '')}', "
-                f"{lesson.get('number', 0)}, "
-                f"'{lesson.get('start_time', '').replace(':', '-')}', "
-                f"'{lesson.get('title', '').replace(':', '-')}', "
-                f"'{lesson.get('teacher', '')}', "
-                f"'{lesson.get('type_', '')}', "
-                f"'{lesson.get('classroom', '')}'"
-                f")"
+    @staticmethod
+    def _fingerprint(rows: List[Tuple[Any, ...]]) -> str:
+        # По отпечаткам уроков; набор, а не список: порядок и повторы
+        # уроков не важны
+        body = "".join(sorted({row[-1] for row in rows}))
+        return hashlib.blake2b(body.encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def _changed(
+        cached: Dict[str, Tuple[int, Tuple[str, ...]]],
+        found: Dict[str, Tuple[int, Tuple[str, ...]]],
+        keys: Mapping[str, Tuple[Any, ...]]
+    ) -> List[Tuple[str, Tuple[str, ...]]]:
+        # Значения пишутся так же, как их раньше подставлял в текст
+        # запроса f-string (str(), None -> 'None'), чтобы новые строки
+        # совпадали с уже загруженными по уникальным ключам
+        changed: List[Tuple[str, Tuple[str, ...]]] = list()
+        for key, value in keys.items():
+            row = tuple(map(str, value))
+            entry = found.get(key) or cached.get(key)
+            if entry is None or entry[1] != row:
+                changed.append((key, row))
+        # Один порядок блокировок строк в параллельных пачках
+        changed.sort()
+        return changed
+
+    async def _load_ids(
+        self,
+        driver: Any,
+        week_ids: Dict[str, Tuple[int, Tuple[str, ...]]],
+        group_ids: Dict[str, Tuple[int, Tuple[str, ...]]],
+        dimension_ids: Dict[str, Dict[str, int]]
+    ) -> None:
+        for kind, id_, *row in await driver.fetch(self._SELECT_KEYS):
+            # Как в _changed: даты недели - str()
+            row = tuple(map(str, row))
+            if kind == "week":
+                week_ids["|".join(row[2:])] = (id_, row)
+            elif kind == "group":
+                group_ids[row[0]] = (id_, row[:3])
+            else:
+                dimension_ids[kind][row[0]] = id_
+
+    async def _resolve_ids(
+        self,
+        driver: Any,
+        weeks: List[Tuple[str, Tuple[str, ...]]],
+        groups: List[Tuple[str, Tuple[str, ...]]],
+        dimensions: List[List[str]],
+        week_ids: Dict[str, Tuple[int, Tuple[str, ...]]],
+        group_ids: Dict[str, Tuple[int, Tuple[str, ...]]],
+        dimension_ids: Dict[str, Dict[str, int]]
+    ) -> None:
+        if not weeks and not groups and not any(dimensions):
+            return
+
+        week_rows = dict(weeks)
+        group_rows = dict(groups)
+        week_columns = [list(c) for c in zip(*week_rows.values())] or [[]] * 5
+        group_columns = [list(c) for c in zip(*group_rows.values())] or [[]] * 3
+        for kind, id_, key in await driver.fetch(
+            self._UPSERT_KEYS, *week_columns, *group_columns, *dimensions
+        ):
+            if kind == "week":
+                week_ids[key] = (id_, week_rows[key])
+            elif kind == "group":
+                group_ids[key] = (id_, group_rows[key])
+            else:
+                dimension_ids[kind][key] = id_
+        self.upserted_keys += (
+            len(weeks) + len(groups) + sum(map(len, dimensions))
+        )
+
+    @classmethod
+    def _dimension_values(cls, batch: LessonBatch) -> List[List[Optional[str]]]:
+        # Значения столбцов пачки в порядке _DIMENSIONS, как есть в
+        # книге; None - значения нет (NULL в lesson)
+        return [
+            [None if value is None else str(value) for value in column]
+            for column in (
+                batch[field].values for field in cls._DIMENSION_FIELDS
             )
-            lesson_values.append(values)
-
-        values_clause = ", ".join(lesson_values)
-        unique_key = "week_id, group_id, study_form, weekday, date, number, start_time, title, teacher, type_, classroom"
-
-        return text(f"""
-            WITH 
-            {week_cte},
-            {group_cte}
-            INSERT INTO lesson
-                (week_id, group_id, study_form, weekday, date, number, 
-                start_time, title, teacher, type_, classroom)
-            VALUES {values_clause}
-            ON CONFLICT ({unique_key}) DO NOTHING
-        """)
+        ]
 
     async def finalize(self) -> None:
-        await self._flush_buffered_data()
+        try:
+            await self._flush_buffered_data()
+        finally:
+            self._synced.clear()
+            self._cycle_groups.clear()
 
 
 class Engine:
@@ -263,11 +798,93 @@ class Engine:
         db_max_overflow: int = 40, 
         db_sqlalchemy_echo: bool = False,
         db_import_batch_size: int = 600,
-        db_max_concurrent_batches: int = 2
+        db_max_concurrent_batches: int = 2,
+        parser_backend: str = "lxml",
+        state_dir: Optional[str] = ".pysevsu",
+        cache_max_size: int = 1024 ** 3,
+        parse_cache_max_size: int = 256 * 1024 ** 2,
+        replay: bool = False,
+        spool_size: int = 1024 * 1024,
+        min_request_count: int = 2,
+        request_target_latency: float = 5.0,
+        max_retries: int = 3,
+        retry_base_delay: float = 1.0,
+        dead_letter_max_failures: int = 5,
+        index_full_crawl_every: Optional[int] = 6,
+        base_url: str = "https://www.sevsu.ru",
+        index_url: str = _URL,
+        exporter: Optional["BatchCTE_exporter"] = None,
+        db_warm_start: bool = False,
+        parse_workers: Optional[int] = None,
+        xls_backend: str = "native",
+        window_weeks: Optional[int] = None,
+        query_cache: Optional[QueryCache] = None
     ) -> None:
-        self._requests_semaphore = asyncio.Semaphore(max_request_count)
+        if replay and not state_dir:
+            raise ValueError("Replay mode requires state_dir with a cache.")
+        if xls_backend not in ExcelFile.BACKENDS:
+            raise ValueError(f"Unknown xlsx backend: {xls_backend!r}")
+
+        self._base_url = base_url
+        self._index_url = index_url
+        # None - по числу ядер (на одном ядре пул только мешает),
+        # 0 - разбор прямо в event loop
+        if parse_workers is None:
+            parse_workers = os.cpu_count() or 1
+            parse_workers = parse_workers if parse_workers > 1 else 0
+        self._parse_workers = parse_workers
+        self._parse_pool: Optional[ProcessPoolExecutor] = None
+        self._parser_backend = parser_backend
+        self._xls_backend = xls_backend
+        # Инкрементальный режим: выгружаются только ``window_weeks``
+        # недель начиная с текущей, валидаторы при этом не сдвигаются -
+        # остальные недели файла подхватит следующий полный прогон
+        self._window_weeks = window_weeks
+        # Сбрасывается после цикла, изменившего данные в БД
+        self._query_cache = query_cache
+        self._date_window: Optional[DateWindow] = None
+        self._spool_size = spool_size
+        self._validators = ValidatorStore(
+            os.path.join(state_dir, "validators.json") if state_dir else None
+        )
+        self._cache: Optional[WorkbookCache] = WorkbookCache(
+            root=os.path.join(state_dir, "cache"),
+            max_size=cache_max_size,
+            replay=replay
+        ) if state_dir else None
+        # Разобранные книги: одинаковые байты не разбираются повторно
+        self._parse_cache: Optional[ParseCache] = ParseCache(
+            root=os.path.join(state_dir, "parsed"),
+            version=PARSER_VERSION,
+            max_size=parse_cache_max_size
+        ) if state_dir else None
+        self._dead_letters = DeadLetterQueue(
+            os.path.join(state_dir, "dead_letters.json") if state_dir else None,
+            max_failures=dead_letter_max_failures
+        )
+        self._index = IndexSnapshot(
+            os.path.join(state_dir, "index.json") if state_dir else None
+        )
+        self._index_full_crawl_every = index_full_crawl_every
+        self._cycle_number: int = 0
+        self.last_index_diff: Optional[IndexDiff] = None
+        self._cycle_stats: Counter = Counter()
+        # Недели, группы и формы обучения из всех книг цикла: неделя с
+        # теми же датами есть в книгах других институтов. Значения
+        # уроков делит LessonBatch листа
+        self._symbols = SymbolTable()
+        # sha256 -> разбор, который идёт прямо сейчас
+        self._parse_flights: Dict[str, asyncio.Future] = dict()
+        self._limiter = AdaptiveLimiter(
+            initial=max(min_request_count, max_request_count // 4),
+            minimum=min_request_count,
+            maximum=max_request_count,
+            target_latency=request_target_latency
+        )
+        self._max_retries = max_retries
+        self._retry_base_delay = retry_base_delay
         self._requests_session: object = ...
-        self._exporter = BatchCTE_exporter(
+        self._exporter = exporter or BatchCTE_exporter(
             session_factory=async_sessionmaker(
                 bind=create_async_engine(
                     url=db_url,
@@ -278,70 +895,424 @@ class Engine:
                 expire_on_commit=False
             ),
             batch_size=db_import_batch_size,
-            max_concurrent_batches=db_max_concurrent_batches
+            max_concurrent_batches=db_max_concurrent_batches,
+            warm_start=db_warm_start
         )
 
     @log
     def start(self) -> None:
         while True:
             asyncio.run(self._run_parser())
+            if self._cache is not None and self._cache.replay:
+                return
             time.sleep(60*60*2) # TODO: Временное решение
 
-    async def _run_parser(self) -> None:
+    async def _run_parser(self) -> Counter:
+        self._cycle_stats = Counter()
+        self._symbols = SymbolTable()
+        self._date_window = (
+            current_weeks(self._window_weeks) if self._window_weeks else None
+        )
+        if self._parse_workers:
+            # spawn: дочерним процессам не достаются сокеты пула БД и aiohttp
+            self._parse_pool = ProcessPoolExecutor(
+                max_workers=self._parse_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        try:
+            await self._run_cycle()
+        finally:
+            if self._parse_pool is not None:
+                self._parse_pool.shutdown(cancel_futures=True)
+                self._parse_pool = None
+
+        logging.info(
+            "Цикл завершён: скачано %d, не изменилось %d (304: %d, sha256: %d)",
+            self._cycle_stats["downloaded"],
+            self._cycle_stats["not_modified"] + self._cycle_stats["same_hash"],
+            self._cycle_stats["not_modified"],
+            self._cycle_stats["same_hash"]
+        )
+        if self._cache is not None and self._cache.replay:
+            logging.info(
+                "Replay: из кэша %d, отсутствует в кэше %d",
+                self._cycle_stats["replayed"],
+                self._cycle_stats["not_cached"]
+            )
+        logging.info(
+            "Загрузка: повторов %d, в очередь недоставленных %d (всего %d, "
+            "отложено %d), лимит параллельности %d",
+            self._cycle_stats["retries"],
+            self._cycle_stats["dead_lettered"],
+            len(self._dead_letters),
+            self._dead_letters.parked,
+            self._limiter.limit
+        )
+        self._cycle_stats["symbols"] = len(self._symbols)
+        self._cycle_stats["symbol_hits"] = self._symbols.hits
+        if self._parse_cache is not None:
+            logging.info(
+                "Разбор книг: из кэша %d, кэш %.1f MiB",
+                self._cycle_stats["parse_cache_hits"],
+                self._parse_cache.size / 1024 ** 2
+            )
+        logging.info(
+            "Недель, групп и форм обучения %d, повторов %d",
+            self._cycle_stats["symbols"],
+            self._cycle_stats["symbol_hits"]
+        )
+        if self._query_cache is not None:
+            logging.info(
+                "Кэш выборок: поколение %d, попаданий %d, промахов %d, "
+                "вытеснено %d, сброшено %d",
+                self._query_cache.generation,
+                self._query_cache.hits,
+                self._query_cache.misses,
+                self._query_cache.evictions,
+                self._cycle_stats["query_cache_invalidated"]
+            )
+        self._cycle_stats["peak_rss_kb"] = _peak_rss_kb()
+        logging.info(
+            "Пиковое потребление памяти: %.1f MiB", 
+            self._cycle_stats["peak_rss_kb"] / 1024
+        )
+        return self._cycle_stats
+
+    async def _run_cycle(self) -> None:
         async with aiohttp.ClientSession() as self._requests_session:
             tasks: List[Coroutine] = list()
-            web = Parser()
-            async for i in web.run_data_stream():
+            web = await Parser.create(
+                session=self._requests_session,
+                backend=self._parser_backend,
+                url=self._index_url,
+                cache=self._cache
+            )
+            # Сначала файлы, не скачанные в прошлых циклах
+            retried: List[Dict[str, Any]] = list()
+            if not (self._cache is not None and self._cache.replay):
+                retried = self._dead_letters.drain()
+                self._cycle_stats["dead_letters_drained"] = len(retried)
+
+            entries = [i.copy() async for i in web.run_data_stream()]
+            self.last_index_diff = self._index.diff(entries)
+            if self._is_full_crawl():
+                scheduled = entries
+            else:
+                scheduled = self.last_index_diff.scheduled
+            self._log_index_diff(self.last_index_diff, len(scheduled))
+
+            # Пачки фиксируются по ходу цикла: сравнивается и при ошибке.
+            # До создания задач - они не останутся без ожидания
+            changes = (
+                self._exporter.changes if self._query_cache is not None else 0
+            )
+            for contexts in self._group_by_url([*retried, *scheduled]):
                 task = asyncio.create_task(
-                    self._run_xls_files_headler(i.copy())
+                    self._run_xls_files_headler(contexts[0], contexts[1:])
                 )
                 tasks.append(task)
 
-            await asyncio.gather(*tasks)
-            await self._exporter.finalize()
+            try:
+                await asyncio.gather(*tasks)
+                await self._exporter.finalize()
+            except BaseException:
+                # Файлы из очереди недоставленных повторятся
+                self._validators.rollback()
+                self._dead_letters.rollback()
+                raise
+            else:
+                self._validators.commit()
+                self._dead_letters.commit()
+                self._dead_letters.save()
+                self._index.commit(entries)
+                self._cycle_number += 1
+            finally:
+                if (
+                    self._query_cache is not None
+                    and self._exporter.changes != changes
+                ):
+                    self._cycle_stats["query_cache_invalidated"] = len(
+                        self._query_cache
+                    )
+                    self._query_cache.bump()
+                if self._cache is not None:
+                    self._cache.save()
+                if self._parse_cache is not None:
+                    self._parse_cache.save()
+
+    def _group_by_url(
+        self, 
+        entries: List[Dict[str, Any]]
+    ) -> List[List[Dict[str, Any]]]:
+        """Записи индекса по файлам: один файл под разными институтами,
+        курсами и формами обучения скачивается и разбирается один раз.
+        """
+        groups: Dict[str, List[Dict[str, Any]]] = dict()
+        seen = set()
+        for data in entries:
+            key = tuple(sorted(data.items()))
+            if key in seen:
+                continue
+            seen.add(key)
+            groups.setdefault(data["excel_url"], []).append(data)
+
+        self._cycle_stats["coalesced_entries"] = len(seen) - len(groups)
+        return list(groups.values())
+
+    def _is_full_crawl(self) -> bool:
+        # Файл может смениться и без смены ссылки, поэтому время от
+        # времени индекс обходится целиком (дальше решают валидаторы)
+        if self._cache is not None and self._cache.replay:
+            return True
+        if not self._index.entries:
+            return True
+        if not self._index_full_crawl_every:
+            return False
+        return self._cycle_number % self._index_full_crawl_every == 0
+
+    def _log_index_diff(self, diff: IndexDiff, scheduled: int) -> None:
+        self._cycle_stats["index_added"] = len(diff.added)
+        self._cycle_stats["index_changed"] = len(diff.changed)
+        self._cycle_stats["index_removed"] = len(diff.removed)
+        self._cycle_stats["index_scheduled"] = scheduled
+        logging.info(
+            "Индекс: новых %d, изменённых %d, удалённых %d, без изменений %d; "
+            "в обработку %d",
+            len(diff.added),
+            len(diff.changed),
+            len(diff.removed),
+            len(diff.unchanged),
+            scheduled
+        )
+
+    async def _fetch_xls_file(
+        self, 
+        url: str
+    ) -> Optional[Tuple[IO[bytes], str, Mapping[str, str]]]:
+        async with self._requests_session.get(
+            url, 
+            headers=self._validators.conditional_headers(url)
+        ) as response:
+            if response.status == 304:
+                return None
+            response.raise_for_status()
+            file, sha256 = await read_to_spool(response, self._spool_size)
+            return file, sha256, response.headers
+
+    async def _download_xls_file(
+        self, 
+        url: str
+    ) -> Optional[Tuple[IO[bytes], str, Mapping[str, str]]]:
+        attempt = 0
+        while True:
+            try:
+                async with self._limiter.slot():
+                    return await self._fetch_xls_file(url)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                if (
+                    attempt >= self._max_retries or 
+                    not _is_retryable(err)
+                ):
+                    raise
+            attempt += 1
+            self._cycle_stats["retries"] += 1
+            await asyncio.sleep(
+                backoff_delay(attempt - 1, self._retry_base_delay)
+            )
+
+    def _to_dead_letters(
+        self, 
+        url: str, 
+        data: Dict[Any, Any], 
+        err: BaseException,
+        duplicates: Sequence[Dict[Any, Any]] = ()
+    ) -> None:
+        reason = f"{type(err).__name__}: {err}"
+        logging.warning("Файл не обработан: %s (%s)", url, reason)
+        self._cycle_stats["dead_lettered"] += 1
+        if not (self._cache is not None and self._cache.replay):
+            self._dead_letters.add(
+                url, data, reason, duplicates, permanent=_is_permanent(err)
+            )
+
+    def _to_source(self, file: IO[bytes], sha256: str) -> Union[str, bytes]:
+        # Процессу разбора лучше передать путь, чем гонять байты через
+        # pipe; путь есть только у кэша (state_dir), без него книга
+        # читается в память и уходит в пул целиком
+        if self._cache is not None:
+            path = self._cache.locate(sha256)
+            if path is not None:
+                file.close()
+                return path
+        with file:
+            return file.read()
+
+    async def _get_xls_file(
+        self, 
+        data: Dict[Any, Any],
+        duplicates: Sequence[Dict[Any, Any]] = ()
+    ) -> Optional[Tuple[Union[str, bytes], str, Mapping[str, str]]]:
+        url: str = rf"{self._base_url}{data['excel_url']}"
+        if self._cache is not None and self._cache.replay:
+            sha256 = self._cache.lookup(url)
+            path = self._cache.locate(sha256) if sha256 else None
+            if path is None:
+                self._cycle_stats["not_cached"] += 1
+                return None
+            self._cycle_stats["replayed"] += 1
+            return path, sha256, {}
 
-    async def _get_xls_file(self, end_url: str) -> None:
-        url: str = rf"https://www.sevsu.ru{end_url}"
         try:
-            async with self._requests_session.get(url) as response:
-                if response.status == 200:
-                    response.raise_for_status()
-                    xls_content = BytesIO(await response.read())
-                    return ExcelFile(xls_content)
-                else:
-                    ... # TODO: DLE
-        except aiohttp.client_exceptions.ClientPayloadError: 
-            ... # TODO: DLE
-        except: 
-            ... # TODO: Проанализировать отличные ошибки от ClientPayloadError
-
-    async def _run_xls_files_headler(self, data: Dict[Any, Any]) -> None:
-        async with self._requests_semaphore:
-            xls: ExcelFile = await self._get_xls_file(data["excel_url"])
-        if not xls:
+            result = await self._download_xls_file(url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            self._to_dead_letters(url, data, err, duplicates)
             return None
 
-        tasks: List[Coroutine] = list()
-        async for sheet in xls.run_worksheets_stream():
-            data["week"] = sheet.title
-            data.update(sheet.get_dates_of_the_week())
+        if result is None:
+            if self._cache is not None:
+                self._cache.touch(url)
+            self._cycle_stats["not_modified"] += 1
+            return None
+
+        file, sha256, headers = result
+        if self._cache is not None:
+            self._cache.put_file(url, file, sha256)
+        if self._validators.is_unchanged(url, sha256):
+            file.close()
+            self._validators.stage(url, headers, sha256)
+            self._cycle_stats["same_hash"] += 1
+            return None
 
-            task = asyncio.create_task(
-                self._run_worksheet_hander(sheet, data.copy())
+        self._cycle_stats["downloaded"] += 1
+        return self._to_source(file, sha256), sha256, headers
+
+    async def _parse_workbook(
+        self, 
+        source: Union[str, bytes]
+    ) -> List[SheetLessons]:
+        if self._parse_pool is None:
+            return parse_workbook(source, self._xls_backend, self._date_window)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._parse_pool, 
+            parse_workbook, 
+            source,
+            self._xls_backend,
+            self._date_window
+        )
+
+    async def _parse_cached(
+        self, 
+        source: Union[str, bytes], 
+        sha256: str
+    ) -> List[SheetLessons]:
+        if self._parse_cache is None:
+            return await self._parse_workbook(source)
+
+        key = self._parse_cache.key(
+            sha256, self._xls_backend, self._date_window
+        )
+        sheets = self._parse_cache.load(key)
+        if sheets is not None:
+            self._cycle_stats["parse_cache_hits"] += 1
+            return sheets
+
+        sheets = await self._parse_workbook(source)
+        self._parse_cache.store(key, sheets)
+        return sheets
+
+    async def _parse_shared(
+        self, 
+        source: Union[str, bytes], 
+        sha256: str
+    ) -> List[SheetLessons]:
+        # Одинаковое содержимое под разными URL, скачанное одновременно,
+        # разбирается один раз; разобранное раньше найдёт ParseCache
+        flight = self._parse_flights.get(sha256)
+        if flight is None:
+            flight = asyncio.ensure_future(self._parse_cached(source, sha256))
+            self._parse_flights[sha256] = flight
+            flight.add_done_callback(
+                lambda _: self._parse_flights.pop(sha256, None)
             )
-            tasks.append(task)
+        else:
+            self._cycle_stats["coalesced_parses"] += 1
+        # shield: отмена одного ожидающего не отменяет разбор для других
+        return await asyncio.shield(flight)
 
-        await asyncio.gather(*tasks)
+    async def _run_xls_files_headler(
+        self, 
+        data: Dict[Any, Any],
+        duplicates: Sequence[Dict[Any, Any]] = ()
+    ) -> None:
+        """Скачать и разобрать файл ``data`` и выгрузить уроки для него
+        и для ``duplicates`` - других записей индекса с тем же файлом.
+        """
+        result = await self._get_xls_file(dict(data), duplicates)
+        if result is None:
+            return None
+
+        source, sha256, headers = result
+        url: str = rf"{self._base_url}{data['excel_url']}"
+        # Путь из кэша: пока его читает разбор, put_file других
+        # загрузок не вытесняет объект
+        pinned = isinstance(source, str) and self._cache is not None
+        if pinned:
+            self._cache.pin(sha256)
+        try:
+            sheets = await self._parse_shared(source, sha256)
+        except Exception as err: # не xlsx / повреждённый архив
+            self._to_dead_letters(url, dict(data), err, duplicates)
+            return None
+        finally:
+            if pinned:
+                self._cache.unpin(sha256)
+        if (
+            not (self._cache is not None and self._cache.replay)
+            and self._date_window is None
+        ):
+            self._validators.stage(url, headers, sha256)
+
+        for context in (data, *duplicates):
+            await self._export_sheets(context, sheets, url)
+        # Применится при commit, когда finalize запишет уроки
+        self._dead_letters.discard(url)
 
-    async def _run_worksheet_hander(
+    async def _export_sheets(
         self, 
-        xls_sheet: Worksheet,
-        data: Dict[Any, Any]
+        data: Dict[Any, Any], 
+        sheets: List[SheetLessons],
+        source: str = ""
     ) -> None:
-        async for i in xls_sheet.run_data_stream():
-            data.update(i)
-            await self._exporter.add(data)
+        # Одна группа встречается на всех листах файла
+        groups: Dict[Any, GroupKey] = dict()
+        intern = self._symbols.intern
+        study_form = intern(data.get("study_form"))
+
+        def group_of(name: Any) -> GroupKey:
+            group = groups.get(name)
+            if group is None:
+                group = groups[name] = intern(GroupKey(
+                    name, data["course"], data["institute"]
+                ))
+            return group
+
+        for title, start_date, end_date, records in sheets:
+            self._cycle_stats["sheets"] += 1
+            # Неделя с теми же датами есть в книгах других институтов
+            week = intern(WeekKey(
+                year=data.get("year", "2025"),
+                semester=data.get("semester"),
+                title=title,
+                start_date=start_date,
+                end_date=end_date
+            ))
 
+            # Значения столбцов - по разу на лист: повторы в записях
+            # разбор уже свёл к одному объекту
+            batch = LessonBatch(source)
+            batch.extend(week, study_form, group_of, records)
+            self._cycle_stats["lessons"] += len(batch)
+            await self._exporter.add_batch(batch)
 
 if __name__ == "__main__":
     engine: Engine = Engine()